@@ -1,13 +1,37 @@
-from sqlalchemy import create_engine, Column, Integer, String, DateTime, Float, Boolean, ForeignKey, Text
+from sqlalchemy import create_engine, event, func, inspect, Table, Column, Integer, String, DateTime, Float, Boolean, ForeignKey, Text, UniqueConstraint, Index
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, relationship
+from sqlalchemy.schema import CreateIndex
 from datetime import datetime
+import logging
 import os
 
+logger = logging.getLogger("safe_hdf.database")
+
 Base = declarative_base()
 
+class Technician(Base):
+    __tablename__ = "technicians"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    name = Column(String(100), nullable=False, unique=True, index=True)
+    email = Column(String(200), nullable=True)
+    phone = Column(String(50), nullable=True)
+    daily_capacity_hours = Column(Float, default=7)  # Working hours per weekday
+    active = Column(Boolean, default=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+# Names are matched ignoring case, so "Karim" and "karim" can't both exist
+Index("ux_technicians_name_lower", func.lower(Technician.name), unique=True)
+
 class Task(Base):
     __tablename__ = "tasks"
+    __table_args__ = (
+        Index("ix_tasks_technician_status", "technician_id", "status"),
+        # Archived rows keep their ids, so SQLite must never hand one out again
+        {"sqlite_autoincrement": True},
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     title = Column(String(200), nullable=False)
@@ -15,10 +39,25 @@ class Task(Base):
     priority = Column(String(20), default="medium")  # low, medium, high, urgent
     status = Column(String(20), default="todo")  # todo, in_progress, done, cancelled
     due_date = Column(DateTime, nullable=True)
-    created_at = Column(DateTime, default=datetime.utcnow)
+    created_at = Column(DateTime, default=datetime.utcnow, index=True)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
-    assigned_to = Column(String(100), nullable=True)
+    assigned_to = Column(String(100), nullable=True)  # Technician name, kept in sync with technician_id
+    technician_id = Column(Integer, ForeignKey("technicians.id"), nullable=True)
     tags = Column(String(500), nullable=True)  # Comma-separated tags
+    # RFC 5545 RRULE anchored on due_date; occurrences are expanded on read
+    recurrence_rule = Column(String(500), nullable=True, index=True)
+    recurrence_until = Column(DateTime, nullable=True)  # Last occurrence, NULL if endless
+
+class Location(Base):
+    """Place stock is kept: workshop, depot, a technician's van"""
+    __tablename__ = "locations"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    name = Column(String(200), nullable=False, unique=True, index=True)
+    technician_id = Column(Integer, ForeignKey("technicians.id"), nullable=True)  # Driver of a van
+    active = Column(Boolean, default=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
 class StockItem(Base):
     __tablename__ = "stock_items"
@@ -29,27 +68,69 @@ class StockItem(Base):
     quantity = Column(Float, default=0)
     unit = Column(String(50), default="unit")  # unit, kg, liter, box, etc.
     min_threshold = Column(Float, default=10)  # Alert threshold
-    location = Column(String(200), nullable=True)
+    location = Column(String(200), nullable=True)  # Home location name, kept in sync with location_id
+    location_id = Column(Integer, ForeignKey("locations.id"), nullable=True, index=True)
     category = Column(String(100), nullable=True)
     supplier = Column(String(200), nullable=True)
     price_per_unit = Column(Float, nullable=True)
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     barcode = Column(String(100), nullable=True, unique=True)
+    levels = relationship("StockLevel", back_populates="item", cascade="all, delete-orphan")
+
+class StockLevel(Base):
+    """On-hand quantity of one stock item at one location; quantities sum to StockItem.quantity"""
+    __tablename__ = "stock_levels"
+    __table_args__ = (
+        UniqueConstraint("stock_item_id", "location_id", name="uq_stock_level_item_location"),
+        # Covers a location's loadout without reading the rows
+        Index("ix_stock_levels_location_item", "location_id", "stock_item_id", "quantity"),
+    )
+    
+    id = Column(Integer, primary_key=True, index=True)
+    stock_item_id = Column(Integer, ForeignKey("stock_items.id", ondelete="CASCADE"), nullable=False)
+    location_id = Column(Integer, ForeignKey("locations.id"), nullable=False)
+    quantity = Column(Float, nullable=False, default=0)
+    min_threshold = Column(Float, nullable=True)  # Per-location minimum, e.g. a van's loadout
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    item = relationship("StockItem", back_populates="levels")
+
+# Low stock is "quantity - min_threshold <= 0", so the comparison of two
+# columns can be answered from an index on their difference
+Index("ix_stock_items_shortfall", StockItem.quantity - StockItem.min_threshold)
+Index("ix_stock_levels_location_shortfall", StockLevel.location_id, StockLevel.quantity - StockLevel.min_threshold)
+
+class StockTransfer(Base):
+    """Journal of stock moved between locations"""
+    __tablename__ = "stock_transfers"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    stock_item_id = Column(Integer, nullable=False, index=True)
+    from_location_id = Column(Integer, nullable=False)
+    to_location_id = Column(Integer, nullable=False)
+    quantity = Column(Float, nullable=False)
+    note = Column(Text, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow, index=True)
 
 class Appointment(Base):
     __tablename__ = "appointments"
+    __table_args__ = (
+        Index("ix_appointments_technician_start", "technician_id", "start_time"),
+        {"sqlite_autoincrement": True},
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     title = Column(String(200), nullable=False)
     description = Column(Text, nullable=True)
-    start_time = Column(DateTime, nullable=False)
+    start_time = Column(DateTime, nullable=False, index=True)
     end_time = Column(DateTime, nullable=True)
     location = Column(String(200), nullable=True)
     contact_name = Column(String(200), nullable=True)
     contact_phone = Column(String(50), nullable=True)
     contact_email = Column(String(200), nullable=True)
     status = Column(String(20), default="scheduled")  # scheduled, completed, cancelled
+    assigned_to = Column(String(100), nullable=True, index=True)  # Technician name, as on tasks
+    technician_id = Column(Integer, ForeignKey("technicians.id"), nullable=True)
     reminder_sent = Column(Boolean, default=False)
     reminder_3days_sent = Column(Boolean, default=False)
     created_at = Column(DateTime, default=datetime.utcnow)
@@ -59,6 +140,9 @@ class Appointment(Base):
     google_calendar_id = Column(String(500), nullable=True)
     is_synced = Column(Boolean, default=False)
     last_synced_at = Column(DateTime, nullable=True)
+    # RFC 5545 RRULE anchored on start_time; occurrences are expanded on read
+    recurrence_rule = Column(String(500), nullable=True, index=True)
+    recurrence_until = Column(DateTime, nullable=True)  # Last occurrence, NULL if endless
 
 class GoogleCalendarToken(Base):
     __tablename__ = "google_calendar_tokens"
@@ -71,18 +155,225 @@ class GoogleCalendarToken(Base):
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
+class SyncOperationLog(Base):
+    __tablename__ = "sync_operations"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    op_id = Column(String(64), nullable=False, unique=True, index=True)  # Client-generated id
+    entity = Column(String(20), nullable=False)  # task, stock_item, appointment
+    action = Column(String(20), nullable=False)  # create, update, delete, adjust_quantity
+    entity_id = Column(Integer, nullable=True)
+    status = Column(String(20), nullable=False)  # applied, conflict, error
+    error = Column(Text, nullable=True)
+    client_timestamp = Column(DateTime, nullable=False)
+    applied_at = Column(DateTime, default=datetime.utcnow)
+
+class MetricRollup(Base):
+    __tablename__ = "metric_rollups"
+    __table_args__ = (
+        UniqueConstraint("metric", "granularity", "bucket_start", "dimension", name="uq_metric_rollup_bucket"),
+    )
+    
+    id = Column(Integer, primary_key=True, index=True)
+    metric = Column(String(50), nullable=False)  # tasks_created, tasks_closed, appointments, inventory_value
+    granularity = Column(String(10), nullable=False)  # day, week
+    bucket_start = Column(DateTime, nullable=False)
+    dimension = Column(String(100), nullable=False, default="")  # e.g. stock category
+    value = Column(Float, nullable=False, default=0)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+class CacheVersion(Base):
+    __tablename__ = "cache_versions"
+    
+    namespace = Column(String(100), primary_key=True)  # tasks, stock, appointments, ...
+    version = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+class JobClaim(Base):
+    __tablename__ = "job_claims"
+    __table_args__ = (
+        UniqueConstraint("job", "period", name="uq_job_claim_period"),
+    )
+    
+    id = Column(Integer, primary_key=True, index=True)
+    job = Column(String(100), nullable=False)
+    period = Column(String(50), nullable=False)  # e.g. 2024-05-01 for a nightly job
+    claimed_by = Column(String(100), nullable=True)
+    claimed_at = Column(DateTime, default=datetime.utcnow)
+
+class RecurrenceException(Base):
+    """Per-occurrence override or cancellation of a recurring task/appointment"""
+    __tablename__ = "recurrence_exceptions"
+    __table_args__ = (
+        UniqueConstraint("entity", "series_id", "occurrence_start", name="uq_recurrence_exception"),
+    )
+    
+    id = Column(Integer, primary_key=True, index=True)
+    entity = Column(String(20), nullable=False)  # task, appointment
+    series_id = Column(Integer, nullable=False)
+    occurrence_start = Column(DateTime, nullable=False)  # Original start of the occurrence
+    cancelled = Column(Boolean, default=False)
+    overrides = Column(Text, nullable=True)  # JSON of changed fields
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+class StockAlert(Base):
+    """Outbox of low-stock threshold crossings awaiting webhook delivery"""
+    __tablename__ = "stock_alert_outbox"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    stock_item_id = Column(Integer, nullable=False, index=True)
+    event = Column(String(20), nullable=False)  # low_stock, restocked
+    name = Column(String(200), nullable=True)
+    quantity = Column(Float, nullable=True)
+    min_threshold = Column(Float, nullable=True)
+    location = Column(String(200), nullable=True)
+    supplier = Column(String(200), nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    attempts = Column(Integer, default=0)
+    next_attempt_at = Column(DateTime, nullable=True)
+    claimed_by = Column(String(150), nullable=True)
+    delivered_at = Column(DateTime, nullable=True, index=True)
+    last_error = Column(Text, nullable=True)
+
+class CalendarFeed(Base):
+    """Secret-URL iCalendar subscription, optionally limited to one technician"""
+    __tablename__ = "calendar_feeds"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    token = Column(String(64), nullable=False, unique=True, index=True)
+    name = Column(String(200), nullable=True)
+    technician = Column(String(100), nullable=True)  # Technician name, kept in sync with technician_id
+    technician_id = Column(Integer, ForeignKey("technicians.id"), nullable=True)  # NULL: every appointment
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+def _archive_table(table: Table) -> Table:
+    """Cold copy of a table for archived rows: same columns, no uniqueness"""
+    columns = []
+    for column in table.columns:
+        column = column._copy()
+        column.unique = False
+        columns.append(column)
+    return Table(
+        f"{table.name}_archive", Base.metadata, *columns,
+        Column("archived_at", DateTime, default=datetime.utcnow, index=True),
+    )
+
+TaskArchive = _archive_table(Task.__table__)
+AppointmentArchive = _archive_table(Appointment.__table__)
+
 # Database setup - use /tmp for SQLite to ensure write access
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:////tmp/safe_hdf.db")
+if DATABASE_URL.startswith("postgres://"):
+    # Heroku-style URLs aren't accepted by SQLAlchemy 2
+    DATABASE_URL = DATABASE_URL.replace("postgres://", "postgresql://", 1)
 
 if DATABASE_URL.startswith("sqlite"):
-    engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False})
+    engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False, "timeout": 15})
+
+    @event.listens_for(engine, "connect")
+    def _set_sqlite_pragmas(dbapi_connection, connection_record):
+        # WAL lets several worker processes read while one writes
+        cursor = dbapi_connection.cursor()
+        if ":memory:" not in DATABASE_URL:
+            cursor.execute("PRAGMA journal_mode=WAL")
+            cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.close()
 else:
-    engine = create_engine(DATABASE_URL)
+    # Pool sized per worker process: total connections = workers * (size + overflow)
+    engine = create_engine(
+        DATABASE_URL,
+        pool_size=int(os.getenv("DB_POOL_SIZE", "5")),
+        max_overflow=int(os.getenv("DB_MAX_OVERFLOW", "10")),
+        pool_timeout=int(os.getenv("DB_POOL_TIMEOUT", "30")),
+        pool_recycle=int(os.getenv("DB_POOL_RECYCLE", "1800")),
+        pool_pre_ping=True,
+    )
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+def dialect_insert(connection):
+    """INSERT construct supporting ON CONFLICT for the connection's dialect"""
+    if connection.dialect.name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    return insert
+
+# Trigram indexes let the stock search's ILIKE '%term%' use an index on Postgres
+POSTGRES_SEARCH_DDL = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    "CREATE INDEX IF NOT EXISTS ix_stock_items_name_trgm ON stock_items USING gin (name gin_trgm_ops)",
+    "CREATE INDEX IF NOT EXISTS ix_stock_items_barcode_trgm ON stock_items USING gin (barcode gin_trgm_ops)",
+    "CREATE INDEX IF NOT EXISTS ix_stock_items_category_trgm ON stock_items USING gin (category gin_trgm_ops)",
+]
+
+def _add_missing_columns(connection):
+    """create_all only creates missing tables; add columns and indexes introduced since"""
+    inspector = inspect(connection)
+    for table in Base.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+        existing = {column["name"] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name not in existing:
+                column_type = column.type.compile(dialect=connection.dialect)
+                connection.exec_driver_sql(f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}")
+        for index in table.indexes:
+            # IF NOT EXISTS: reflection doesn't report expression indexes, so checkfirst can't see them
+            connection.execute(CreateIndex(index, if_not_exists=True))
+
+def _autoincrement_ids(connection):
+    """Rebuild SQLite tables created without AUTOINCREMENT, and keep their
+    sequences above every archived id.
+
+    Without AUTOINCREMENT SQLite reuses max(id) + 1, so once the newest rows
+    are deleted a new row could take the id of an archived one.
+    """
+    for table, archive in ((Task.__table__, TaskArchive), (Appointment.__table__, AppointmentArchive)):
+        sql = connection.exec_driver_sql(
+            "SELECT sql FROM sqlite_master WHERE type = 'table' AND name = ?", (table.name,)
+        ).scalar()
+        if sql is not None and "AUTOINCREMENT" not in sql.upper():
+            indexes = [
+                name for (name,) in connection.exec_driver_sql(
+                    "SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = ? AND sql IS NOT NULL",
+                    (table.name,),
+                )
+            ]
+            for name in indexes:
+                connection.exec_driver_sql(f'DROP INDEX "{name}"')
+            connection.exec_driver_sql(f"ALTER TABLE {table.name} RENAME TO {table.name}__rebuild")
+            table.create(connection)
+            columns = ", ".join(column.name for column in table.columns)
+            connection.exec_driver_sql(
+                f"INSERT INTO {table.name} ({columns}) SELECT {columns} FROM {table.name}__rebuild"
+            )
+            connection.exec_driver_sql(f"DROP TABLE {table.name}__rebuild")
+        high = connection.exec_driver_sql(
+            f"SELECT max(coalesce((SELECT max(id) FROM {table.name}), 0), "
+            f"coalesce((SELECT max(id) FROM {archive.name}), 0))"
+        ).scalar()
+        seq = connection.exec_driver_sql("SELECT seq FROM sqlite_sequence WHERE name = ?", (table.name,)).first()
+        if seq is None:
+            connection.exec_driver_sql("INSERT INTO sqlite_sequence (name, seq) VALUES (?, ?)", (table.name, high))
+        elif seq[0] < high:
+            connection.exec_driver_sql("UPDATE sqlite_sequence SET seq = ? WHERE name = ?", (high, table.name))
+
 def init_db():
+    with engine.begin() as connection:
+        _add_missing_columns(connection)
     Base.metadata.create_all(bind=engine)
+    if engine.dialect.name == "sqlite":
+        with engine.begin() as connection:
+            _autoincrement_ids(connection)
+    if engine.dialect.name == "postgresql":
+        try:
+            with engine.begin() as connection:
+                for statement in POSTGRES_SEARCH_DDL:
+                    connection.exec_driver_sql(statement)
+        except Exception as e:
+            # Some servers don't ship pg_trgm; search still works, without the index
+            logger.warning("pg_trgm unavailable, stock search indexes not created: %s", e.__class__.__name__)
 
 def get_db():
     db = SessionLocal()
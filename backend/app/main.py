@@ -2,17 +2,64 @@ from fastapi import FastAPI, Depends
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
 from contextlib import asynccontextmanager
+import asyncio
+import os
 
-from app.database import init_db
-from app.routers import tasks, stock, appointments, calendar, sheets
+from app.database import init_db, SessionLocal, engine
+from app.middleware import CompressionMiddleware, CacheControlMiddleware, DiagnosticsMiddleware
+from app.routers import tasks, stock, appointments, calendar, sheets, sync, reports, backups, locations, technicians as technicians_router
+from app.services import rollups, coherence, diagnostics, coalescing, alerts, archive, backup, technicians, inventory
+
+# Hour (UTC) of the nightly rollup compaction, empty to disable
+ROLLUP_COMPACTION_HOUR = os.getenv("ROLLUP_COMPACTION_HOUR", "3")
+# Hour (UTC) of the nightly hot/cold archive run, empty to disable
+ARCHIVE_HOUR = os.getenv("ARCHIVE_HOUR", "2")
+# Hour (UTC) of the nightly SQLite snapshot, empty to disable
+BACKUP_HOUR = os.getenv("BACKUP_HOUR", "")
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Startup
-    init_db()
+    rollups.install(SessionLocal)
+    coherence.install(SessionLocal)
+    diagnostics.install(engine)
+    alerts.install(SessionLocal)
+    technicians.install(SessionLocal)
+    inventory.install(SessionLocal)
+    # Workers start concurrently in multi-worker mode; only one creates the schema
+    with coherence.startup_lock():
+        init_db()
+        db = SessionLocal()
+        try:
+            rollups.ensure_baseline(db)
+            technicians.backfill(db)
+            inventory.reconcile(db)
+        finally:
+            db.close()
+    compaction_task = None
+    if ROLLUP_COMPACTION_HOUR:
+        compaction_task = asyncio.create_task(
+            rollups.run_nightly(SessionLocal, int(ROLLUP_COMPACTION_HOUR))
+        )
+    archive_task = None
+    if ARCHIVE_HOUR:
+        archive_task = asyncio.create_task(archive.run_nightly(SessionLocal, int(ARCHIVE_HOUR)))
+    backup_task = None
+    if BACKUP_HOUR and engine.dialect.name == "sqlite":
+        backup_task = asyncio.create_task(backup.run_nightly(SessionLocal, int(BACKUP_HOUR)))
+    alert_task = None
+    if alerts.enabled():
+        alert_task = asyncio.create_task(alerts.run_delivery(SessionLocal))
     yield
     # Shutdown
-    pass
+    if compaction_task:
+        compaction_task.cancel()
+    if archive_task:
+        archive_task.cancel()
+    if backup_task:
+        backup_task.cancel()
+    if alert_task:
+        alert_task.cancel()
 
 app = FastAPI(
     title="Safe HDF API",
@@ -30,12 +77,42 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Cache policies: stats can be slightly stale, everything else revalidates via ETag
+STATS_CACHE_POLICY = "max-age=15, stale-while-revalidate=60"
+CACHE_POLICIES = {
+    "/dashboard/stats": STATS_CACHE_POLICY,
+    "/tasks/stats/by-status": STATS_CACHE_POLICY,
+    "/tasks/stats/overdue": STATS_CACHE_POLICY,
+    "/stock/stats/by-category": STATS_CACHE_POLICY,
+    "/stock/stats/low-stock": STATS_CACHE_POLICY,
+    "/stock/stats/by-location": STATS_CACHE_POLICY,
+    "/health": "no-store",
+    "/metrics/coalescing": "no-store",
+    "/admin/backups": "no-store",
+}
+app.add_middleware(CacheControlMiddleware, policies=CACHE_POLICIES)
+
+# Compression (brotli when installed, gzip otherwise) for responses above the threshold
+app.add_middleware(
+    CompressionMiddleware,
+    minimum_size=int(os.getenv("COMPRESSION_MIN_SIZE", "1024")),
+)
+
+# Slow-query log, N+1 detection and admin profiling; outermost so profiles cover everything
+if diagnostics.enabled():
+    app.add_middleware(DiagnosticsMiddleware)
+
 # Include routers
 app.include_router(tasks.router)
 app.include_router(stock.router)
 app.include_router(appointments.router)
 app.include_router(calendar.router)
 app.include_router(sheets.router)
+app.include_router(sync.router)
+app.include_router(reports.router)
+app.include_router(technicians_router.router)
+app.include_router(locations.router)
+app.include_router(backups.router)
 
 @app.get("/")
 def root():
@@ -49,7 +126,16 @@ def root():
 def health_check():
     return {"status": "healthy"}
 
+@app.get("/metrics/coalescing")
+def coalescing_metrics():
+    """Per-route single-flight counters for this worker process"""
+    return {"enabled": coalescing.REQUEST_COALESCING, "routes": coalescing.stats()}
+
+# Overdue/upcoming counts move with the clock, so entries also expire
+dashboard_stats_cache = coherence.VersionedCache(ttl=15)
+
 @app.get("/dashboard/stats")
+@coalescing.coalesce("/dashboard/stats")
 def get_dashboard_stats(db=Depends(lambda: None)):
     from sqlalchemy.orm import Session
     from app.database import get_db, Task, StockItem, Appointment
@@ -59,7 +145,7 @@ def get_dashboard_stats(db=Depends(lambda: None)):
     db_gen = get_db()
     db = next(db_gen)
     
-    try:
+    def compute_stats():
         # Tasks stats
         total_tasks = db.query(Task).count()
         tasks_by_status = {}
@@ -74,12 +160,17 @@ def get_dashboard_stats(db=Depends(lambda: None)):
         
         # Stock stats
         total_stock_items = db.query(StockItem).count()
-        low_stock_items = db.query(StockItem).filter(
-            StockItem.quantity <= StockItem.min_threshold
-        ).count()
+        low_stock_items = db.query(StockItem).filter(inventory.ITEM_IS_LOW).count()
+        
+        # Archived rows are old done/cancelled tasks and past completed/cancelled appointments,
+        # so they only add to totals, never to overdue/upcoming counts
+        archived = archive.archived_counts(db)
+        for status, count in archived["tasks_by_status"].items():
+            tasks_by_status[status] = tasks_by_status.get(status, 0) + count
+        total_tasks += sum(archived["tasks_by_status"].values())
         
         # Appointments stats
-        total_appointments = db.query(Appointment).count()
+        total_appointments = db.query(Appointment).count() + archived["appointments"]
         now = datetime.utcnow()
         upcoming_appointments = db.query(Appointment).filter(
             Appointment.start_time >= now,
@@ -103,5 +194,11 @@ def get_dashboard_stats(db=Depends(lambda: None)):
             "upcoming_appointments": upcoming_appointments,
             "appointments_next_3_days": appointments_next_3_days
         }
+    
+    try:
+        # Shared across requests, invalidated by writes from any worker
+        return dashboard_stats_cache.get_or_compute(
+            db, "dashboard", ("tasks", "stock", "appointments"), compute_stats
+        )
     finally:
         db_gen.close()
\ No newline at end of file
@@ -0,0 +1,294 @@
+import hashlib
+import json
+import time
+import zlib
+from typing import Dict, Optional
+from starlette.datastructures import Headers, MutableHeaders, QueryParams
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from app.services import diagnostics
+
+try:
+    import brotli
+except ImportError:  # brotli is optional, gzip is always available
+    brotli = None
+
+COMPRESSIBLE_TYPES = (
+    "application/json",
+    "text/",
+    "application/javascript",
+    "application/xml",
+)
+
+
+def _accepted_encodings(accept_encoding: str) -> Dict[str, float]:
+    encodings = {}
+    for part in accept_encoding.split(","):
+        name, _, params = part.strip().partition(";")
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        if name:
+            encodings[name.strip().lower()] = quality
+    return encodings
+
+
+def negotiate_encoding(accept_encoding: str) -> Optional[str]:
+    """Pick br or gzip from an Accept-Encoding header, preferring brotli"""
+    accepted = _accepted_encodings(accept_encoding)
+    candidates = (["br"] if brotli is not None else []) + ["gzip"]
+    best, best_quality = None, 0.0
+    for encoding in candidates:
+        quality = accepted.get(encoding, accepted.get("*", 0.0))
+        if quality > best_quality:
+            best, best_quality = encoding, quality
+    return best
+
+
+class _Compressor:
+    def __init__(self, encoding: str, gzip_level: int, brotli_quality: int):
+        self.encoding = encoding
+        if encoding == "br":
+            self._compressor = brotli.Compressor(quality=brotli_quality)
+        else:
+            self._compressor = zlib.compressobj(gzip_level, zlib.DEFLATED, 31)
+
+    def compress(self, data: bytes) -> bytes:
+        if self.encoding == "br":
+            return self._compressor.process(data)
+        return self._compressor.compress(data)
+
+    def flush(self) -> bytes:
+        if self.encoding == "br":
+            return self._compressor.finish()
+        return self._compressor.flush()
+
+
+class CompressionMiddleware:
+    """Negotiated gzip/brotli compression for responses above a size threshold.
+
+    Single-message responses are compressed in one pass; streamed
+    responses are compressed chunk by chunk.
+    """
+
+    def __init__(self, app: ASGIApp, minimum_size: int = 1024,
+                 gzip_level: int = 6, brotli_quality: int = 4):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        encoding = negotiate_encoding(Headers(scope=scope).get("accept-encoding", ""))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start_message: Optional[Message] = None
+        compressor: Optional[_Compressor] = None
+        passthrough = False
+
+        async def send_compressed(message: Message) -> None:
+            nonlocal start_message, compressor, passthrough
+            if message["type"] == "http.response.start":
+                start_message = message
+                return
+            if message["type"] != "http.response.body":
+                await send(message)
+                return
+            if passthrough:
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+
+            if compressor is None:
+                headers = MutableHeaders(raw=start_message["headers"])
+                content_type = headers.get("content-type", "")
+                if (
+                    "content-encoding" in headers
+                    or not content_type.startswith(COMPRESSIBLE_TYPES)
+                    or (not more_body and len(body) < self.minimum_size)
+                ):
+                    passthrough = True
+                    await send(start_message)
+                    await send(message)
+                    return
+
+                compressor = _Compressor(encoding, self.gzip_level, self.brotli_quality)
+                headers["Content-Encoding"] = encoding
+                headers.add_vary_header("Accept-Encoding")
+                if not more_body:
+                    body = compressor.compress(body) + compressor.flush()
+                    headers["Content-Length"] = str(len(body))
+                    await send(start_message)
+                    await send({"type": "http.response.body", "body": body})
+                    return
+                del headers["Content-Length"]
+                await send(start_message)
+
+            chunk = compressor.compress(body)
+            if not more_body:
+                chunk += compressor.flush()
+            await send({"type": "http.response.body", "body": chunk, "more_body": more_body})
+
+        await self.app(scope, receive, send_compressed)
+
+
+class CacheControlMiddleware:
+    """Per-route Cache-Control policies with ETag revalidation for GET responses.
+
+    `policies` maps exact paths to a Cache-Control value; other GET
+    routes get `default_policy`. Responses that already set
+    Cache-Control or ETag are left untouched.
+    """
+
+    def __init__(self, app: ASGIApp, policies: Dict[str, str],
+                 default_policy: Optional[str] = "no-cache"):
+        self.app = app
+        self.policies = {path.rstrip("/") or "/": value for path, value in policies.items()}
+        self.default_policy = default_policy
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or scope["method"] not in ("GET", "HEAD"):
+            await self.app(scope, receive, send)
+            return
+        policy = self.policies.get(scope["path"].rstrip("/") or "/", self.default_policy)
+        if policy is None:
+            await self.app(scope, receive, send)
+            return
+        if_none_match = Headers(scope=scope).get("if-none-match")
+
+        start_message: Optional[Message] = None
+        passthrough = False
+
+        async def send_with_cache_headers(message: Message) -> None:
+            nonlocal start_message, passthrough
+            if message["type"] == "http.response.start":
+                headers = Headers(raw=message["headers"])
+                if (
+                    message["status"] != 200
+                    or "cache-control" in headers
+                    or "etag" in headers
+                ):
+                    passthrough = True
+                    await send(message)
+                else:
+                    start_message = message
+                return
+            if passthrough or message["type"] != "http.response.body":
+                await send(message)
+                return
+            if message.get("more_body", False):
+                # Streamed bodies can't be hashed up front, only tag the policy
+                passthrough = True
+                MutableHeaders(raw=start_message["headers"])["Cache-Control"] = policy
+                await send(start_message)
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            etag = 'W/"%s"' % hashlib.blake2b(body, digest_size=12).hexdigest()
+            headers = MutableHeaders(raw=start_message["headers"])
+            headers["Cache-Control"] = policy
+            headers["ETag"] = etag
+            if if_none_match and etag in (tag.strip() for tag in if_none_match.split(",")):
+                not_modified = MutableHeaders(raw=[])
+                for name in ("cache-control", "etag", "vary"):
+                    if name in headers:
+                        not_modified[name] = headers[name]
+                await send({
+                    "type": "http.response.start",
+                    "status": 304,
+                    "headers": not_modified.raw,
+                })
+                await send({"type": "http.response.body", "body": b""})
+                return
+            await send(start_message)
+            await send(message)
+
+        await self.app(scope, receive, send_with_cache_headers)
+
+
+class DiagnosticsMiddleware:
+    """Per-request SQL accounting (slow queries, N+1) and on-demand profiling.
+
+    Admins (X-Admin-Token header) can add `?profile=1` or `X-Profile: 1`
+    to run the request under the sampling profiler; the response is then
+    replaced by a JSON report whose `folded` field feeds flamegraph.pl or
+    speedscope.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        token = diagnostics.begin_request(scope)
+        try:
+            if self._wants_profile(scope):
+                await self._profile(scope, receive, send)
+            else:
+                await self.app(scope, receive, send)
+        finally:
+            diagnostics.end_request(token)
+
+    @staticmethod
+    def _wants_profile(scope: Scope) -> bool:
+        if not diagnostics.ADMIN_TOKEN:
+            return False
+        headers = Headers(scope=scope)
+        requested = (
+            headers.get("x-profile") == "1"
+            or QueryParams(scope.get("query_string", b"")).get("profile") == "1"
+        )
+        return requested and diagnostics.is_admin(headers.get("x-admin-token"))
+
+    async def _profile(self, scope: Scope, receive: Receive, send: Send) -> None:
+        status_code = None
+
+        async def capture(message: Message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+
+        profiler = diagnostics.SamplingProfiler()
+        started = time.perf_counter()
+        profiler.start()
+        try:
+            await self.app(scope, receive, capture)
+        finally:
+            profiler.stop()
+        duration_ms = (time.perf_counter() - started) * 1000
+
+        stats = diagnostics.current_request()
+        report = {
+            "route": stats.route,
+            "status_code": status_code,
+            "duration_ms": round(duration_ms, 3),
+            "interval_ms": profiler.interval * 1000,
+            "samples": profiler.samples,
+            "queries": stats.query_count,
+            "repeated_queries": stats.repeated(2),
+            "folded": profiler.folded(),
+        }
+        body = json.dumps(report).encode()
+        await send({
+            "type": "http.response.start",
+            "status": 200,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                (b"cache-control", b"no-store"),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
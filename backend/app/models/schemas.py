@@ -1,6 +1,6 @@
 from pydantic import BaseModel, Field
 from datetime import datetime
-from typing import Optional, List
+from typing import Optional, List, Literal
 from enum import Enum
 
 class Priority(str, Enum):
@@ -22,7 +22,9 @@ class TaskBase(BaseModel):
     status: TaskStatus = TaskStatus.TODO
     due_date: Optional[datetime] = None
     assigned_to: Optional[str] = None
+    technician_id: Optional[int] = None
     tags: Optional[str] = None
+    recurrence_rule: Optional[str] = Field(None, max_length=500, description="RRULE, e.g. FREQ=MONTHLY;INTERVAL=1")
 
 class TaskCreate(TaskBase):
     pass
@@ -34,12 +36,107 @@ class TaskUpdate(BaseModel):
     status: Optional[TaskStatus] = None
     due_date: Optional[datetime] = None
     assigned_to: Optional[str] = None
+    technician_id: Optional[int] = None
     tags: Optional[str] = None
+    recurrence_rule: Optional[str] = Field(None, max_length=500)
+
+class TaskOccurrenceUpdate(BaseModel):
+    title: Optional[str] = Field(None, min_length=1, max_length=200)
+    description: Optional[str] = None
+    priority: Optional[Priority] = None
+    status: Optional[TaskStatus] = None
+    due_date: Optional[datetime] = None
+    assigned_to: Optional[str] = None
+
+class AutoAssignRequest(BaseModel):
+    task_ids: Optional[List[int]] = Field(None, description="Only these tasks (default: every open unassigned task)")
+    technician_ids: Optional[List[int]] = Field(None, description="Only these technicians (default: all active)")
+    horizon_days: int = Field(14, ge=1, le=90)
+    apply: bool = False
 
 class Task(TaskBase):
     id: int
     created_at: datetime
     updated_at: datetime
+    recurrence_until: Optional[datetime] = None
+    occurrence_start: Optional[datetime] = None  # Set on expanded occurrences of a series
+
+    class Config:
+        from_attributes = True
+
+class TechnicianBase(BaseModel):
+    name: str = Field(..., min_length=1, max_length=100)
+    email: Optional[str] = None
+    phone: Optional[str] = None
+    daily_capacity_hours: float = Field(default=7, ge=0, le=24)
+    active: bool = True
+
+class TechnicianCreate(TechnicianBase):
+    pass
+
+class TechnicianUpdate(BaseModel):
+    name: Optional[str] = Field(None, min_length=1, max_length=100)
+    email: Optional[str] = None
+    phone: Optional[str] = None
+    daily_capacity_hours: Optional[float] = Field(None, ge=0, le=24)
+    active: Optional[bool] = None
+
+class Technician(TechnicianBase):
+    id: int
+    created_at: datetime
+    updated_at: datetime
+
+    class Config:
+        from_attributes = True
+
+class LocationBase(BaseModel):
+    name: str = Field(..., min_length=1, max_length=200)
+    technician_id: Optional[int] = None
+    active: bool = True
+
+class LocationCreate(LocationBase):
+    pass
+
+class LocationUpdate(BaseModel):
+    name: Optional[str] = Field(None, min_length=1, max_length=200)
+    technician_id: Optional[int] = None
+
+class Location(LocationBase):
+    id: int
+    created_at: datetime
+    updated_at: datetime
+
+    class Config:
+        from_attributes = True
+
+class StockLevel(BaseModel):
+    location_id: int
+    location: str
+    quantity: float
+    min_threshold: Optional[float] = None
+    updated_at: Optional[datetime] = None
+
+class StockLevelUpdate(BaseModel):
+    min_threshold: Optional[float] = Field(None, ge=0, description="Minimum to keep at this location, null to clear")
+
+class StockTransferLine(BaseModel):
+    stock_item_id: int
+    quantity: float = Field(..., gt=0)
+
+class StockTransferCreate(BaseModel):
+    from_location_id: int
+    to_location_id: int
+    lines: List[StockTransferLine] = Field(..., min_length=1)
+    note: Optional[str] = None
+
+class StockTransfer(BaseModel):
+    id: int
+    stock_item_id: int
+    from_location_id: int
+    to_location_id: int
+    quantity: float
+    note: Optional[str] = None
+    created_at: datetime
 
     class Config:
         from_attributes = True
@@ -51,6 +148,7 @@ class StockItemBase(BaseModel):
     unit: str = Field(default="unit", max_length=50)
     min_threshold: float = Field(default=10, ge=0)
     location: Optional[str] = None
+    location_id: Optional[int] = None
     category: Optional[str] = None
     supplier: Optional[str] = None
     price_per_unit: Optional[float] = Field(None, ge=0)
@@ -66,6 +164,7 @@ class StockItemUpdate(BaseModel):
     unit: Optional[str] = Field(None, max_length=50)
     min_threshold: Optional[float] = Field(None, ge=0)
     location: Optional[str] = None
+    location_id: Optional[int] = None
     category: Optional[str] = None
     supplier: Optional[str] = None
     price_per_unit: Optional[float] = Field(None, ge=0)
@@ -79,6 +178,18 @@ class StockItem(StockItemBase):
     class Config:
         from_attributes = True
 
+class StockImportError(BaseModel):
+    row: int
+    error: str
+
+class StockImportResult(BaseModel):
+    message: str
+    created: int
+    updated: int
+    total_rows: int
+    error_count: int
+    errors: List[StockImportError] = []
+
 class AppointmentStatus(str, Enum):
     SCHEDULED = "scheduled"
     COMPLETED = "completed"
@@ -94,6 +205,9 @@ class AppointmentBase(BaseModel):
     contact_phone: Optional[str] = None
     contact_email: Optional[str] = None
     status: AppointmentStatus = AppointmentStatus.SCHEDULED
+    assigned_to: Optional[str] = Field(None, max_length=100)
+    technician_id: Optional[int] = None
+    recurrence_rule: Optional[str] = Field(None, max_length=500, description="RRULE, e.g. FREQ=YEARLY")
 
 class AppointmentCreate(AppointmentBase):
     pass
@@ -108,6 +222,20 @@ class AppointmentUpdate(BaseModel):
     contact_phone: Optional[str] = None
     contact_email: Optional[str] = None
     status: Optional[AppointmentStatus] = None
+    assigned_to: Optional[str] = Field(None, max_length=100)
+    technician_id: Optional[int] = None
+    recurrence_rule: Optional[str] = Field(None, max_length=500)
+
+class AppointmentOccurrenceUpdate(BaseModel):
+    title: Optional[str] = Field(None, min_length=1, max_length=200)
+    description: Optional[str] = None
+    start_time: Optional[datetime] = None
+    end_time: Optional[datetime] = None
+    location: Optional[str] = None
+    contact_name: Optional[str] = None
+    contact_phone: Optional[str] = None
+    contact_email: Optional[str] = None
+    status: Optional[AppointmentStatus] = None
 
 class Appointment(AppointmentBase):
     id: int
@@ -119,6 +247,8 @@ class Appointment(AppointmentBase):
     last_synced_at: Optional[datetime] = None
     created_at: datetime
     updated_at: datetime
+    recurrence_until: Optional[datetime] = None
+    occurrence_start: Optional[datetime] = None  # Set on expanded occurrences of a series
 
     class Config:
         from_attributes = True
@@ -148,6 +278,46 @@ class CalendarConnectionStatus(BaseModel):
     email: Optional[str] = None
     last_synced: Optional[datetime] = None
 
+class CalendarFeedCreate(BaseModel):
+    name: Optional[str] = Field(None, max_length=200)
+    technician: Optional[str] = Field(None, max_length=100, description="Only this technician's appointments (name)")
+    technician_id: Optional[int] = Field(None, description="Only this technician's appointments")
+
+class CalendarFeed(BaseModel):
+    id: int
+    name: Optional[str] = None
+    technician: Optional[str] = None
+    technician_id: Optional[int] = None
+    token: str
+    url: str
+    created_at: datetime
+
+class SyncOperation(BaseModel):
+    op_id: str = Field(..., min_length=1, max_length=64)
+    entity: Literal["task", "stock_item", "appointment"]
+    action: Literal["create", "update", "delete", "adjust_quantity"]
+    id: Optional[int] = None  # Server id of the target row
+    ref: Optional[str] = None  # op_id of an earlier create, for rows created offline
+    data: dict = {}
+    client_timestamp: datetime
+
+class SyncPushRequest(BaseModel):
+    operations: List[SyncOperation] = Field(..., max_length=500)
+
+class SyncOperationResult(BaseModel):
+    op_id: str
+    status: str  # applied, duplicate, conflict, error
+    entity: str
+    id: Optional[int] = None
+    error: Optional[str] = None
+
+class SyncPushResponse(BaseModel):
+    results: List[SyncOperationResult]
+    tasks: List[Task] = []
+    stock_items: List[StockItem] = []
+    appointments: List[Appointment] = []
+    deleted: dict = {}
+
 class DashboardStats(BaseModel):
     total_tasks: int
     tasks_by_status: dict
@@ -1,13 +1,17 @@
 from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.encoders import jsonable_encoder
 from sqlalchemy.orm import Session
 from typing import List, Optional
 from datetime import datetime, timedelta
 from app.database import get_db
-from app.models.schemas import Appointment, AppointmentCreate, AppointmentUpdate
+from app.models.schemas import Appointment, AppointmentCreate, AppointmentUpdate, AppointmentOccurrenceUpdate
 from app.database import Appointment as AppointmentModel
+from app.services import serialization, coalescing, recurrence, archive, technicians
 
 router = APIRouter(prefix="/appointments", tags=["appointments"])
 
+appointment_serializer = serialization.RowSerializer(Appointment, AppointmentModel)
+
 @router.get("/", response_model=List[Appointment])
 def get_appointments(
     skip: int = 0,
@@ -15,30 +19,69 @@ def get_appointments(
     status: Optional[str] = None,
     from_date: Optional[datetime] = None,
     to_date: Optional[datetime] = None,
+    technician_id: Optional[int] = None,
+    fields: Optional[str] = Query(None, description="Comma-separated fields to return, e.g. id,title,status"),
+    include_archived: bool = Query(False, description="Also return archived (past) appointments"),
     db: Session = Depends(get_db)
 ):
-    query = db.query(AppointmentModel)
+    # Stored datetimes are naive UTC; offset-aware bounds are converted once for SQL and expansion
+    from_date, to_date = recurrence.naive_utc_or_none(from_date), recurrence.naive_utc_or_none(to_date)
+    entity = archive.source(AppointmentModel, include_archived)
+    query = db.query(entity)
     
     if status:
-        query = query.filter(AppointmentModel.status == status)
+        query = query.filter(entity.status == status)
     if from_date:
-        query = query.filter(AppointmentModel.start_time >= from_date)
+        query = query.filter(entity.start_time >= from_date)
     if to_date:
-        query = query.filter(AppointmentModel.start_time <= to_date)
+        query = query.filter(entity.start_time <= to_date)
+    if technician_id is not None:
+        query = query.filter(entity.technician_id == technician_id)
+    
+    if fields or serialization.FAST_SERIALIZATION:
+        try:
+            serializer = appointment_serializer.project(fields)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+    else:
+        serializer = None
+    
+    # Recurring appointments only expand within an explicit window
+    series = recurrence.series_in_window(db, recurrence.APPOINTMENTS, from_date, to_date) if to_date else []
+    if series:
+        items = recurrence.expand(
+            db, recurrence.APPOINTMENTS, query.order_by(entity.start_time.asc()), series,
+            from_date, to_date, skip, limit,
+            lambda values: (
+                (not status or values["status"] == status)
+                and (technician_id is None or values["technician_id"] == technician_id)
+            ),
+            entity,
+        )
+        return serializer.dicts_response(items) if serializer else items
     
-    return query.order_by(AppointmentModel.start_time.asc()).offset(skip).limit(limit).all()
+    query = query.order_by(entity.start_time.asc()).offset(skip).limit(limit)
+    if serializer:
+        return serializer.response(query, entity)
+    return serialization.stream(query).all()
 
 @router.post("/", response_model=Appointment)
 def create_appointment(appointment: AppointmentCreate, db: Session = Depends(get_db)):
     db_appointment = AppointmentModel(**appointment.dict())
+    try:
+        technicians.check(db, db_appointment.technician_id, db_appointment.assigned_to)
+        recurrence.apply_rule(db_appointment, recurrence.APPOINTMENTS)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     db.add(db_appointment)
     db.commit()
     db.refresh(db_appointment)
     return db_appointment
 
 @router.get("/{appointment_id}", response_model=Appointment)
-def get_appointment(appointment_id: int, db: Session = Depends(get_db)):
-    appointment = db.query(AppointmentModel).filter(AppointmentModel.id == appointment_id).first()
+def get_appointment(appointment_id: int, include_archived: bool = False, db: Session = Depends(get_db)):
+    entity = archive.source(AppointmentModel, include_archived)
+    appointment = db.query(entity).filter(entity.id == appointment_id).first()
     if not appointment:
         raise HTTPException(status_code=404, detail="Appointment not found")
     return appointment
@@ -50,8 +93,17 @@ def update_appointment(appointment_id: int, appointment_update: AppointmentUpdat
         raise HTTPException(status_code=404, detail="Appointment not found")
     
     update_data = appointment_update.dict(exclude_unset=True)
+    try:
+        technicians.check(db, update_data.get("technician_id"), update_data.get("assigned_to"))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     for field, value in update_data.items():
         setattr(appointment, field, value)
+    if "recurrence_rule" in update_data or "start_time" in update_data:
+        try:
+            recurrence.apply_rule(appointment, recurrence.APPOINTMENTS)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
     
     appointment.updated_at = datetime.utcnow()
     db.commit()
@@ -64,35 +116,67 @@ def delete_appointment(appointment_id: int, db: Session = Depends(get_db)):
     if not appointment:
         raise HTTPException(status_code=404, detail="Appointment not found")
     
+    recurrence.delete_exceptions(db, recurrence.APPOINTMENTS, appointment.id)
     db.delete(appointment)
     db.commit()
     return {"message": "Appointment deleted successfully"}
 
-@router.get("/upcoming/next-3-days")
-def get_appointments_next_3_days(db: Session = Depends(get_db)):
+def _upcoming(db: Session, days: int) -> list:
+    """Scheduled appointments and series occurrences starting in the next `days` days"""
     now = datetime.utcnow()
-    three_days_later = now + timedelta(days=3)
+    later = now + timedelta(days=days)
     
-    appointments = db.query(AppointmentModel).filter(
+    query = db.query(AppointmentModel).filter(
         AppointmentModel.start_time >= now,
-        AppointmentModel.start_time <= three_days_later,
+        AppointmentModel.start_time <= later,
         AppointmentModel.status == "scheduled"
-    ).order_by(AppointmentModel.start_time.asc()).all()
+    ).order_by(AppointmentModel.start_time.asc())
     
-    return appointments
+    series = recurrence.series_in_window(db, recurrence.APPOINTMENTS, now, later)
+    return recurrence.expand(
+        db, recurrence.APPOINTMENTS, query, series, now, later,
+        matches=lambda values: values["status"] == "scheduled",
+    )
+
+@router.get("/upcoming/next-3-days")
+@coalescing.coalesce("/appointments/upcoming/next-3-days")
+def get_appointments_next_3_days(db: Session = Depends(get_db)):
+    # Encoded here so coalesced callers share plain data, not session-bound rows
+    return jsonable_encoder(_upcoming(db, 3))
 
 @router.get("/upcoming/this-week")
 def get_appointments_this_week(db: Session = Depends(get_db)):
-    now = datetime.utcnow()
-    week_later = now + timedelta(days=7)
-    
-    appointments = db.query(AppointmentModel).filter(
-        AppointmentModel.start_time >= now,
-        AppointmentModel.start_time <= week_later,
-        AppointmentModel.status == "scheduled"
-    ).order_by(AppointmentModel.start_time.asc()).all()
-    
-    return appointments
+    return _upcoming(db, 7)
+
+@router.put("/{appointment_id}/occurrences/{occurrence_start}", response_model=Appointment)
+def update_appointment_occurrence(
+    appointment_id: int,
+    occurrence_start: datetime,
+    changes: AppointmentOccurrenceUpdate,
+    db: Session = Depends(get_db)
+):
+    """Override fields of one occurrence (e.g. move it) of a recurring appointment"""
+    appointment = db.query(AppointmentModel).filter(AppointmentModel.id == appointment_id).first()
+    if not appointment:
+        raise HTTPException(status_code=404, detail="Appointment not found")
+    try:
+        return recurrence.set_exception(
+            db, recurrence.APPOINTMENTS, appointment, occurrence_start, changes.dict(exclude_unset=True)
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.delete("/{appointment_id}/occurrences/{occurrence_start}")
+def cancel_appointment_occurrence(appointment_id: int, occurrence_start: datetime, db: Session = Depends(get_db)):
+    """Skip one occurrence of a recurring appointment"""
+    appointment = db.query(AppointmentModel).filter(AppointmentModel.id == appointment_id).first()
+    if not appointment:
+        raise HTTPException(status_code=404, detail="Appointment not found")
+    try:
+        recurrence.set_exception(db, recurrence.APPOINTMENTS, appointment, occurrence_start, cancelled=True)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"message": "Occurrence cancelled"}
 
 @router.post("/{appointment_id}/mark-reminder-sent")
 def mark_reminder_sent(appointment_id: int, days: int = 3, db: Session = Depends(get_db)):
@@ -0,0 +1,58 @@
+from typing import Optional
+from fastapi import APIRouter, BackgroundTasks, Depends, Header, HTTPException
+from app.services import backup, diagnostics
+
+
+def require_admin(x_admin_token: Optional[str] = Header(None)):
+    if not diagnostics.ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Admin endpoints are disabled (ADMIN_TOKEN is not set)")
+    if not diagnostics.is_admin(x_admin_token):
+        raise HTTPException(status_code=403, detail="Invalid admin token")
+
+
+router = APIRouter(prefix="/admin/backups", tags=["admin"], dependencies=[Depends(require_admin)])
+
+
+def _background_snapshot():
+    try:
+        backup.create_snapshot(reserved=True)
+    except Exception as e:
+        print(f"Backup failed: {e}")
+
+
+@router.get("")
+def list_backups():
+    """Compressed snapshots on disk, newest first"""
+    try:
+        return {"running": backup.is_running(), "snapshots": backup.list_snapshots()}
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@router.post("", status_code=202)
+def create_backup(background_tasks: BackgroundTasks, wait: bool = False):
+    """Take an online snapshot; runs after the response unless `wait=true`"""
+    try:
+        backup.database_path()
+        backup.backup_dir()
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    # Reserved before answering, so two concurrent requests can't both get a 202
+    if not backup.reserve():
+        raise HTTPException(status_code=409, detail="A snapshot is already being taken")
+    if wait:
+        try:
+            return backup.create_snapshot(reserved=True)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+    background_tasks.add_task(_background_snapshot)
+    return {"message": "Snapshot started"}
+
+
+@router.post("/{name}/verify")
+def verify_backup(name: str):
+    """Restore a snapshot into a scratch file and run PRAGMA integrity_check on it"""
+    try:
+        return backup.verify(name)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
@@ -1,14 +1,17 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
 from sqlalchemy.orm import Session
-from typing import Optional
+from typing import List, Optional
 from datetime import datetime
-from app.database import get_db
+from app.database import get_db, CalendarFeed as CalendarFeedModel
 from app.services.google_calendar import GoogleCalendarService
+from app.services import coalescing, calendar_feed, technicians
 from app.models.schemas import (
     GoogleCalendarSyncRequest, 
     GoogleCalendarAuthUrl,
     GoogleCalendarTokenResponse,
-    CalendarConnectionStatus
+    CalendarConnectionStatus,
+    CalendarFeed,
+    CalendarFeedCreate
 )
 
 router = APIRouter(prefix="/calendar", tags=["calendar"])
@@ -53,6 +56,7 @@ def get_connection_status(db: Session = Depends(get_db)):
     }
 
 @router.post("/sync")
+@coalescing.coalesce("/calendar/sync")
 def sync_calendar(
     request: GoogleCalendarSyncRequest,
     db: Session = Depends(get_db)
@@ -81,4 +85,61 @@ def create_google_event(
         event_id = service.create_event(appointment_id, calendar_id)
         return {"message": "Event created", "event_id": event_id}
     except ValueError as e:
-        raise HTTPException(status_code=400, detail=str(e))
\ No newline at end of file
+        raise HTTPException(status_code=400, detail=str(e))
+
+def _feed_response(feed: CalendarFeedModel, request: Request) -> dict:
+    return {
+        "id": feed.id,
+        "name": feed.name,
+        "technician": feed.technician,
+        "technician_id": feed.technician_id,
+        "token": feed.token,
+        "url": str(request.url_for("get_calendar_feed", token=feed.token)),
+        "created_at": feed.created_at,
+    }
+
+@router.post("/feeds", response_model=CalendarFeed)
+def create_calendar_feed(feed: CalendarFeedCreate, request: Request, db: Session = Depends(get_db)):
+    """Create a secret iCalendar subscription URL, for everyone or one technician"""
+    data = feed.dict()
+    try:
+        data["technician_id"], data["technician"] = technicians.lookup(db, data["technician_id"], data["technician"])
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    db_feed = CalendarFeedModel(token=calendar_feed.new_token(), **data)
+    db.add(db_feed)
+    db.commit()
+    db.refresh(db_feed)
+    return _feed_response(db_feed, request)
+
+@router.get("/feeds", response_model=List[CalendarFeed])
+def list_calendar_feeds(request: Request, db: Session = Depends(get_db)):
+    return [_feed_response(feed, request) for feed in db.query(CalendarFeedModel).order_by(CalendarFeedModel.id)]
+
+@router.delete("/feeds/{feed_id}")
+def delete_calendar_feed(feed_id: int, db: Session = Depends(get_db)):
+    """Revoke a feed; its URL stops working"""
+    feed = db.query(CalendarFeedModel).filter(CalendarFeedModel.id == feed_id).first()
+    if not feed:
+        raise HTTPException(status_code=404, detail="Calendar feed not found")
+    db.delete(feed)
+    db.commit()
+    return {"message": "Calendar feed deleted successfully"}
+
+@router.get("/feed/{token}.ics")
+def get_calendar_feed(token: str, request: Request, db: Session = Depends(get_db)):
+    """iCalendar feed of appointments for phone calendar subscriptions.
+
+    Repeated polls are answered from memory (304 when the ETag or
+    Last-Modified still matches), and only changed appointments are
+    re-rendered when something moved.
+    """
+    feed = calendar_feed.lookup(db, token)
+    if feed is None:
+        raise HTTPException(status_code=404, detail="Calendar feed not found")
+    headers = feed.headers()
+    if calendar_feed.not_modified(
+        feed, request.headers.get("if-none-match"), request.headers.get("if-modified-since")
+    ):
+        return Response(status_code=304, headers=headers)
+    return Response(content=feed.body, media_type="text/calendar; charset=utf-8", headers=headers)
@@ -0,0 +1,82 @@
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+from typing import List
+from app.database import get_db
+from app.database import Location as LocationModel
+from app.models.schemas import Location, LocationCreate, LocationUpdate
+from app.services import inventory, technicians
+
+router = APIRouter(prefix="/locations", tags=["locations"])
+
+@router.get("/", response_model=List[Location])
+def get_locations(include_inactive: bool = False, db: Session = Depends(get_db)):
+    query = db.query(LocationModel)
+    if not include_inactive:
+        query = query.filter(LocationModel.active.is_(True))
+    return query.order_by(LocationModel.name).all()
+
+@router.post("/", response_model=Location)
+def create_location(location: LocationCreate, db: Session = Depends(get_db)):
+    data = location.dict()
+    data["name"] = " ".join(data["name"].split())
+    if db.query(LocationModel).filter(func.lower(LocationModel.name) == data["name"].lower()).first():
+        raise HTTPException(status_code=400, detail=f"A location named {data['name']} already exists")
+    try:
+        technicians.check(db, data["technician_id"])
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    db_location = LocationModel(**data)
+    db.add(db_location)
+    db.commit()
+    db.refresh(db_location)
+    return db_location
+
+@router.get("/{location_id}", response_model=Location)
+def get_location(location_id: int, db: Session = Depends(get_db)):
+    location = db.query(LocationModel).filter(LocationModel.id == location_id).first()
+    if not location:
+        raise HTTPException(status_code=404, detail="Location not found")
+    return location
+
+@router.put("/{location_id}", response_model=Location)
+def update_location(location_id: int, location_update: LocationUpdate, db: Session = Depends(get_db)):
+    location = db.query(LocationModel).filter(LocationModel.id == location_id).first()
+    if not location:
+        raise HTTPException(status_code=404, detail="Location not found")
+
+    update_data = location_update.dict(exclude_unset=True)
+    name = update_data.pop("name", None)
+    try:
+        technicians.check(db, update_data.get("technician_id"))
+        for field, value in update_data.items():
+            setattr(location, field, value)
+        if name is not None and name != location.name:
+            # Commits, along with the other changes
+            inventory.rename(db, location, name)
+        else:
+            db.commit()
+    except ValueError as e:
+        db.rollback()
+        raise HTTPException(status_code=400, detail=str(e))
+    db.refresh(location)
+    return location
+
+@router.delete("/{location_id}")
+def deactivate_location(location_id: int, db: Session = Depends(get_db)):
+    """Locations keep their history: deleting only hides them, once emptied"""
+    location = db.query(LocationModel).filter(LocationModel.id == location_id).first()
+    if not location:
+        raise HTTPException(status_code=404, detail="Location not found")
+    try:
+        inventory.deactivate(db, location)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"message": "Location deactivated successfully"}
+
+@router.get("/{location_id}/stock")
+def get_location_stock(location_id: int, low_only: bool = False, db: Session = Depends(get_db)):
+    """What the location holds (a van's loadout), or with low_only what it is short of"""
+    if not db.query(LocationModel.id).filter(LocationModel.id == location_id).first():
+        raise HTTPException(status_code=404, detail="Location not found")
+    return inventory.loadout(db, location_id, low_only)
@@ -0,0 +1,40 @@
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy.orm import Session
+from typing import Optional
+from datetime import datetime
+from app.database import get_db
+from app.services import rollups, archive
+
+router = APIRouter(prefix="/reports", tags=["reports"])
+
+@router.get("/trends")
+def get_trends(
+    metric: str,
+    granularity: str = "week",
+    from_date: Optional[datetime] = None,
+    to_date: Optional[datetime] = None,
+    db: Session = Depends(get_db)
+):
+    """
+    Trend series served from pre-aggregated day/week buckets.
+    Metrics: tasks_created, tasks_closed, appointments, inventory_value (per category).
+    """
+    try:
+        return rollups.trends(db, metric, granularity, from_date, to_date)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.post("/compact")
+def compact_rollups(full: bool = False, db: Session = Depends(get_db)):
+    """Recompute rollup buckets from source tables (run nightly, or on demand from n8n)"""
+    return rollups.compact(db, full=full)
+
+@router.post("/archive")
+def run_archive(max_batches: Optional[int] = None, db: Session = Depends(get_db)):
+    """Move old done/cancelled tasks and past completed/cancelled appointments to the archive tables (runs nightly)"""
+    return archive.archive_old(db, max_batches=max_batches)
+
+@router.get("/archive")
+def get_archive_stats(db: Session = Depends(get_db)):
+    """Hot and archived row counts with the archival policy"""
+    return archive.stats(db)
@@ -6,6 +6,7 @@ import os
 import requests
 from app.database import get_db, StockItem
 from app.models.schemas import StockItem as StockItemSchema
+from app.services import coalescing, inventory
 
 router = APIRouter(prefix="/sheets", tags=["google_sheets"])
 
@@ -102,14 +103,13 @@ def sync_stock_from_sheets(db: Session = Depends(get_db)):
         raise HTTPException(status_code=500, detail=f"Sync error: {str(e)}")
 
 @router.get("/stock-with-alerts")
+@coalescing.coalesce("/sheets/stock-with-alerts")
 def get_stock_with_alerts(db: Session = Depends(get_db)):
     """
     Récupère le stock avec les alertes pour n8n.
     Retourne uniquement les articles en dessous du seuil.
     """
-    low_stock_items = db.query(StockItem).filter(
-        StockItem.quantity <= StockItem.min_threshold
-    ).all()
+    low_stock_items = db.query(StockItem).filter(inventory.ITEM_IS_LOW).all()
     
     return {
         "alert_count": len(low_stock_items),
@@ -132,4 +132,4 @@ def trigger_low_stock_alert(db: Session = Depends(get_db)):
     Endpoint webhook pour n8n.
     Vérifie les stocks bas et retourne les alertes.
     """
-    return get_stock_with_alerts(db)
\ No newline at end of file
+    return get_stock_with_alerts(db=db)
\ No newline at end of file
@@ -1,20 +1,37 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, UploadFile, File
 from sqlalchemy.orm import Session
 from typing import List, Optional
 from app.database import get_db
-from app.models.schemas import StockItem, StockItemCreate, StockItemUpdate
-from app.database import StockItem as StockItemModel
+from app.models.schemas import (
+    StockItem, StockItemCreate, StockItemUpdate, StockImportResult,
+    StockLevel, StockLevelUpdate, StockTransfer, StockTransferCreate,
+)
+from app.database import StockItem as StockItemModel, StockLevel as StockLevelModel, StockTransfer as StockTransferModel
+from app.database import Location as LocationModel
+from app.services.stock_import import import_stock_file
+from app.services import serialization, rollups, coherence, inventory
 
 router = APIRouter(prefix="/stock", tags=["stock"])
 
+stock_item_serializer = serialization.RowSerializer(StockItem, StockItemModel)
+stats_cache = coherence.VersionedCache()
+
+def _kept_at(db: Session, location_ids: List[int]):
+    """Items based at these locations or with a level there, out-of-stock ones included"""
+    return StockItemModel.location_id.in_(location_ids) | StockItemModel.id.in_(
+        db.query(StockLevelModel.stock_item_id).filter(StockLevelModel.location_id.in_(location_ids))
+    )
+
 @router.get("/", response_model=List[StockItem])
 def get_stock_items(
     skip: int = 0,
     limit: int = 100,
     category: Optional[str] = None,
     location: Optional[str] = None,
+    location_id: Optional[int] = None,
     low_stock: bool = False,
     search: Optional[str] = None,
+    fields: Optional[str] = Query(None, description="Comma-separated fields to return, e.g. id,title,status"),
     db: Session = Depends(get_db)
 ):
     query = db.query(StockItemModel)
@@ -22,25 +39,83 @@ def get_stock_items(
     if category:
         query = query.filter(StockItemModel.category.ilike(f"%{category}%"))
     if location:
-        query = query.filter(StockItemModel.location.ilike(f"%{location}%"))
+        # Few locations: match names there, then use the per-location indexes
+        location_ids = [
+            row_id for (row_id,) in db.query(LocationModel.id).filter(LocationModel.name.ilike(f"%{location}%"))
+        ]
+        query = query.filter(_kept_at(db, location_ids))
+    if location_id is not None:
+        query = query.filter(_kept_at(db, [location_id]))
     if search:
         query = query.filter(
             (StockItemModel.name.ilike(f"%{search}%")) |
             (StockItemModel.barcode.ilike(f"%{search}%"))
         )
     if low_stock:
-        query = query.filter(StockItemModel.quantity <= StockItemModel.min_threshold)
+        query = query.filter(inventory.ITEM_IS_LOW)
     
-    return query.offset(skip).limit(limit).all()
+    query = query.offset(skip).limit(limit)
+    if fields or serialization.FAST_SERIALIZATION:
+        try:
+            serializer = stock_item_serializer.project(fields)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        return serializer.response(query)
+    return serialization.stream(query).all()
 
 @router.post("/", response_model=StockItem)
 def create_stock_item(item: StockItemCreate, db: Session = Depends(get_db)):
+    try:
+        inventory.check(db, item.location_id)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     db_item = StockItemModel(**item.dict())
     db.add(db_item)
     db.commit()
     db.refresh(db_item)
     return db_item
 
+@router.post("/import", response_model=StockImportResult)
+def import_stock_items(file: UploadFile = File(...), db: Session = Depends(get_db)):
+    """Import a supplier CSV/XLSX price list, upserting items by barcode"""
+    try:
+        result = import_stock_file(db, file.file, file.filename)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    # Bulk upserts bypass the ORM flush hooks; only the imported items need placing
+    inventory.reconcile(db, result.pop("item_ids"))
+    rollups.refresh_inventory_levels(db)
+    coherence.invalidate(db, "stock")
+    return result
+
+@router.post("/transfers", response_model=List[StockTransfer])
+def transfer_stock(transfer: StockTransferCreate, db: Session = Depends(get_db)):
+    """Move stock between locations; every line is applied or none is"""
+    try:
+        return inventory.transfer(
+            db, transfer.from_location_id, transfer.to_location_id,
+            [(line.stock_item_id, line.quantity) for line in transfer.lines], transfer.note,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.get("/transfers", response_model=List[StockTransfer])
+def get_stock_transfers(
+    stock_item_id: Optional[int] = None,
+    location_id: Optional[int] = None,
+    skip: int = 0,
+    limit: int = 100,
+    db: Session = Depends(get_db)
+):
+    query = db.query(StockTransferModel)
+    if stock_item_id is not None:
+        query = query.filter(StockTransferModel.stock_item_id == stock_item_id)
+    if location_id is not None:
+        query = query.filter(
+            (StockTransferModel.from_location_id == location_id) | (StockTransferModel.to_location_id == location_id)
+        )
+    return query.order_by(StockTransferModel.created_at.desc(), StockTransferModel.id.desc()).offset(skip).limit(limit).all()
+
 @router.get("/{item_id}", response_model=StockItem)
 def get_stock_item(item_id: int, db: Session = Depends(get_db)):
     item = db.query(StockItemModel).filter(StockItemModel.id == item_id).first()
@@ -55,6 +130,10 @@ def update_stock_item(item_id: int, item_update: StockItemUpdate, db: Session =
         raise HTTPException(status_code=404, detail="Stock item not found")
     
     update_data = item_update.dict(exclude_unset=True)
+    try:
+        inventory.check(db, update_data.get("location_id"))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     for field, value in update_data.items():
         setattr(item, field, value)
     
@@ -75,24 +154,63 @@ def delete_stock_item(item_id: int, db: Session = Depends(get_db)):
     return {"message": "Stock item deleted successfully"}
 
 @router.get("/stats/low-stock")
-def get_low_stock_items(db: Session = Depends(get_db)):
-    items = db.query(StockItemModel).filter(
-        StockItemModel.quantity <= StockItemModel.min_threshold
-    ).all()
+def get_low_stock_items(location_id: Optional[int] = None, db: Session = Depends(get_db)):
+    """Items under their threshold; with location_id, under that location's own minimum"""
+    if location_id is not None:
+        return inventory.loadout(db, location_id, low_only=True)
+    items = db.query(StockItemModel).filter(inventory.ITEM_IS_LOW).all()
     return items
 
 @router.get("/stats/by-category")
 def get_stock_by_category(db: Session = Depends(get_db)):
     from sqlalchemy import func
-    result = db.query(StockItemModel.category, func.count(StockItemModel.id)).group_by(StockItemModel.category).all()
-    return {category or "Non catégorisé": count for category, count in result}
+
+    def compute():
+        result = db.query(StockItemModel.category, func.count(StockItemModel.id)).group_by(StockItemModel.category).all()
+        return {category or "Non catégorisé": count for category, count in result}
+
+    return stats_cache.get_or_compute(db, "by-category", ("stock",), compute)
+
+@router.get("/stats/by-location")
+def get_stock_by_location(db: Session = Depends(get_db)):
+    return stats_cache.get_or_compute(db, "by-location", ("stock",), lambda: inventory.by_location(db))
+
+@router.get("/{item_id}/levels", response_model=List[StockLevel])
+def get_stock_levels(item_id: int, db: Session = Depends(get_db)):
+    if not db.query(StockItemModel.id).filter(StockItemModel.id == item_id).first():
+        raise HTTPException(status_code=404, detail="Stock item not found")
+    return inventory.item_levels(db, item_id)
+
+@router.put("/{item_id}/levels/{location_id}", response_model=List[StockLevel])
+def update_stock_level(item_id: int, location_id: int, level_update: StockLevelUpdate, db: Session = Depends(get_db)):
+    """Set the minimum an item should keep at one location (e.g. a van's loadout)"""
+    if not db.query(StockItemModel.id).filter(StockItemModel.id == item_id).first():
+        raise HTTPException(status_code=404, detail="Stock item not found")
+    try:
+        inventory.check(db, location_id)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    inventory.set_threshold(db, item_id, location_id, level_update.min_threshold)
+    db.commit()
+    return inventory.item_levels(db, item_id)
 
 @router.post("/{item_id}/adjust-quantity")
-def adjust_quantity(item_id: int, adjustment: float, db: Session = Depends(get_db)):
+def adjust_quantity(item_id: int, adjustment: float, location_id: Optional[int] = None, db: Session = Depends(get_db)):
+    """Adjust the total, or with location_id the quantity held at that location"""
     item = db.query(StockItemModel).filter(StockItemModel.id == item_id).first()
     if not item:
         raise HTTPException(status_code=404, detail="Stock item not found")
     
+    if location_id is not None:
+        try:
+            inventory.check(db, location_id)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        inventory.adjust(db, item, location_id, adjustment)
+        db.commit()
+        db.refresh(item)
+        return item
+    
     item.quantity += adjustment
     if item.quantity < 0:
         item.quantity = 0
@@ -0,0 +1,17 @@
+from fastapi import APIRouter, Depends
+from sqlalchemy.orm import Session
+from app.database import get_db
+from app.models.schemas import SyncPushRequest, SyncPushResponse
+from app.services.sync import SyncService
+
+router = APIRouter(prefix="/sync", tags=["sync"])
+
+@router.post("/push", response_model=SyncPushResponse)
+def push_operations(request: SyncPushRequest, db: Session = Depends(get_db)):
+    """
+    Replay an offline mutation log from the PWA.
+    Operations are applied in order in a single transaction; replays of
+    an already-seen op_id return the stored outcome.
+    """
+    service = SyncService(db)
+    return service.push(request.operations)
@@ -3,11 +3,15 @@ from sqlalchemy.orm import Session
 from typing import List, Optional
 from datetime import datetime, timedelta
 from app.database import get_db
-from app.models.schemas import Task, TaskCreate, TaskUpdate
+from app.models.schemas import Task, TaskCreate, TaskUpdate, TaskOccurrenceUpdate, AutoAssignRequest
 from app.database import Task as TaskModel
+from app.services import serialization, coherence, recurrence, archive, technicians, assignment
 
 router = APIRouter(prefix="/tasks", tags=["tasks"])
 
+task_serializer = serialization.RowSerializer(Task, TaskModel)
+stats_cache = coherence.VersionedCache()
+
 @router.get("/", response_model=List[Task])
 def get_tasks(
     skip: int = 0,
@@ -15,30 +19,88 @@ def get_tasks(
     status: Optional[str] = None,
     priority: Optional[str] = None,
     assigned_to: Optional[str] = None,
+    technician_id: Optional[int] = None,
+    due_from: Optional[datetime] = None,
+    due_to: Optional[datetime] = Query(None, description="Upper bound of due_date; recurring tasks are expanded up to it"),
+    fields: Optional[str] = Query(None, description="Comma-separated fields to return, e.g. id,title,status"),
+    include_archived: bool = Query(False, description="Also return archived (old done/cancelled) tasks"),
     db: Session = Depends(get_db)
 ):
-    query = db.query(TaskModel)
+    # Stored datetimes are naive UTC; offset-aware bounds are converted once for SQL and expansion
+    due_from, due_to = recurrence.naive_utc_or_none(due_from), recurrence.naive_utc_or_none(due_to)
+    entity = archive.source(TaskModel, include_archived)
+    query = db.query(entity)
     
     if status:
-        query = query.filter(TaskModel.status == status)
+        query = query.filter(entity.status == status)
     if priority:
-        query = query.filter(TaskModel.priority == priority)
+        query = query.filter(entity.priority == priority)
     if assigned_to:
-        query = query.filter(TaskModel.assigned_to.ilike(f"%{assigned_to}%"))
+        query = query.filter(entity.assigned_to.ilike(f"%{assigned_to}%"))
+    if technician_id is not None:
+        query = query.filter(entity.technician_id == technician_id)
+    if due_from:
+        query = query.filter(entity.due_date >= due_from)
+    if due_to:
+        query = query.filter(entity.due_date <= due_to)
+    
+    if fields or serialization.FAST_SERIALIZATION:
+        try:
+            serializer = task_serializer.project(fields)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+    else:
+        serializer = None
+    
+    # Recurring tasks only expand within an explicit window
+    series = recurrence.series_in_window(db, recurrence.TASKS, due_from, due_to) if due_to else []
+    if series:
+        def matches(values: dict) -> bool:
+            return (
+                (not status or values["status"] == status)
+                and (not priority or values["priority"] == priority)
+                and (not assigned_to or assigned_to.lower() in (values["assigned_to"] or "").lower())
+                and (technician_id is None or values["technician_id"] == technician_id)
+            )
+        items = recurrence.expand(
+            db, recurrence.TASKS, query.order_by(entity.due_date.asc()), series,
+            due_from, due_to, skip, limit, matches, entity,
+        )
+        return serializer.dicts_response(items) if serializer else items
     
-    return query.order_by(TaskModel.due_date.asc()).offset(skip).limit(limit).all()
+    query = query.order_by(entity.due_date.asc()).offset(skip).limit(limit)
+    if serializer:
+        return serializer.response(query, entity)
+    return serialization.stream(query).all()
 
 @router.post("/", response_model=Task)
 def create_task(task: TaskCreate, db: Session = Depends(get_db)):
     db_task = TaskModel(**task.dict())
+    try:
+        technicians.check(db, db_task.technician_id, db_task.assigned_to)
+        recurrence.apply_rule(db_task, recurrence.TASKS)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     db.add(db_task)
     db.commit()
     db.refresh(db_task)
     return db_task
 
+@router.post("/auto-assign")
+def auto_assign_tasks(request: AutoAssignRequest, db: Session = Depends(get_db)):
+    """Propose (or, with apply=true, write) technicians for open unassigned tasks,
+    balancing each technician's scheduled appointments and current load"""
+    try:
+        result = assignment.plan(db, request.task_ids, request.technician_ids, request.horizon_days)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    result["applied"] = assignment.apply(db, result["assignments"]) if request.apply else 0
+    return result
+
 @router.get("/{task_id}", response_model=Task)
-def get_task(task_id: int, db: Session = Depends(get_db)):
-    task = db.query(TaskModel).filter(TaskModel.id == task_id).first()
+def get_task(task_id: int, include_archived: bool = False, db: Session = Depends(get_db)):
+    entity = archive.source(TaskModel, include_archived)
+    task = db.query(entity).filter(entity.id == task_id).first()
     if not task:
         raise HTTPException(status_code=404, detail="Task not found")
     return task
@@ -50,8 +112,17 @@ def update_task(task_id: int, task_update: TaskUpdate, db: Session = Depends(get
         raise HTTPException(status_code=404, detail="Task not found")
     
     update_data = task_update.dict(exclude_unset=True)
+    try:
+        technicians.check(db, update_data.get("technician_id"), update_data.get("assigned_to"))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     for field, value in update_data.items():
         setattr(task, field, value)
+    if "recurrence_rule" in update_data or "due_date" in update_data:
+        try:
+            recurrence.apply_rule(task, recurrence.TASKS)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
     
     task.updated_at = datetime.utcnow()
     db.commit()
@@ -64,10 +135,41 @@ def delete_task(task_id: int, db: Session = Depends(get_db)):
     if not task:
         raise HTTPException(status_code=404, detail="Task not found")
     
+    recurrence.delete_exceptions(db, recurrence.TASKS, task.id)
     db.delete(task)
     db.commit()
     return {"message": "Task deleted successfully"}
 
+@router.put("/{task_id}/occurrences/{occurrence_start}", response_model=Task)
+def update_task_occurrence(
+    task_id: int,
+    occurrence_start: datetime,
+    changes: TaskOccurrenceUpdate,
+    db: Session = Depends(get_db)
+):
+    """Override fields of one occurrence of a recurring task"""
+    task = db.query(TaskModel).filter(TaskModel.id == task_id).first()
+    if not task:
+        raise HTTPException(status_code=404, detail="Task not found")
+    try:
+        return recurrence.set_exception(
+            db, recurrence.TASKS, task, occurrence_start, changes.dict(exclude_unset=True)
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.delete("/{task_id}/occurrences/{occurrence_start}")
+def cancel_task_occurrence(task_id: int, occurrence_start: datetime, db: Session = Depends(get_db)):
+    """Skip one occurrence of a recurring task"""
+    task = db.query(TaskModel).filter(TaskModel.id == task_id).first()
+    if not task:
+        raise HTTPException(status_code=404, detail="Task not found")
+    try:
+        recurrence.set_exception(db, recurrence.TASKS, task, occurrence_start, cancelled=True)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"message": "Occurrence cancelled"}
+
 @router.get("/stats/overdue")
 def get_overdue_tasks(db: Session = Depends(get_db)):
     now = datetime.utcnow()
@@ -80,5 +182,12 @@ def get_overdue_tasks(db: Session = Depends(get_db)):
 @router.get("/stats/by-status")
 def get_tasks_by_status(db: Session = Depends(get_db)):
     from sqlalchemy import func
-    result = db.query(TaskModel.status, func.count(TaskModel.id)).group_by(TaskModel.status).all()
-    return {status: count for status, count in result}
\ No newline at end of file
+
+    def compute():
+        result = db.query(TaskModel.status, func.count(TaskModel.id)).group_by(TaskModel.status).all()
+        counts = {status: count for status, count in result}
+        for status, count in archive.archived_counts(db)["tasks_by_status"].items():
+            counts[status] = counts.get(status, 0) + count
+        return counts
+
+    return stats_cache.get_or_compute(db, "by-status", ("tasks",), compute)
\ No newline at end of file
@@ -0,0 +1,74 @@
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+from typing import List
+from app.database import get_db
+from app.database import Technician as TechnicianModel
+from app.models.schemas import Technician, TechnicianCreate, TechnicianUpdate
+from app.services import technicians
+
+router = APIRouter(prefix="/technicians", tags=["technicians"])
+
+@router.get("/", response_model=List[Technician])
+def get_technicians(include_inactive: bool = False, db: Session = Depends(get_db)):
+    query = db.query(TechnicianModel)
+    if not include_inactive:
+        query = query.filter(TechnicianModel.active.is_(True))
+    return query.order_by(TechnicianModel.name).all()
+
+@router.post("/", response_model=Technician)
+def create_technician(technician: TechnicianCreate, db: Session = Depends(get_db)):
+    data = technician.dict()
+    data["name"] = " ".join(data["name"].split())
+    if db.query(TechnicianModel).filter(func.lower(TechnicianModel.name) == data["name"].lower()).first():
+        raise HTTPException(status_code=400, detail=f"A technician named {data['name']} already exists")
+    db_technician = TechnicianModel(**data)
+    db.add(db_technician)
+    db.commit()
+    db.refresh(db_technician)
+    return db_technician
+
+@router.get("/{technician_id}", response_model=Technician)
+def get_technician(technician_id: int, db: Session = Depends(get_db)):
+    technician = db.query(TechnicianModel).filter(TechnicianModel.id == technician_id).first()
+    if not technician:
+        raise HTTPException(status_code=404, detail="Technician not found")
+    return technician
+
+@router.put("/{technician_id}", response_model=Technician)
+def update_technician(technician_id: int, technician_update: TechnicianUpdate, db: Session = Depends(get_db)):
+    technician = db.query(TechnicianModel).filter(TechnicianModel.id == technician_id).first()
+    if not technician:
+        raise HTTPException(status_code=404, detail="Technician not found")
+    
+    update_data = technician_update.dict(exclude_unset=True)
+    name = update_data.pop("name", None)
+    for field, value in update_data.items():
+        setattr(technician, field, value)
+    try:
+        if name is not None and name != technician.name:
+            # Commits, along with the other changes
+            technicians.rename(db, technician, name)
+        else:
+            db.commit()
+    except ValueError as e:
+        db.rollback()
+        raise HTTPException(status_code=400, detail=str(e))
+    db.refresh(technician)
+    return technician
+
+@router.delete("/{technician_id}")
+def deactivate_technician(technician_id: int, db: Session = Depends(get_db)):
+    """Technicians keep their history: deleting only stops new assignments"""
+    technician = db.query(TechnicianModel).filter(TechnicianModel.id == technician_id).first()
+    if not technician:
+        raise HTTPException(status_code=404, detail="Technician not found")
+    technician.active = False
+    db.commit()
+    return {"message": "Technician deactivated successfully"}
+
+@router.get("/{technician_id}/workload")
+def get_technician_workload(technician_id: int, days: int = 7, db: Session = Depends(get_db)):
+    if not db.query(TechnicianModel.id).filter(TechnicianModel.id == technician_id).first():
+        raise HTTPException(status_code=404, detail="Technician not found")
+    return technicians.workload(db, technician_id, days)
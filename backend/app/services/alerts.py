@@ -0,0 +1,246 @@
+import hashlib
+import os
+import uuid
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional
+import requests
+from sqlalchemy import and_, delete, event, func, insert, or_, update
+from sqlalchemy.orm import Session, attributes
+from app.database import StockItem, StockAlert
+
+# n8n (or any) endpoint receiving batched low-stock alerts, empty to disable
+LOW_STOCK_WEBHOOK_URL = os.getenv("LOW_STOCK_WEBHOOK_URL", "")
+# A batch is sent once no new alert arrived for this long...
+ALERT_DEBOUNCE_SECONDS = float(os.getenv("ALERT_DEBOUNCE_SECONDS", "30"))
+# ...or once its oldest alert has waited this long
+ALERT_MAX_DELAY_SECONDS = float(os.getenv("ALERT_MAX_DELAY_SECONDS", "300"))
+ALERT_BATCH_SIZE = int(os.getenv("ALERT_BATCH_SIZE", "100"))
+
+WEBHOOK_TIMEOUT_SECONDS = 10
+RETRY_BASE_SECONDS = 30
+RETRY_MAX_SECONDS = 3600
+# Claimed rows are retried by any worker if the claimer dies mid-delivery
+CLAIM_LEASE_SECONDS = 120
+DELIVERED_RETENTION_DAYS = 7
+
+LOW_STOCK = "low_stock"
+RESTOCKED = "restocked"
+
+
+def enabled() -> bool:
+    return bool(LOW_STOCK_WEBHOOK_URL)
+
+
+def _is_low(quantity, min_threshold) -> bool:
+    return (quantity or 0) <= (min_threshold or 0)
+
+
+def crossing(old_quantity, old_threshold, new_quantity, new_threshold,
+             is_new: bool = False) -> Optional[str]:
+    """Alert event for a stock level change, or None if no threshold was crossed"""
+    now_low = _is_low(new_quantity, new_threshold)
+    was_low = False if is_new else _is_low(old_quantity, old_threshold)
+    if now_low and not was_low:
+        return LOW_STOCK
+    if was_low and not now_low and not is_new:
+        return RESTOCKED
+    return None
+
+
+def alert_row(item_id: int, event_name: str, values: dict) -> dict:
+    return {
+        "stock_item_id": item_id,
+        "event": event_name,
+        "name": values.get("name"),
+        "quantity": values.get("quantity"),
+        "min_threshold": values.get("min_threshold"),
+        "location": values.get("location"),
+        "supplier": values.get("supplier"),
+        "created_at": datetime.utcnow(),
+        "attempts": 0,
+    }
+
+
+def enqueue(connection, rows: List[dict]):
+    """Write alerts into the outbox within the caller's transaction"""
+    if rows and enabled():
+        connection.execute(insert(StockAlert), rows)
+
+
+def _previous(obj, attr: str):
+    history = attributes.get_history(obj, attr)
+    if history.deleted:
+        return history.deleted[0]
+    if history.unchanged:
+        return history.unchanged[0]
+    return getattr(obj, attr)
+
+
+def _snapshot(item: StockItem) -> dict:
+    return {
+        "name": item.name,
+        "quantity": item.quantity,
+        "min_threshold": item.min_threshold,
+        "location": item.location,
+        "supplier": item.supplier,
+    }
+
+
+def _after_flush(session: Session, flush_context):
+    rows = []
+    for item in session.new:
+        if isinstance(item, StockItem):
+            event_name = crossing(None, None, item.quantity, item.min_threshold, is_new=True)
+            if event_name:
+                rows.append(alert_row(item.id, event_name, _snapshot(item)))
+    for item in session.dirty:
+        if not isinstance(item, StockItem):
+            continue
+        history = (attributes.get_history(item, "quantity"), attributes.get_history(item, "min_threshold"))
+        if not any(h.has_changes() for h in history):
+            continue
+        event_name = crossing(_previous(item, "quantity"), _previous(item, "min_threshold"),
+                              item.quantity, item.min_threshold)
+        if event_name:
+            rows.append(alert_row(item.id, event_name, _snapshot(item)))
+    if rows:
+        enqueue(session.connection(), rows)
+
+
+def install(session_factory):
+    """Detect threshold crossings on every ORM flush when a webhook is configured"""
+    if enabled() and not event.contains(session_factory, "after_flush", _after_flush):
+        event.listen(session_factory, "after_flush", _after_flush)
+
+
+def _due(now: datetime):
+    return and_(
+        StockAlert.delivered_at.is_(None),
+        or_(StockAlert.next_attempt_at.is_(None), StockAlert.next_attempt_at <= now),
+    )
+
+
+def _ready(db: Session, now: datetime) -> bool:
+    """Debounce: wait for a quiet period, but never longer than the max delay"""
+    oldest, newest = db.query(
+        func.min(StockAlert.created_at), func.max(StockAlert.created_at)
+    ).filter(_due(now)).one()
+    if newest is None:
+        return False
+    return (
+        newest <= now - timedelta(seconds=ALERT_DEBOUNCE_SECONDS)
+        or oldest <= now - timedelta(seconds=ALERT_MAX_DELAY_SECONDS)
+    )
+
+
+def _claim(db: Session, now: datetime) -> List[StockAlert]:
+    ids = [row.id for row in db.query(StockAlert.id).filter(_due(now))
+           .order_by(StockAlert.id).limit(ALERT_BATCH_SIZE)]
+    if not ids:
+        return []
+    token = uuid.uuid4().hex
+    # The due condition is re-checked in the UPDATE, so two workers never claim the same row
+    db.execute(
+        update(StockAlert)
+        .where(StockAlert.id.in_(ids), _due(now))
+        .values(claimed_by=token, next_attempt_at=now + timedelta(seconds=CLAIM_LEASE_SECONDS))
+    )
+    db.commit()
+    return db.query(StockAlert).filter(StockAlert.claimed_by == token).order_by(StockAlert.id).all()
+
+
+def build_payload(alerts: Iterable[StockAlert]) -> dict:
+    """One entry per item: its latest crossing wins within a batch"""
+    latest: Dict[int, StockAlert] = {}
+    for alert in alerts:
+        latest[alert.stock_item_id] = alert
+    items = [
+        {
+            "id": alert.stock_item_id,
+            "event": alert.event,
+            "name": alert.name,
+            "quantity": alert.quantity,
+            "min_threshold": alert.min_threshold,
+            "location": alert.location,
+            "supplier": alert.supplier,
+            "detected_at": alert.created_at.isoformat() if alert.created_at else None,
+        }
+        for alert in latest.values()
+    ]
+    return {
+        "alert_count": sum(1 for item in items if item["event"] == LOW_STOCK),
+        "items": items,
+    }
+
+
+def _retry_delay(attempts: int) -> timedelta:
+    return timedelta(seconds=min(RETRY_BASE_SECONDS * 2 ** attempts, RETRY_MAX_SECONDS))
+
+
+def deliver_pending(db: Session, now: Optional[datetime] = None) -> int:
+    """Send ready alerts as batched webhook POSTs; returns the number delivered"""
+    now = now or datetime.utcnow()
+    delivered = 0
+    if not _ready(db, now):
+        return delivered
+    while True:
+        alerts = _claim(db, now)
+        if not alerts:
+            break
+        ids = [alert.id for alert in alerts]
+        # Derived from the alert ids, so the receiver can drop an exact replay
+        batch_id = hashlib.sha1(",".join(map(str, ids)).encode()).hexdigest()
+        try:
+            response = requests.post(
+                LOW_STOCK_WEBHOOK_URL,
+                json=build_payload(alerts),
+                headers={"X-Alert-Batch": batch_id},
+                timeout=WEBHOOK_TIMEOUT_SECONDS,
+            )
+            response.raise_for_status()
+        except requests.RequestException as e:
+            attempts = max(alert.attempts or 0 for alert in alerts)
+            db.execute(
+                update(StockAlert).where(StockAlert.id.in_(ids)).values(
+                    attempts=StockAlert.attempts + 1,
+                    next_attempt_at=now + _retry_delay(attempts),
+                    claimed_by=None,
+                    last_error=str(e)[:1000],
+                )
+            )
+            db.commit()
+            break
+        db.execute(
+            update(StockAlert).where(StockAlert.id.in_(ids)).values(delivered_at=datetime.utcnow())
+        )
+        db.commit()
+        delivered += len(ids)
+        if len(ids) < ALERT_BATCH_SIZE:
+            break
+
+    db.execute(delete(StockAlert).where(
+        StockAlert.delivered_at < now - timedelta(days=DELIVERED_RETENTION_DAYS)
+    ))
+    db.commit()
+    return delivered
+
+
+async def run_delivery(session_factory):
+    """Background loop flushing the outbox to the webhook"""
+    import asyncio
+    from starlette.concurrency import run_in_threadpool
+
+    def _deliver():
+        db = session_factory()
+        try:
+            deliver_pending(db)
+        finally:
+            db.close()
+
+    poll_interval = max(1.0, min(5.0, ALERT_DEBOUNCE_SECONDS))
+    while True:
+        await asyncio.sleep(poll_interval)
+        try:
+            await run_in_threadpool(_deliver)
+        except Exception as e:
+            print(f"Low-stock alert delivery failed: {e}")
@@ -0,0 +1,148 @@
+import os
+import time
+from datetime import datetime, timedelta
+from typing import Dict, Optional
+from sqlalchemy import DateTime, func, literal, select, union_all
+from sqlalchemy.orm import Session, aliased
+from app.database import Task, Appointment, TaskArchive, AppointmentArchive
+from app.services import coherence
+
+# Done/cancelled tasks untouched for this many days move to tasks_archive
+ARCHIVE_TASKS_AFTER_DAYS = int(os.getenv("ARCHIVE_TASKS_AFTER_DAYS", "365"))
+# Completed/cancelled appointments that started this many days ago move to appointments_archive
+ARCHIVE_APPOINTMENTS_AFTER_DAYS = int(os.getenv("ARCHIVE_APPOINTMENTS_AFTER_DAYS", "365"))
+ARCHIVE_BATCH_SIZE = int(os.getenv("ARCHIVE_BATCH_SIZE", "1000"))
+# Pause between batches so request writes aren't starved of the SQLite write lock
+BATCH_PAUSE_SECONDS = 0.05
+
+ARCHIVES = {
+    Task: TaskArchive,
+    Appointment: AppointmentArchive,
+}
+
+counts_cache = coherence.VersionedCache()
+
+
+def _candidates(model, cutoff: datetime) -> list:
+    if model is Task:
+        filters = [Task.status.in_(("done", "cancelled")), Task.updated_at < cutoff]
+    else:
+        filters = [Appointment.status.in_(("completed", "cancelled")), Appointment.start_time < cutoff]
+    return filters + [
+        # Series keep producing occurrences, so they stay hot
+        model.recurrence_rule.is_(None),
+    ]
+
+
+def archive_batch(db: Session, model, cutoff: datetime, batch_size: int = ARCHIVE_BATCH_SIZE) -> int:
+    """Move one batch of old rows into the archive table in a single transaction"""
+    ids = [
+        row_id for (row_id,) in db.query(model.id)
+        .filter(*_candidates(model, cutoff))
+        .order_by(model.id)
+        .limit(batch_size)
+    ]
+    if not ids:
+        return 0
+    hot, cold = model.__table__, ARCHIVES[model]
+    names = [column.name for column in hot.columns]
+    db.execute(cold.insert().from_select(
+        names + ["archived_at"],
+        select(*hot.columns, literal(datetime.utcnow(), DateTime)).where(hot.c.id.in_(ids)),
+    ))
+    db.execute(hot.delete().where(hot.c.id.in_(ids)))
+    db.commit()
+    return len(ids)
+
+
+def archive_old(db: Session, batch_size: int = ARCHIVE_BATCH_SIZE,
+                max_batches: Optional[int] = None) -> dict:
+    """Move rows older than the configured ages, batch by batch"""
+    now = datetime.utcnow()
+    cutoffs = {
+        Task: now - timedelta(days=ARCHIVE_TASKS_AFTER_DAYS),
+        Appointment: now - timedelta(days=ARCHIVE_APPOINTMENTS_AFTER_DAYS),
+    }
+    moved = {}
+    for model, cutoff in cutoffs.items():
+        total, batches = 0, 0
+        while max_batches is None or batches < max_batches:
+            count = archive_batch(db, model, cutoff, batch_size)
+            total += count
+            batches += 1
+            if count < batch_size:
+                break
+            time.sleep(BATCH_PAUSE_SECONDS)
+        moved[model.__tablename__] = total
+    if any(moved.values()):
+        # Rows left through Core statements, so caches must be told explicitly
+        coherence.invalidate(db, "tasks", "appointments", "archive")
+    return {"message": "Archive run complete", "moved": moved}
+
+
+def source(model, include_archived: bool = False):
+    """Entity to query: the hot table, or hot and archived rows together"""
+    if not include_archived:
+        return model
+    hot, cold = model.__table__, ARCHIVES[model]
+    rows = union_all(
+        select(*hot.columns),
+        select(*[cold.c[column.name] for column in hot.columns]),
+    ).subquery(f"{hot.name}_all")
+    return aliased(model, rows)
+
+
+def archived_counts(db: Session) -> dict:
+    """Archived row counts, recomputed only after an archive run"""
+
+    def compute():
+        tasks_by_status: Dict[str, int] = {
+            status: count for status, count in db.query(
+                TaskArchive.c.status, func.count()
+            ).group_by(TaskArchive.c.status)
+        }
+        appointments = db.query(func.count()).select_from(AppointmentArchive).scalar()
+        return {"tasks_by_status": tasks_by_status, "appointments": appointments}
+
+    return counts_cache.get_or_compute(db, "archived-counts", ("archive",), compute)
+
+
+def stats(db: Session) -> dict:
+    counts = archived_counts(db)
+    return {
+        "hot": {
+            "tasks": db.query(func.count(Task.id)).scalar(),
+            "appointments": db.query(func.count(Appointment.id)).scalar(),
+        },
+        "archived": {
+            "tasks": sum(counts["tasks_by_status"].values()),
+            "appointments": counts["appointments"],
+        },
+        "policy": {
+            "tasks_after_days": ARCHIVE_TASKS_AFTER_DAYS,
+            "appointments_after_days": ARCHIVE_APPOINTMENTS_AFTER_DAYS,
+            "batch_size": ARCHIVE_BATCH_SIZE,
+        },
+    }
+
+
+async def run_nightly(session_factory, hour: int):
+    """Background loop archiving old rows every day at `hour` (UTC)"""
+    import asyncio
+    from starlette.concurrency import run_in_threadpool
+    from app.services.rollups import _seconds_until
+
+    def _archive():
+        db = session_factory()
+        try:
+            if coherence.claim(db, "archive", datetime.utcnow().date().isoformat()):
+                archive_old(db)
+        finally:
+            db.close()
+
+    while True:
+        await asyncio.sleep(_seconds_until(hour))
+        try:
+            await run_in_threadpool(_archive)
+        except Exception as e:
+            print(f"Archive run failed: {e}")
@@ -0,0 +1,210 @@
+import bisect
+import os
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+from sqlalchemy import update
+from sqlalchemy.orm import Session
+from app.database import Task, Appointment, Technician
+from app.services import coherence, recurrence
+
+# Effort assumed for one task (hours) when weighing technicians' load
+ASSIGNMENT_TASK_HOURS = float(os.getenv("ASSIGNMENT_TASK_HOURS", "2"))
+# Length assumed for appointments without an end_time
+DEFAULT_APPOINTMENT_HOURS = 1.0
+
+OPEN_STATUSES = ("todo", "in_progress")
+PRIORITY_RANK = {"urgent": 0, "high": 1, "medium": 2, "low": 3}
+
+
+def working_days(start: datetime, end: datetime) -> float:
+    """Weekdays between start and end, counting partial days"""
+    remaining = (end - start).total_seconds() / 86400
+    if remaining <= 0:
+        return 0.0
+    weeks, remaining = divmod(remaining, 7)
+    days = weeks * 5
+    day = start + timedelta(days=weeks * 7)
+    while remaining > 0:
+        if day.weekday() < 5:
+            days += min(1.0, remaining)
+        day += timedelta(days=1)
+        remaining -= 1
+    return days
+
+
+class Workload:
+    """Hours booked for one technician, ordered by the time they must be done by"""
+
+    def __init__(self, technician_id: int, name: str, daily_hours: float, now: datetime):
+        self.technician_id = technician_id
+        self.name = name
+        self.daily_hours = daily_hours
+        self.now = now
+        self.deadlines: List[datetime] = []
+        self.hours: List[float] = []
+        self.assigned = 0
+
+    def book(self, deadline: datetime, hours: float):
+        index = bisect.bisect_right(self.deadlines, deadline)
+        self.deadlines.insert(index, deadline)
+        self.hours.insert(index, hours)
+
+    def booked_until(self, deadline: datetime) -> float:
+        return sum(self.hours[:bisect.bisect_right(self.deadlines, deadline)])
+
+    def capacity_until(self, deadline: datetime) -> float:
+        # At least one day's capacity, so work due today isn't divided by zero
+        return self.daily_hours * max(working_days(self.now, deadline), 1.0)
+
+    def utilization(self, deadline: datetime, extra: float = 0.0) -> float:
+        capacity = self.capacity_until(deadline)
+        if capacity <= 0:
+            return float("inf")
+        return (self.booked_until(deadline) + extra) / capacity
+
+    @property
+    def total_hours(self) -> float:
+        return sum(self.hours)
+
+
+def deadline(due_date: Optional[datetime], now: datetime, horizon_end: datetime) -> datetime:
+    if due_date is None:
+        return horizon_end
+    if due_date <= now:
+        # Overdue work is due as soon as possible
+        return now + timedelta(days=1)
+    return min(due_date, horizon_end)
+
+
+def solve(tasks: List[dict], workloads: List[Workload], now: datetime, horizon_end: datetime,
+          task_hours: float = ASSIGNMENT_TASK_HOURS) -> List[dict]:
+    """Greedy earliest-deadline assignment balancing each technician's utilization.
+
+    Tasks are taken by priority, then due date; each goes to the
+    technician whose booked hours before the task's deadline, plus the
+    task, fill the smallest share of their capacity until then. Ties go
+    to the least loaded technician overall. Runs in
+    O(tasks x technicians x bookings).
+    """
+    order = sorted(tasks, key=lambda task: (
+        PRIORITY_RANK.get(task["priority"], len(PRIORITY_RANK)),
+        task["due_date"] or datetime.max,
+        task["id"],
+    ))
+    assignments = []
+    for task in order:
+        due = deadline(task["due_date"], now, horizon_end)
+        best = min(workloads, key=lambda w: (w.utilization(due, task_hours), w.total_hours, w.technician_id))
+        utilization = best.utilization(due, task_hours)
+        best.book(due, task_hours)
+        best.assigned += 1
+        assignments.append({
+            "task_id": task["id"],
+            "title": task["title"],
+            "priority": task["priority"],
+            "due_date": task["due_date"],
+            "technician_id": best.technician_id,
+            "technician": best.name,
+            "utilization": round(utilization, 3),
+            "overloaded": utilization > 1,
+        })
+    return assignments
+
+
+def _workloads(db: Session, technicians: List[Technician], now: datetime, horizon_end: datetime) -> List[Workload]:
+    workloads = {t.id: Workload(t.id, t.name, t.daily_capacity_hours or 0.0, now) for t in technicians}
+    ids = list(workloads)
+
+    appointments = db.query(Appointment).filter(
+        Appointment.technician_id.in_(ids),
+        Appointment.start_time >= now,
+        Appointment.start_time <= horizon_end,
+        Appointment.status == "scheduled",
+    ).order_by(Appointment.start_time.asc())
+    series = [
+        obj for obj in recurrence.series_in_window(db, recurrence.APPOINTMENTS, now, horizon_end)
+        if obj.technician_id in workloads
+    ]
+    for values in recurrence.expand(
+        db, recurrence.APPOINTMENTS, appointments, series, now, horizon_end,
+        matches=lambda values: values["status"] == "scheduled",
+    ):
+        end = values["end_time"] or values["start_time"] + timedelta(hours=DEFAULT_APPOINTMENT_HOURS)
+        hours = max((end - values["start_time"]).total_seconds() / 3600, 0.0)
+        workloads[values["technician_id"]].book(end, hours)
+
+    for technician_id, due_date in db.query(Task.technician_id, Task.due_date).filter(
+        Task.technician_id.in_(ids),
+        Task.status.in_(OPEN_STATUSES),
+        Task.recurrence_rule.is_(None),
+    ):
+        workloads[technician_id].book(deadline(due_date, now, horizon_end), ASSIGNMENT_TASK_HOURS)
+    return list(workloads.values())
+
+
+def plan(db: Session, task_ids: Optional[List[int]] = None, technician_ids: Optional[List[int]] = None,
+         horizon_days: int = 14, now: Optional[datetime] = None) -> dict:
+    """Propose technicians for open unassigned tasks; raises ValueError without technicians"""
+    now = now or datetime.utcnow()
+    horizon_end = now + timedelta(days=horizon_days)
+
+    query = db.query(Technician).filter(Technician.active.is_(True))
+    if technician_ids:
+        query = query.filter(Technician.id.in_(technician_ids))
+    technicians = query.order_by(Technician.id).all()
+    if not technicians:
+        raise ValueError("No active technicians to assign tasks to")
+
+    tasks = db.query(Task.id, Task.title, Task.priority, Task.due_date).filter(
+        Task.technician_id.is_(None),
+        Task.status.in_(OPEN_STATUSES),
+        Task.recurrence_rule.is_(None),
+    )
+    if task_ids:
+        tasks = tasks.filter(Task.id.in_(task_ids))
+    tasks = [row._asdict() for row in tasks]
+
+    workloads = _workloads(db, technicians, now, horizon_end)
+    started = time.perf_counter()
+    assignments = solve(tasks, workloads, now, horizon_end)
+    solve_ms = (time.perf_counter() - started) * 1000
+
+    return {
+        "assignments": assignments,
+        "technicians": [
+            {
+                "technician_id": w.technician_id,
+                "name": w.name,
+                "assigned": w.assigned,
+                "booked_hours": round(w.booked_until(horizon_end), 2),
+                "capacity_hours": round(w.capacity_until(horizon_end), 2),
+                "utilization": round(w.utilization(horizon_end), 3),
+            }
+            for w in workloads
+        ],
+        "horizon_end": horizon_end,
+        "solve_ms": round(solve_ms, 2),
+    }
+
+
+def apply(db: Session, assignments: List[dict]) -> int:
+    """Write proposed assignments; tasks assigned meanwhile by someone else are left alone"""
+    by_technician: Dict[tuple, List[int]] = {}
+    for assignment in assignments:
+        key = (assignment["technician_id"], assignment["technician"])
+        by_technician.setdefault(key, []).append(assignment["task_id"])
+    applied = 0
+    now = datetime.utcnow()
+    for (technician_id, name), ids in by_technician.items():
+        applied += db.execute(
+            update(Task)
+            .where(Task.id.in_(ids), Task.technician_id.is_(None))
+            .values(technician_id=technician_id, assigned_to=name, updated_at=now)
+            .execution_options(synchronize_session=False)
+        ).rowcount
+    if applied:
+        coherence.invalidate(db, "tasks")
+    else:
+        db.commit()
+    return applied
@@ -0,0 +1,334 @@
+import gzip
+import hashlib
+import json
+import os
+import re
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+from datetime import datetime
+from typing import List, Optional
+from app.database import engine
+from app.services import coherence
+
+# Where compressed snapshots are written; defaults to a backups/ folder next to the database
+BACKUP_DIR = os.getenv("BACKUP_DIR", "")
+# Snapshots kept by rotation (newest first), and the maximum age of kept snapshots (empty for no limit)
+BACKUP_KEEP = int(os.getenv("BACKUP_KEEP", "7"))
+BACKUP_MAX_AGE_DAYS = os.getenv("BACKUP_MAX_AGE_DAYS", "")
+# Pages copied per backup step; the source is only read-locked for one step at a time
+BACKUP_PAGES_PER_STEP = int(os.getenv("BACKUP_PAGES_PER_STEP", "256"))
+BACKUP_STEP_SLEEP_SECONDS = float(os.getenv("BACKUP_STEP_SLEEP_SECONDS", "0.005"))
+
+# A write from another connection restarts a stepped backup; after this many
+# restarts the remaining copy runs as a single step, which WAL readers can do
+# without blocking writers
+MAX_RESTARTS = 5
+CHUNK_SIZE = 1024 * 1024
+COMPRESS_LEVEL = 6
+
+SNAPSHOT_NAME = re.compile(r"^safe_hdf-\d{8}T\d{6}Z\.db\.gz$")
+
+_running = threading.Lock()
+
+
+class _TooManyRestarts(Exception):
+    pass
+
+
+def database_path() -> str:
+    """File of the configured SQLite database; raises ValueError for other backends"""
+    if engine.dialect.name != "sqlite":
+        raise ValueError("Online snapshots are only available for SQLite; use pg_dump for PostgreSQL")
+    path = engine.url.database
+    if not path or path == ":memory:":
+        raise ValueError("An in-memory SQLite database cannot be backed up")
+    return os.path.abspath(path)
+
+
+def backup_dir() -> str:
+    directory = BACKUP_DIR or os.path.join(os.path.dirname(database_path()), "backups")
+    os.makedirs(directory, exist_ok=True)
+    return directory
+
+
+def is_running() -> bool:
+    return _running.locked()
+
+
+def _snapshot_path(name: str) -> str:
+    if not SNAPSHOT_NAME.match(name):
+        raise ValueError(f"Invalid snapshot name: {name}")
+    path = os.path.join(backup_dir(), name)
+    if not os.path.exists(path):
+        raise ValueError(f"Snapshot not found: {name}")
+    return path
+
+
+def copy_online(source_path: str, target_path: str,
+                pages: int = BACKUP_PAGES_PER_STEP, sleep: float = BACKUP_STEP_SLEEP_SECONDS) -> dict:
+    """Copy a live SQLite database with the online backup API, a few pages at a time"""
+    restarts = 0
+    remaining_before = None
+
+    def progress(status, remaining, total):
+        nonlocal restarts, remaining_before
+        if remaining_before is not None and remaining > remaining_before:
+            restarts += 1
+            if restarts >= MAX_RESTARTS:
+                raise _TooManyRestarts()
+        remaining_before = remaining
+
+    source = sqlite3.connect(source_path, timeout=15)
+    target = sqlite3.connect(target_path)
+    try:
+        try:
+            source.backup(target, pages=pages, progress=progress, sleep=sleep)
+            single_step = False
+        except _TooManyRestarts:
+            source.backup(target, pages=-1)
+            single_step = True
+        page_count = target.execute("PRAGMA page_count").fetchone()[0]
+        page_size = target.execute("PRAGMA page_size").fetchone()[0]
+    finally:
+        target.close()
+        source.close()
+    return {"pages": page_count, "page_size": page_size, "restarts": restarts, "single_step": single_step}
+
+
+def _compress(raw_path: str, target_path: str) -> str:
+    """Stream-compress raw_path into target_path; returns the sha256 of the raw bytes"""
+    digest = hashlib.sha256()
+    with open(raw_path, "rb") as raw, gzip.open(target_path, "wb", compresslevel=COMPRESS_LEVEL) as out:
+        while True:
+            chunk = raw.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            digest.update(chunk)
+            out.write(chunk)
+    return digest.hexdigest()
+
+
+def _decompress(source_path: str, target_path: str) -> str:
+    digest = hashlib.sha256()
+    with gzip.open(source_path, "rb") as compressed, open(target_path, "wb") as out:
+        while True:
+            chunk = compressed.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            digest.update(chunk)
+            out.write(chunk)
+        out.flush()
+        os.fsync(out.fileno())
+    return digest.hexdigest()
+
+
+def integrity_check(path: str) -> List[str]:
+    """Problems reported by PRAGMA integrity_check; empty when the file is sound"""
+    connection = sqlite3.connect(path)
+    try:
+        rows = [row[0] for row in connection.execute("PRAGMA integrity_check")]
+    finally:
+        connection.close()
+    return [] if rows == ["ok"] else rows
+
+
+def reserve() -> bool:
+    """Claim the snapshot slot ahead of time; pass reserved=True to create_snapshot"""
+    return _running.acquire(blocking=False)
+
+
+def create_snapshot(reserved: bool = False) -> dict:
+    """Take a compressed point-in-time snapshot of the live database, then rotate.
+
+    With `reserved` the caller already holds the slot from reserve(); it is
+    released here either way.
+    """
+    if not reserved and not _running.acquire(blocking=False):
+        raise ValueError("A snapshot is already being taken")
+    try:
+        source_path = database_path()
+        directory = backup_dir()
+        taken_at = datetime.utcnow()
+        name = f"safe_hdf-{taken_at:%Y%m%dT%H%M%S}Z.db.gz"
+        path = os.path.join(directory, name)
+        if os.path.exists(path):
+            raise ValueError(f"Snapshot {name} already exists")
+        fd, raw_path = tempfile.mkstemp(prefix=".snapshot-", suffix=".db", dir=directory)
+        os.close(fd)
+        try:
+            started = time.perf_counter()
+            copy = copy_online(source_path, raw_path)
+            copied = time.perf_counter()
+            sha256 = _compress(raw_path, path + ".partial")
+            # Renamed only once complete, so a listed snapshot is never truncated
+            os.replace(path + ".partial", path)
+            finished = time.perf_counter()
+        finally:
+            for leftover in (raw_path, path + ".partial"):
+                if os.path.exists(leftover):
+                    os.remove(leftover)
+
+        meta = {
+            "name": name,
+            "taken_at": taken_at.isoformat(),
+            "size_bytes": copy["pages"] * copy["page_size"],
+            "compressed_bytes": os.path.getsize(path),
+            "sha256": sha256,
+            "copy_seconds": round(copied - started, 3),
+            "compress_seconds": round(finished - copied, 3),
+            "restarts": copy["restarts"],
+        }
+        with open(path + ".json", "w") as f:
+            json.dump(meta, f)
+        meta["removed"] = rotate()
+        return meta
+    finally:
+        _running.release()
+
+
+def list_snapshots() -> List[dict]:
+    """Snapshots on disk, newest first"""
+    directory = backup_dir()
+    snapshots = []
+    for name in sorted(os.listdir(directory), reverse=True):
+        if not SNAPSHOT_NAME.match(name):
+            continue
+        path = os.path.join(directory, name)
+        try:
+            with open(path + ".json") as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            meta = {"name": name}
+        meta["compressed_bytes"] = os.path.getsize(path)
+        snapshots.append(meta)
+    return snapshots
+
+
+def _taken_at(name: str) -> datetime:
+    return datetime.strptime(name[len("safe_hdf-"):-len("Z.db.gz")], "%Y%m%dT%H%M%S")
+
+
+def rotate(keep: int = BACKUP_KEEP, max_age_days: Optional[float] = None) -> List[str]:
+    """Delete snapshots beyond the newest `keep` or older than the maximum age"""
+    if max_age_days is None and BACKUP_MAX_AGE_DAYS:
+        max_age_days = float(BACKUP_MAX_AGE_DAYS)
+    directory = backup_dir()
+    now = datetime.utcnow()
+    removed = []
+    for index, snapshot in enumerate(list_snapshots()):
+        name = snapshot["name"]
+        too_old = max_age_days is not None and (now - _taken_at(name)).total_seconds() > max_age_days * 86400
+        # The newest snapshot is always kept, whatever its age
+        if index > 0 and (index >= keep or too_old):
+            for path in (os.path.join(directory, name), os.path.join(directory, name + ".json")):
+                if os.path.exists(path):
+                    os.remove(path)
+            removed.append(name)
+    return removed
+
+
+def restore(name: str, target_path: str) -> dict:
+    """Decompress a snapshot to target_path, replacing it only once verified.
+
+    The snapshot is expanded next to the target and checked (checksum and
+    PRAGMA integrity_check) before an atomic rename, so a failed restore
+    leaves the target untouched. Stop the API before restoring over the
+    live database.
+    """
+    path = _snapshot_path(name)
+    target_path = os.path.abspath(target_path)
+    fd, staging = tempfile.mkstemp(prefix=".restore-", suffix=".db", dir=os.path.dirname(target_path))
+    os.close(fd)
+    try:
+        started = time.perf_counter()
+        sha256 = _decompress(path, staging)
+        decompressed = time.perf_counter()
+        try:
+            with open(path + ".json") as f:
+                expected = json.load(f).get("sha256")
+        except (OSError, ValueError):
+            expected = None
+        if expected and expected != sha256:
+            raise ValueError(f"Snapshot {name} is corrupt: checksum mismatch")
+        problems = integrity_check(staging)
+        if problems:
+            raise ValueError(f"Snapshot {name} failed the integrity check: {'; '.join(problems[:5])}")
+        checked = time.perf_counter()
+        # Stale WAL/SHM files from the previous database must not be replayed on the restored one
+        for suffix in ("-wal", "-shm"):
+            if os.path.exists(target_path + suffix):
+                os.remove(target_path + suffix)
+        os.replace(staging, target_path)
+    finally:
+        if os.path.exists(staging):
+            os.remove(staging)
+    return {
+        "name": name,
+        "restored_to": target_path,
+        "decompress_seconds": round(decompressed - started, 3),
+        "integrity_check_seconds": round(checked - decompressed, 3),
+    }
+
+
+def verify(name: str) -> dict:
+    """Restore a snapshot into a scratch file to prove it is usable, then discard it"""
+    directory = tempfile.mkdtemp(dir=backup_dir(), prefix=".verify-")
+    try:
+        result = restore(name, os.path.join(directory, "verify.db"))
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+    result.pop("restored_to")
+    result["ok"] = True
+    return result
+
+
+async def run_nightly(session_factory, hour: int):
+    """Background loop taking a snapshot every day at `hour` (UTC)"""
+    import asyncio
+    from starlette.concurrency import run_in_threadpool
+    from app.services.rollups import _seconds_until
+
+    def _backup():
+        db = session_factory()
+        try:
+            claimed = coherence.claim(db, "backup", datetime.utcnow().date().isoformat())
+        finally:
+            db.close()
+        if claimed:
+            create_snapshot()
+
+    while True:
+        await asyncio.sleep(_seconds_until(hour))
+        try:
+            await run_in_threadpool(_backup)
+        except Exception as e:
+            print(f"Backup failed: {e}")
+
+
+def main():
+    """Offline restore: python -m app.services.backup restore <name> [--target PATH]"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="SQLite snapshot maintenance (stop the API before restoring)")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("list")
+    sub.add_parser("create")
+    restore_parser = sub.add_parser("restore")
+    restore_parser.add_argument("name")
+    restore_parser.add_argument("--target", help="defaults to the configured database file")
+    args = parser.parse_args()
+
+    if args.command == "list":
+        result = list_snapshots()
+    elif args.command == "create":
+        result = create_snapshot()
+    else:
+        result = restore(args.name, args.target or database_path())
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,311 @@
+import hashlib
+import os
+import re
+import secrets
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Dict, List, Optional, Tuple
+from sqlalchemy.orm import Session
+from app.database import Appointment, CalendarFeed, CacheVersion
+from app.services import coherence, recurrence, serialization
+from app.services.coalescing import SingleFlight
+
+# Feeds cover appointments from this many days ago to this many days ahead
+CALENDAR_FEED_PAST_DAYS = int(os.getenv("CALENDAR_FEED_PAST_DAYS", "30"))
+CALENDAR_FEED_FUTURE_DAYS = int(os.getenv("CALENDAR_FEED_FUTURE_DAYS", "365"))
+# Polls within this many seconds of the last check are answered from memory,
+# without re-checking versions; writes from other workers show up after at most
+# this delay. Revoking a feed takes effect at once.
+CALENDAR_FEED_REVALIDATE_SECONDS = float(os.getenv("CALENDAR_FEED_REVALIDATE_SECONDS", "60"))
+
+NAMESPACES = ("appointments", "recurrence", "calendar_feeds")
+FETCH_CHUNK = 500
+PRODID = "-//Safe HDF//Rendez-vous//FR"
+
+_UNTIL = re.compile(r"UNTIL=(\d{8})(T\d{6})?", re.IGNORECASE)
+
+
+def new_token() -> str:
+    return secrets.token_urlsafe(24)
+
+
+def _escape(text: str) -> str:
+    return (
+        text.replace("\\", "\\\\").replace(";", "\\;").replace(",", "\\,")
+        .replace("\r\n", "\\n").replace("\n", "\\n")
+    )
+
+
+def _fold(line: str) -> str:
+    """Split a content line into 75-octet chunks (RFC 5545 3.1)"""
+    encoded = line.encode("utf-8")
+    if len(encoded) <= 75:
+        return line + "\r\n"
+    parts, start, limit = [], 0, 75
+    while start < len(encoded):
+        end = min(start + limit, len(encoded))
+        # Never cut a multi-byte character in half
+        while end < len(encoded) and (encoded[end] & 0xC0) == 0x80:
+            end -= 1
+        parts.append(encoded[start:end].decode("utf-8"))
+        start, limit = end, 74  # continuation lines start with a space
+    return "\r\n ".join(parts) + "\r\n"
+
+
+def _utc(value: datetime) -> str:
+    return value.strftime("%Y%m%dT%H%M%SZ")
+
+
+def _ics_rule(rule: str) -> str:
+    """Stored rules are naive UTC; iCalendar wants UNTIL in UTC like DTSTART"""
+    return _UNTIL.sub(lambda m: f"UNTIL={m.group(1)}{m.group(2) or 'T235959'}Z", rule)
+
+
+def _description(values: dict) -> Optional[str]:
+    lines = [values.get("description") or ""]
+    contact = " ".join(filter(None, [values.get("contact_name"), values.get("contact_phone")]))
+    if contact:
+        lines.append(f"Contact : {contact}")
+    if values.get("contact_email"):
+        lines.append(values["contact_email"])
+    text = "\n".join(line for line in lines if line)
+    return text or None
+
+
+def _vevent(values: dict, uid: str, stamp: datetime, extra: List[str]) -> str:
+    lines = [
+        "BEGIN:VEVENT",
+        f"UID:{uid}",
+        f"DTSTAMP:{_utc(stamp)}",
+        f"LAST-MODIFIED:{_utc(stamp)}",
+        *extra,
+        f"DTSTART:{_utc(values['start_time'])}",
+    ]
+    if values.get("end_time"):
+        lines.append(f"DTEND:{_utc(values['end_time'])}")
+    lines.append(f"SUMMARY:{_escape(values['title'])}")
+    if values.get("location"):
+        lines.append(f"LOCATION:{_escape(values['location'])}")
+    description = _description(values)
+    if description:
+        lines.append(f"DESCRIPTION:{_escape(description)}")
+    lines.append("STATUS:CANCELLED" if values.get("status") == "cancelled" else "STATUS:CONFIRMED")
+    lines.append("END:VEVENT")
+    return "".join(_fold(line) for line in lines)
+
+
+def render_appointment(appointment: Appointment, exceptions: Optional[dict] = None) -> str:
+    """VEVENTs of one appointment; a series is one RRULE event plus its exceptions"""
+    uid = f"appointment-{appointment.id}@safe-hdf"
+    stamp = appointment.updated_at or appointment.created_at or datetime.utcnow()
+    values = recurrence.row_dict(appointment)
+    if not appointment.recurrence_rule:
+        return _vevent(values, uid, stamp, [])
+
+    kind = recurrence.APPOINTMENTS
+    extra = [f"RRULE:{_ics_rule(appointment.recurrence_rule)}"]
+    overridden = []
+    for original, exception in sorted((exceptions or {}).items()):
+        overrides = recurrence.decode_overrides(kind, exception)
+        if exception.cancelled:
+            extra.append(f"EXDATE:{_utc(original)}")
+            continue
+        occurrence = recurrence.occurrence(appointment, kind, original, overrides)
+        overridden.append(_vevent(
+            occurrence, uid, exception.updated_at or stamp, [f"RECURRENCE-ID:{_utc(original)}"]
+        ))
+    return _vevent(values, uid, stamp, extra) + "".join(overridden)
+
+
+def _exceptions_stamp(exceptions: dict) -> tuple:
+    return tuple(sorted(
+        (original, exception.cancelled, exception.overrides) for original, exception in exceptions.items()
+    ))
+
+
+class FeedState:
+    """Rendered feed of one token, with the per-appointment pieces it was built from"""
+
+    def __init__(self, feed: CalendarFeed):
+        self.token = feed.token
+        self.name = feed.name
+        self.technician = feed.technician
+        self.technician_id = feed.technician_id
+        self.window: Optional[Tuple[datetime, datetime]] = None
+        self.versions: Optional[tuple] = None
+        self.local_versions: Optional[tuple] = None
+        self.checked_at = 0.0
+        # id -> (stamp, rendered VEVENTs)
+        self.events: Dict[int, tuple] = {}
+        self.body = b""
+        self.etag = ""
+        self.last_modified = datetime(1970, 1, 1)
+        self.rendered = 0
+
+    def headers(self) -> dict:
+        return {
+            "ETag": self.etag,
+            "Last-Modified": format_datetime(self.last_modified.replace(microsecond=0, tzinfo=timezone.utc), usegmt=True),
+            "Cache-Control": f"private, max-age={int(CALENDAR_FEED_REVALIDATE_SECONDS)}",
+        }
+
+
+_states: Dict[str, FeedState] = {}
+_states_lock = threading.Lock()
+_builds = SingleFlight()
+
+
+def window(now: Optional[datetime] = None) -> Tuple[datetime, datetime]:
+    """Feed window, moved once a day so it doesn't invalidate every poll"""
+    today = (now or datetime.utcnow()).replace(hour=0, minute=0, second=0, microsecond=0)
+    return today - timedelta(days=CALENDAR_FEED_PAST_DAYS), today + timedelta(days=CALENDAR_FEED_FUTURE_DAYS)
+
+
+def _versions(db: Session) -> Tuple[tuple, Optional[datetime]]:
+    rows = {
+        namespace: (version, updated_at)
+        for namespace, version, updated_at in db.query(
+            CacheVersion.namespace, CacheVersion.version, CacheVersion.updated_at
+        ).filter(CacheVersion.namespace.in_(NAMESPACES))
+    }
+    stamps = [updated_at for _, updated_at in rows.values() if updated_at is not None]
+    return (
+        tuple(rows.get(namespace, (0, None))[0] for namespace in NAMESPACES),
+        max(stamps) if stamps else None,
+    )
+
+
+def _rebuild(db: Session, state: FeedState, start: datetime, end: datetime) -> int:
+    """Re-render only the appointments whose row or exceptions changed"""
+    query = db.query(Appointment.id, Appointment.updated_at).filter(
+        Appointment.recurrence_rule.is_(None),
+        Appointment.start_time >= start,
+        Appointment.start_time <= end,
+    )
+    if state.technician_id is not None:
+        query = query.filter(Appointment.technician_id == state.technician_id)
+    stamps = {row_id: updated_at for row_id, updated_at in serialization.stream(query)}
+
+    series = [
+        obj for obj in recurrence.series_in_window(db, recurrence.APPOINTMENTS, start, end)
+        if state.technician_id is None or obj.technician_id == state.technician_id
+    ]
+    exceptions = recurrence.load_exceptions(db, recurrence.APPOINTMENTS, [obj.id for obj in series])
+
+    events, rendered = {}, 0
+    for obj in series:
+        stamp = (obj.updated_at, _exceptions_stamp(exceptions.get(obj.id, {})))
+        previous = state.events.get(obj.id)
+        if previous is not None and previous[0] == stamp:
+            events[obj.id] = previous
+        else:
+            events[obj.id] = (stamp, render_appointment(obj, exceptions.get(obj.id)))
+            rendered += 1
+
+    changed = []
+    for row_id, stamp in stamps.items():
+        previous = state.events.get(row_id)
+        if previous is not None and previous[0] == stamp:
+            events[row_id] = previous
+        else:
+            changed.append(row_id)
+    for offset in range(0, len(changed), FETCH_CHUNK):
+        for obj in db.query(Appointment).filter(Appointment.id.in_(changed[offset:offset + FETCH_CHUNK])):
+            events[obj.id] = (obj.updated_at, render_appointment(obj))
+            rendered += 1
+
+    state.events = events
+    return rendered
+
+
+def _assemble(state: FeedState) -> bytes:
+    title = f"Safe HDF – {state.technician}" if state.technician else (state.name or "Safe HDF – Rendez-vous")
+    header = "".join(_fold(line) for line in [
+        "BEGIN:VCALENDAR",
+        "VERSION:2.0",
+        f"PRODID:{PRODID}",
+        "CALSCALE:GREGORIAN",
+        "METHOD:PUBLISH",
+        f"X-WR-CALNAME:{_escape(title)}",
+        "REFRESH-INTERVAL;VALUE=DURATION:PT15M",
+        "X-PUBLISHED-TTL:PT15M",
+    ])
+    body = header + "".join(state.events[key][1] for key in sorted(state.events)) + "END:VCALENDAR\r\n"
+    return body.encode("utf-8")
+
+
+def _refresh(db: Session, token: str) -> Optional[FeedState]:
+    local = coherence.local_versions(NAMESPACES)
+    # Read before rebuilding, so a concurrent write leaves the state stale rather than hidden
+    versions, changed_at = _versions(db)
+    start, end = window()
+    state = _states.get(token)
+    if state is not None and state.versions == versions and state.window == (start, end):
+        state.local_versions = local
+        state.checked_at = time.monotonic()
+        return state
+
+    feed = db.query(CalendarFeed).filter(CalendarFeed.token == token).first()
+    if feed is None:
+        with _states_lock:
+            _states.pop(token, None)
+        return None
+    if (state is None or state.technician_id != feed.technician_id
+            or state.technician != feed.technician or state.name != feed.name):
+        state = FeedState(feed)
+
+    state.rendered = _rebuild(db, state, start, end)
+    body = _assemble(state)
+    if body != state.body:
+        state.body = body
+        state.etag = 'W/"%s"' % hashlib.blake2b(body, digest_size=12).hexdigest()
+        # Shared by every worker unless the content only moved with the daily window
+        window_moved = state.versions == versions
+        state.last_modified = changed_at if changed_at and not window_moved else datetime.utcnow()
+    state.window = (start, end)
+    state.versions = versions
+    state.local_versions = local
+    state.checked_at = time.monotonic()
+    with _states_lock:
+        _states[token] = state
+    return state
+
+
+def lookup(db: Session, token: str) -> Optional[FeedState]:
+    """Current feed for a token, or None if no such feed exists.
+
+    Every poll checks the token still exists (one indexed query), so a
+    feed revoked on any worker stops serving at once. The content is then
+    answered from memory while nothing changed in this process and the
+    last version check is recent; otherwise one version query decides
+    whether the feed must be re-rendered, and only changed appointments are.
+    """
+    if db.query(CalendarFeed.id).filter(CalendarFeed.token == token).first() is None:
+        with _states_lock:
+            _states.pop(token, None)
+        return None
+    state = _states.get(token)
+    if (
+        state is not None
+        and state.local_versions == coherence.local_versions(NAMESPACES)
+        and time.monotonic() - state.checked_at < CALENDAR_FEED_REVALIDATE_SECONDS
+        and state.window == window()
+    ):
+        return state
+    # Concurrent polls of the same feed share one refresh
+    return _builds.do(token, lambda: _refresh(db, token))
+
+
+def not_modified(state: FeedState, if_none_match: Optional[str], if_modified_since: Optional[str]) -> bool:
+    if if_none_match is not None:
+        return state.etag in (tag.strip() for tag in if_none_match.split(","))
+    if if_modified_since:
+        try:
+            since = recurrence.naive_utc(parsedate_to_datetime(if_modified_since))
+        except (TypeError, ValueError):
+            return False
+        return state.last_modified.replace(microsecond=0) <= since
+    return False
+
@@ -0,0 +1,111 @@
+import functools
+import json
+import os
+import threading
+from typing import Callable, Dict, Iterable
+from pydantic import BaseModel
+
+# Set to false to run every request independently (e.g. when debugging)
+REQUEST_COALESCING = os.getenv("REQUEST_COALESCING", "true").lower() in ("1", "true", "yes")
+
+
+class _Call:
+    __slots__ = ("done", "result", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """Runs one computation per key at a time; concurrent callers share its outcome.
+
+    Results are handed to every waiting caller as-is, so computations must
+    return values that are safe to share (dicts, lists, Pydantic models),
+    not ORM instances bound to the leader's session.
+    """
+
+    def __init__(self):
+        self._calls: Dict[str, _Call] = {}
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.executions = 0
+
+    def do(self, key: str, compute: Callable[[], object]):
+        with self._lock:
+            self.requests += 1
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                self.executions += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = compute()
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    def stats(self) -> dict:
+        coalesced = self.requests - self.executions
+        return {
+            "requests": self.requests,
+            "executions": self.executions,
+            "coalesced": coalesced,
+            "coalescing_ratio": round(coalesced / self.requests, 4) if self.requests else 0.0,
+        }
+
+
+FLIGHTS: Dict[str, SingleFlight] = {}
+
+
+def _normalize(value):
+    if isinstance(value, BaseModel):
+        return value.model_dump(mode="json")
+    if isinstance(value, dict):
+        return {k: _normalize(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_normalize(v) for v in value]
+    return value
+
+
+def request_key(params: dict, exclude: Iterable[str] = ()) -> str:
+    """Order-independent key for endpoint arguments"""
+    normalized = {k: _normalize(v) for k, v in params.items() if k not in exclude}
+    return json.dumps(normalized, sort_keys=True, default=str)
+
+
+def coalesce(route: str, exclude: Iterable[str] = ("db",)):
+    """Opt a sync endpoint into single-flight execution keyed by its arguments.
+
+    `exclude` lists arguments that don't affect the result (the DB session
+    by default). Apply below the router decorator.
+    """
+    exclude = tuple(exclude)
+    flight = FLIGHTS.setdefault(route, SingleFlight())
+
+    def decorator(endpoint):
+        @functools.wraps(endpoint)
+        def wrapper(**kwargs):
+            if not REQUEST_COALESCING:
+                return endpoint(**kwargs)
+            return flight.do(request_key(kwargs, exclude), lambda: endpoint(**kwargs))
+        return wrapper
+
+    return decorator
+
+
+def stats() -> dict:
+    return {route: flight.stats() for route, flight in sorted(FLIGHTS.items())}
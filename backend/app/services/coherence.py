@@ -0,0 +1,198 @@
+import logging
+import os
+import socket
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from collections import Counter
+from typing import Callable, Dict, Iterable, Optional, Tuple
+from sqlalchemy import event
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from app.database import (
+    Task, StockItem, StockLevel, StockTransfer, Location, Appointment, RecurrenceException, CalendarFeed,
+    CacheVersion, JobClaim,
+    DATABASE_URL, engine, dialect_insert
+)
+
+logger = logging.getLogger("safe_hdf.coherence")
+
+# Worker processes share nothing but the database, so in-process caches
+# are keyed on per-namespace version counters stored in cache_versions.
+# Flushes only note the namespaces they touch; each commit then bumps them
+# once in its own short transaction, so writers don't hold the shared
+# cache_versions rows locked for the rest of their transaction. Other
+# workers see the new version on their next read.
+MODEL_NAMESPACES = {
+    Task: "tasks",
+    StockItem: "stock",
+    StockLevel: "stock",
+    StockTransfer: "stock",
+    Location: "stock",
+    Appointment: "appointments",
+    RecurrenceException: "recurrence",
+    CalendarFeed: "calendar_feeds",
+}
+
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}"
+
+
+def bump(connection, namespaces: Iterable[str]):
+    """Increment namespace versions in the given connection's transaction"""
+    insert = dialect_insert(connection)
+    table = CacheVersion.__table__
+    now = datetime.utcnow()
+    for namespace in sorted(set(namespaces)):
+        connection.execute(
+            insert(table).values(namespace=namespace, version=1, updated_at=now)
+            .on_conflict_do_update(
+                index_elements=["namespace"],
+                set_={"version": table.c.version + 1, "updated_at": now},
+            )
+        )
+
+
+# Bumps committed by this process, readable without a query; other
+# processes' writes are only seen through cache_versions
+_local_versions: Counter = Counter()
+
+
+def local_versions(namespaces: Tuple[str, ...]) -> Tuple[int, ...]:
+    return tuple(_local_versions[namespace] for namespace in namespaces)
+
+
+def _pending(session: Session) -> set:
+    return session.info.setdefault("coherence_bumped", set())
+
+
+def invalidate(db: Session, *namespaces: str):
+    """Bump namespaces after writes that bypass the ORM (bulk Core statements)"""
+    _pending(db).update(namespaces)
+    db.commit()
+
+
+def versions(db: Session, namespaces: Tuple[str, ...]) -> Tuple[int, ...]:
+    rows = dict(
+        db.query(CacheVersion.namespace, CacheVersion.version)
+        .filter(CacheVersion.namespace.in_(namespaces))
+        .all()
+    )
+    return tuple(rows.get(namespace, 0) for namespace in namespaces)
+
+
+def _after_flush(session: Session, flush_context):
+    touched = {
+        MODEL_NAMESPACES[type(obj)]
+        for obj in (*session.new, *session.dirty, *session.deleted)
+        if type(obj) in MODEL_NAMESPACES
+    }
+    if touched:
+        _pending(session).update(touched)
+
+
+def _after_commit(session: Session):
+    namespaces = session.info.pop("coherence_bumped", ())
+    if not namespaces:
+        return
+    # The data is already committed: until this lands other workers may serve
+    # their cached copy a moment longer, and if it fails, until the next bump
+    try:
+        with session.get_bind().begin() as connection:
+            bump(connection, namespaces)
+    except Exception:
+        logger.exception("Could not bump cache versions for %s", ", ".join(sorted(namespaces)))
+    for namespace in namespaces:
+        _local_versions[namespace] += 1
+
+
+def _after_rollback(session: Session):
+    session.info.pop("coherence_bumped", None)
+
+
+def install(session_factory):
+    """Bump namespace versions on every commit of sessions from this factory"""
+    if not event.contains(session_factory, "after_flush", _after_flush):
+        event.listen(session_factory, "after_flush", _after_flush)
+        event.listen(session_factory, "after_commit", _after_commit)
+        event.listen(session_factory, "after_rollback", _after_rollback)
+
+
+class VersionedCache:
+    """Process-local cache whose entries die when their namespaces change.
+
+    A lookup costs one primary-key query on cache_versions instead of the
+    cached computation. `ttl` bounds staleness for values that also depend
+    on the clock (e.g. overdue counts).
+    """
+
+    def __init__(self, ttl: Optional[float] = None, max_entries: int = 256):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries: Dict[str, tuple] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get_or_compute(self, db: Session, key: str, namespaces: Tuple[str, ...],
+                       compute: Callable[[], object]):
+        # Versions are read before computing, so a concurrent write makes the
+        # stored entry stale rather than hiding the write
+        current = versions(db, namespaces)
+        now = time.monotonic()
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] == current and (entry[1] is None or entry[1] > now):
+            self.hits += 1
+            return entry[2]
+
+        self.misses += 1
+        value = compute()
+        with self._lock:
+            if len(self._entries) >= self.max_entries and key not in self._entries:
+                self._entries.pop(next(iter(self._entries)))
+            self._entries[key] = (current, now + self.ttl if self.ttl else None, value)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+def claim(db: Session, job: str, period: str) -> bool:
+    """Claim a periodic job run; exactly one worker wins per (job, period)"""
+    db.add(JobClaim(job=job, period=period, claimed_by=WORKER_ID))
+    try:
+        db.commit()
+        return True
+    except IntegrityError:
+        db.rollback()
+        return False
+
+
+STARTUP_ADVISORY_LOCK = 0x5AFE4DF
+
+
+@contextmanager
+def startup_lock():
+    """Serialize startup work (schema creation, baselines) across worker processes"""
+    if engine.dialect.name == "postgresql":
+        # Workers may run on several hosts, so lock in the database itself
+        with engine.connect() as connection:
+            connection.exec_driver_sql(f"SELECT pg_advisory_lock({STARTUP_ADVISORY_LOCK})")
+            try:
+                yield
+            finally:
+                connection.exec_driver_sql(f"SELECT pg_advisory_unlock({STARTUP_ADVISORY_LOCK})")
+        return
+    if not DATABASE_URL.startswith("sqlite") or ":memory:" in DATABASE_URL:
+        yield
+        return
+    import fcntl
+
+    path = DATABASE_URL.split("///", 1)[-1] + ".startup.lock"
+    with open(path, "w") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
@@ -0,0 +1,204 @@
+import contextvars
+import hmac
+import logging
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Dict, Optional
+from sqlalchemy import event
+
+logger = logging.getLogger("safe_hdf.diagnostics")
+
+# Statements slower than this (milliseconds) are logged; off unless set (e.g. 500)
+SLOW_QUERY_MS = os.getenv("SLOW_QUERY_MS", "")
+# Identical statements repeated this many times in one request are flagged; off unless set (e.g. 10)
+N_PLUS_ONE_THRESHOLD = os.getenv("N_PLUS_ONE_THRESHOLD", "")
+# Shared secret for admin-only switches such as ?profile=1, empty to disable them
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", "1"))
+
+# Leaf frames of threads waiting for work; sampling them only adds noise
+IDLE_FRAMES = {("selectors.py", "select"), ("threading.py", "wait")}
+
+MAX_LOGGED_STATEMENT = 300
+
+
+class RequestStats:
+    """SQL activity of one HTTP request, filled by the cursor hooks"""
+
+    def __init__(self, scope: dict):
+        self.scope = scope
+        self.statements: Counter = Counter()
+
+    @property
+    def route(self) -> str:
+        endpoint = self.scope.get("endpoint")
+        label = f"{self.scope.get('method', '')} {self.scope.get('path', '')}"
+        return f"{label} ({endpoint.__name__})" if endpoint is not None else label
+
+    @property
+    def query_count(self) -> int:
+        return sum(self.statements.values())
+
+    def repeated(self, threshold: int) -> Dict[str, int]:
+        return {sql: count for sql, count in self.statements.most_common() if count >= threshold}
+
+
+_current_request: contextvars.ContextVar[Optional[RequestStats]] = contextvars.ContextVar(
+    "diagnostics_request", default=None
+)
+
+
+def _threshold(value: str) -> Optional[float]:
+    return float(value) if value else None
+
+
+def slow_query_seconds() -> Optional[float]:
+    threshold = _threshold(SLOW_QUERY_MS)
+    return threshold / 1000 if threshold is not None else None
+
+
+def n_plus_one_threshold() -> Optional[int]:
+    threshold = _threshold(N_PLUS_ONE_THRESHOLD)
+    return int(threshold) if threshold is not None else None
+
+
+def enabled() -> bool:
+    """Whether any per-request diagnostics are configured"""
+    return bool(SLOW_QUERY_MS or N_PLUS_ONE_THRESHOLD or ADMIN_TOKEN)
+
+
+def is_admin(token: Optional[str]) -> bool:
+    return bool(ADMIN_TOKEN) and token is not None and hmac.compare_digest(token, ADMIN_TOKEN)
+
+
+def parameters_shape(parameters, executemany: bool = False) -> str:
+    """Describe bound parameters by type only, so values never reach the logs"""
+    if executemany and isinstance(parameters, (list, tuple)):
+        first = parameters_shape(parameters[0]) if parameters else "()"
+        return f"{len(parameters)} x {first}"
+    if isinstance(parameters, dict):
+        return "{" + ", ".join(f"{k}: {type(v).__name__}" for k, v in parameters.items()) + "}"
+    if isinstance(parameters, (list, tuple)):
+        return "(" + ", ".join(type(v).__name__ for v in parameters) + ")"
+    return type(parameters).__name__
+
+
+def _compact(statement: str) -> str:
+    statement = " ".join(statement.split())
+    if len(statement) > MAX_LOGGED_STATEMENT:
+        return statement[:MAX_LOGGED_STATEMENT] + "..."
+    return statement
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("diagnostics_started", []).append(time.perf_counter())
+    stats = _current_request.get()
+    if stats is not None:
+        stats.statements[statement] += 1
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info["diagnostics_started"].pop()
+    elapsed = time.perf_counter() - started
+    threshold = slow_query_seconds()
+    if threshold is not None and elapsed >= threshold:
+        stats = _current_request.get()
+        logger.warning(
+            "Slow query (%.1f ms) on %s: %s | params %s",
+            elapsed * 1000,
+            stats.route if stats is not None else "background",
+            _compact(statement),
+            parameters_shape(parameters, executemany),
+        )
+
+
+def _handle_error(context):
+    # A failed statement never reaches after_cursor_execute; drop its start time
+    # so the list on the pooled connection doesn't grow
+    connection = context.connection
+    if connection is not None and context.statement is not None:
+        started = connection.info.get("diagnostics_started")
+        if started:
+            started.pop()
+
+
+def install(engine):
+    """Attach the cursor hooks; nothing is attached when all diagnostics are off"""
+    if not enabled():
+        return
+    if not event.contains(engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+        event.listen(engine, "handle_error", _handle_error)
+
+
+def current_request() -> Optional[RequestStats]:
+    return _current_request.get()
+
+
+def begin_request(scope: dict) -> contextvars.Token:
+    return _current_request.set(RequestStats(scope))
+
+
+def end_request(token: contextvars.Token) -> RequestStats:
+    stats = _current_request.get()
+    _current_request.reset(token)
+    threshold = n_plus_one_threshold()
+    if threshold is not None:
+        for statement, count in stats.repeated(threshold).items():
+            logger.warning(
+                "Possible N+1 on %s: %d x %s", stats.route, count, _compact(statement)
+            )
+    return stats
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    filename = code.co_filename.rsplit(os.sep, 2)
+    return f"{code.co_name} ({'/'.join(filename[-2:])}:{code.co_firstlineno})"
+
+
+class SamplingProfiler:
+    """Samples every thread's stack on an interval and folds identical stacks.
+
+    Output is in the collapsed-stack format (`root;child;leaf count`) read
+    by flamegraph.pl and speedscope. Requests served concurrently with the
+    profiled one also show up in the samples.
+    """
+
+    def __init__(self, interval: float = PROFILE_INTERVAL_MS / 1000):
+        self.interval = interval
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _run(self):
+        own_id = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            self.samples += 1
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                leaf = frame.f_code
+                if (os.path.basename(leaf.co_filename), leaf.co_name) in IDLE_FRAMES:
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(_frame_label(frame))
+                    frame = frame.f_back
+                self.stacks[";".join(reversed(stack))] += 1
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def folded(self) -> str:
+        return "\n".join(f"{stack} {count}" for stack, count in self.stacks.most_common())
@@ -1,13 +1,13 @@
 import os
 from datetime import datetime, timedelta
-from typing import Optional, List
-from google.oauth2.credentials import Credentials
-from google_auth_oauthlib.flow import Flow
-from googleapiclient.discovery import build
-from google.auth.transport.requests import Request
+from typing import Optional, List, TYPE_CHECKING
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 from app.database import GoogleCalendarToken, Appointment
 
+if TYPE_CHECKING:
+    from google.oauth2.credentials import Credentials
+
 # Configuration OAuth2
 GOOGLE_CLIENT_ID = os.getenv("GOOGLE_CLIENT_ID", "")
 GOOGLE_CLIENT_SECRET = os.getenv("GOOGLE_CLIENT_SECRET", "")
@@ -18,6 +18,28 @@ SCOPES = [
     'https://www.googleapis.com/auth/calendar.events'
 ]
 
+# The Google client libraries are heavy to import, so they are only loaded
+# on first use; deployments without OAuth configured never load them.
+
+def _flow_from_client_config(*args, **kwargs):
+    from google_auth_oauthlib.flow import Flow
+    return Flow.from_client_config(*args, **kwargs)
+
+def _credentials(**kwargs) -> "Credentials":
+    from google.oauth2.credentials import Credentials
+    return Credentials(**kwargs)
+
+def _auth_request():
+    from google.auth.transport.requests import Request
+    return Request()
+
+def build(*args, **kwargs):
+    from googleapiclient.discovery import build as discovery_build
+    return discovery_build(*args, **kwargs)
+
+def is_configured() -> bool:
+    return bool(GOOGLE_CLIENT_ID and GOOGLE_CLIENT_SECRET)
+
 class GoogleCalendarService:
     def __init__(self, db: Session):
         self.db = db
@@ -25,10 +47,10 @@ class GoogleCalendarService:
     
     def get_auth_url(self) -> str:
         """Generate OAuth2 authorization URL"""
-        if not GOOGLE_CLIENT_ID or not GOOGLE_CLIENT_SECRET:
+        if not is_configured():
             raise ValueError("Google OAuth credentials not configured")
         
-        flow = Flow.from_client_config(
+        flow = _flow_from_client_config(
             {
                 "web": {
                     "client_id": GOOGLE_CLIENT_ID,
@@ -47,8 +69,10 @@ class GoogleCalendarService:
     
     def exchange_code(self, code: str, user_id: str = "default") -> bool:
         """Exchange authorization code for tokens"""
+        if not is_configured():
+            return False
         try:
-            flow = Flow.from_client_config(
+            flow = _flow_from_client_config(
                 {
                     "web": {
                         "client_id": GOOGLE_CLIENT_ID,
@@ -89,7 +113,7 @@ class GoogleCalendarService:
             print(f"Error exchanging code: {e}")
             return False
     
-    def _get_credentials(self, user_id: str = "default") -> Optional[Credentials]:
+    def _get_credentials(self, user_id: str = "default") -> Optional["Credentials"]:
         """Get credentials for user"""
         token_record = self.db.query(GoogleCalendarToken).filter(
             GoogleCalendarToken.user_id == user_id
@@ -98,7 +122,7 @@ class GoogleCalendarService:
         if not token_record:
             return None
         
-        credentials = Credentials(
+        credentials = _credentials(
             token=token_record.access_token,
             refresh_token=token_record.refresh_token,
             token_uri="https://oauth2.googleapis.com/token",
@@ -109,7 +133,7 @@ class GoogleCalendarService:
         
         # Refresh if expired
         if credentials.expired and credentials.refresh_token:
-            credentials.refresh(Request())
+            credentials.refresh(_auth_request())
             token_record.access_token = credentials.token
             token_record.token_expiry = credentials.expiry
             self.db.commit()
@@ -145,13 +169,26 @@ class GoogleCalendarService:
         ).execute()
         
         events = events_result.get('items', [])
+        try:
+            synced_count = self._store_events(events, calendar_id)
+        except IntegrityError:
+            # Another worker inserted some of these events concurrently;
+            # retrying turns those inserts into updates
+            self.db.rollback()
+            synced_count = self._store_events(events, calendar_id)
+        return {"synced": synced_count, "total": len(events)}
+    
+    def _store_events(self, events: List[dict], calendar_id: str) -> int:
+        existing_by_id = {
+            appointment.google_event_id: appointment
+            for appointment in self.db.query(Appointment).filter(
+                Appointment.google_event_id.in_([event['id'] for event in events])
+            )
+        } if events else {}
         synced_count = 0
         
         for event in events:
-            # Check if event already exists
-            existing = self.db.query(Appointment).filter(
-                Appointment.google_event_id == event['id']
-            ).first()
+            existing = existing_by_id.get(event['id'])
             
             start_time = event['start'].get('dateTime', event['start'].get('date'))
             end_time = event['end'].get('dateTime', event['end'].get('date'))
@@ -192,10 +229,11 @@ class GoogleCalendarService:
                     last_synced_at=datetime.utcnow()
                 )
                 self.db.add(new_appointment)
+                existing_by_id[event['id']] = new_appointment
                 synced_count += 1
         
         self.db.commit()
-        return {"synced": synced_count, "total": len(events)}
+        return synced_count
     
     def create_event(self, appointment_id: int, calendar_id: str = "primary",
                      user_id: str = "default") -> Optional[str]:
@@ -0,0 +1,439 @@
+from collections import defaultdict
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+from sqlalchemy import event, func, select, update
+from sqlalchemy.orm import Session, attributes
+from app.database import StockItem, StockLevel, StockTransfer, Location, dialect_insert
+from app.services import coherence
+
+# Where stock of items without a home location is counted
+UNLOCATED = "Non localisé"
+
+# Quantities are floats; smaller differences are rounding noise
+EPSILON = 1e-9
+RECONCILE_CHUNK = 5000
+
+# Low stock, written the way the shortfall indexes are defined
+ITEM_IS_LOW = (StockItem.quantity - StockItem.min_threshold) <= 0
+LEVEL_IS_LOW = (StockLevel.quantity - StockLevel.min_threshold) <= 0
+
+
+def _normalize(name: Optional[str]) -> str:
+    return " ".join((name or "").split())
+
+
+def resolve(connection, name: str, cache: Optional[Dict[str, tuple]] = None) -> tuple:
+    """(id, canonical name) of the location called `name`, created if unknown.
+
+    Matching ignores case and extra spaces, like technician names. Runs on
+    the caller's connection and transaction.
+    """
+    key = _normalize(name).lower()
+    if cache is not None and key in cache:
+        return cache[key]
+    table = Location.__table__
+    row = connection.execute(
+        table.select().with_only_columns(table.c.id, table.c.name)
+        .where(func.lower(table.c.name) == key).limit(1)
+    ).first()
+    if row is None:
+        now = datetime.utcnow()
+        # ON CONFLICT: another worker may create the same location concurrently
+        connection.execute(
+            dialect_insert(connection)(table)
+            .values(name=_normalize(name), active=True, created_at=now, updated_at=now)
+            .on_conflict_do_nothing(index_elements=["name"])
+        )
+        row = connection.execute(
+            table.select().with_only_columns(table.c.id, table.c.name)
+            .where(func.lower(table.c.name) == key).limit(1)
+        ).first()
+    result = (row.id, row.name)
+    if cache is not None:
+        cache[key] = result
+    return result
+
+
+def link(connection, name: Optional[str], cache: Optional[Dict[str, tuple]] = None) -> tuple:
+    """(location_id, name) to store for a free-text location; (None, None) when blank"""
+    if not _normalize(name):
+        return None, None
+    return resolve(connection, name, cache)
+
+
+def _home(connection, location_id: Optional[int], cache: Dict[str, tuple]) -> int:
+    return location_id if location_id is not None else resolve(connection, UNLOCATED, cache)[0]
+
+
+def _add(connection, rows: List[dict]):
+    """Add quantities to (item, location) levels, creating the missing ones"""
+    table = StockLevel.__table__
+    insert = dialect_insert(connection)(table)
+    connection.execute(
+        insert.on_conflict_do_update(
+            index_elements=["stock_item_id", "location_id"],
+            set_={"quantity": table.c.quantity + insert.excluded.quantity, "updated_at": insert.excluded.updated_at},
+        ),
+        rows,
+    )
+
+
+def _move(connection, item_id: int, from_id: int, to_id: int, quantity: float, now: datetime) -> bool:
+    """Move stock between two locations; False, with nothing changed, if the source holds too little"""
+    table = StockLevel.__table__
+    # The guard is evaluated on the locked row, so concurrent moves can't overdraw it
+    taken = connection.execute(
+        update(table)
+        .where(table.c.stock_item_id == item_id, table.c.location_id == from_id, table.c.quantity >= quantity)
+        .values(quantity=table.c.quantity - quantity, updated_at=now)
+    ).rowcount
+    if not taken:
+        return False
+    _add(connection, [{"stock_item_id": item_id, "location_id": to_id, "quantity": quantity, "updated_at": now}])
+    return True
+
+
+def _absorb(connection, item_id: int, home_id: int, amount: float, now: datetime):
+    """Place a change of an item's total that no location accounted for.
+
+    Additions go to the home location; removals come out of the home
+    location first, then from the best-stocked other locations.
+    """
+    if amount > 0:
+        _add(connection, [{"stock_item_id": item_id, "location_id": home_id, "quantity": amount, "updated_at": now}])
+        return
+    table = StockLevel.__table__
+    needed = -amount
+    rows = connection.execute(
+        select(table.c.id, table.c.location_id, table.c.quantity)
+        .where(table.c.stock_item_id == item_id, table.c.quantity > 0)
+    ).all()
+    for row in sorted(rows, key=lambda row: (row.location_id != home_id, -row.quantity)):
+        taken = min(row.quantity, needed)
+        connection.execute(
+            update(table).where(table.c.id == row.id)
+            .values(quantity=row.quantity - taken, updated_at=now)
+        )
+        needed -= taken
+        if needed <= EPSILON:
+            break
+
+
+def _rehome(connection, item_id: int, old_home: int, new_home: int, now: datetime):
+    """Follow a changed home location when all of the item's stock was there"""
+    table = StockLevel.__table__
+    stocked = connection.execute(
+        select(table.c.location_id, table.c.quantity)
+        .where(table.c.stock_item_id == item_id, table.c.quantity > EPSILON)
+    ).all()
+    if len(stocked) == 1 and stocked[0].location_id == old_home and old_home != new_home:
+        quantity = stocked[0].quantity
+        _move(connection, item_id, old_home, new_home, quantity, now)
+        connection.execute(StockTransfer.__table__.insert().values(
+            stock_item_id=item_id, from_location_id=old_home, to_location_id=new_home,
+            quantity=quantity, note="Emplacement modifié", created_at=now,
+        ))
+
+
+def relocate(connection, moves: List[Tuple[int, Optional[int], Optional[int]]], cache: Dict[str, tuple]):
+    """Apply home location changes (item id, old, new) written by bulk statements"""
+    now = datetime.utcnow()
+    for item_id, old_location_id, new_location_id in moves:
+        _rehome(connection, item_id, _home(connection, old_location_id, cache),
+                _home(connection, new_location_id, cache), now)
+
+
+def _changed(obj, attr: str) -> bool:
+    # A new row constructed with None counts as unchanged
+    history = attributes.get_history(obj, attr)
+    old = history.deleted[0] if history.deleted else None
+    return bool(history.added) and history.added[0] != old
+
+
+def _previous(obj, attr: str):
+    history = attributes.get_history(obj, attr)
+    if history.deleted:
+        return history.deleted[0]
+    if history.unchanged:
+        return history.unchanged[0]
+    return getattr(obj, attr)
+
+
+def _before_flush(session: Session, flush_context, instances):
+    cache = session.info.setdefault("locations_by_name", {})
+    for obj in (*session.new, *session.dirty):
+        if not isinstance(obj, StockItem):
+            continue
+        if _changed(obj, "location_id"):
+            location = session.get(Location, obj.location_id) if obj.location_id is not None else None
+            obj.location = location.name if location is not None else None
+        elif _changed(obj, "location"):
+            obj.location_id, obj.location = link(session.connection(), obj.location, cache)
+
+
+def _after_flush(session: Session, flush_context):
+    """Keep per-location levels summing to each item's total after ORM writes"""
+    placed: Dict[int, float] = defaultdict(float)
+    items = []
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        if isinstance(obj, StockLevel):
+            old = 0 if obj in session.new else (_previous(obj, "quantity") or 0)
+            new = 0 if obj in session.deleted else (obj.quantity or 0)
+            placed[obj.stock_item_id] += new - old
+        elif isinstance(obj, StockItem) and obj not in session.deleted:
+            items.append(obj)
+    if not items:
+        return
+
+    connection = session.connection()
+    cache = session.info.setdefault("locations_by_name", {})
+    now = datetime.utcnow()
+    for item in items:
+        is_new = item in session.new
+        if not is_new and _changed(item, "location_id"):
+            old_home = _home(connection, _previous(item, "location_id"), cache)
+            _rehome(connection, item.id, old_home, _home(connection, item.location_id, cache), now)
+        old = 0 if is_new else (_previous(item, "quantity") or 0)
+        missing = (item.quantity or 0) - old - placed.get(item.id, 0)
+        if abs(missing) > EPSILON:
+            _absorb(connection, item.id, _home(connection, item.location_id, cache), missing, now)
+
+
+def install(session_factory):
+    """Keep item locations linked and per-location levels in step with totals on every ORM write"""
+    if not event.contains(session_factory, "before_flush", _before_flush):
+        event.listen(session_factory, "before_flush", _before_flush)
+        event.listen(session_factory, "after_flush", _after_flush)
+
+
+def check(db: Session, location_id: Optional[int]):
+    if location_id is not None and db.get(Location, location_id) is None:
+        raise ValueError(f"Location {location_id} not found")
+
+
+def _scopes(item_ids: Optional[List[int]]) -> list:
+    """Filters splitting `item_ids` into chunks; one empty filter when every item is in scope"""
+    if item_ids is None:
+        return [[]]
+    ids = sorted(set(item_ids))
+    return [
+        [StockItem.__table__.c.id.in_(ids[start:start + RECONCILE_CHUNK])]
+        for start in range(0, len(ids), RECONCILE_CHUNK)
+    ]
+
+
+def reconcile(db: Session, item_ids: Optional[List[int]] = None) -> dict:
+    """Link free-text locations and place unplaced quantities (older rows, bulk imports).
+
+    With `item_ids`, only those items are checked instead of the whole table.
+    """
+    connection = db.connection()
+    cache: Dict[str, tuple] = {}
+    items = StockItem.__table__
+    levels = StockLevel.__table__
+    scopes = _scopes(item_ids)
+
+    linked = 0
+    for scope in scopes:
+        names = [
+            name for (name,) in connection.execute(
+                select(items.c.location).distinct()
+                .where(items.c.location_id.is_(None), items.c.location.isnot(None), *scope)
+            )
+        ]
+        for name in names:
+            if not _normalize(name):
+                continue
+            location_id, _ = resolve(connection, name, cache)
+            linked += connection.execute(
+                update(items)
+                .where(items.c.location_id.is_(None), items.c.location == name, *scope)
+                .values(location_id=location_id, updated_at=items.c.updated_at)
+            ).rowcount
+
+    on_hand = (
+        select(func.coalesce(func.sum(levels.c.quantity), 0))
+        .where(levels.c.stock_item_id == items.c.id)
+        .scalar_subquery()
+    )
+    missing = func.coalesce(items.c.quantity, 0) - on_hand
+    placed, now = 0, datetime.utcnow()
+    for scope in scopes:
+        last_id = 0
+        while True:
+            rows = connection.execute(
+                select(items.c.id, items.c.location_id, missing.label("missing"))
+                .where(items.c.id > last_id, func.abs(missing) > EPSILON, *scope)
+                .order_by(items.c.id).limit(RECONCILE_CHUNK)
+            ).all()
+            if not rows:
+                break
+            additions = []
+            for row in rows:
+                home = _home(connection, row.location_id, cache)
+                if row.missing > 0:
+                    additions.append({"stock_item_id": row.id, "location_id": home,
+                                      "quantity": row.missing, "updated_at": now})
+                else:
+                    _absorb(connection, row.id, home, row.missing, now)
+            if additions:
+                _add(connection, additions)
+            placed += len(rows)
+            last_id = rows[-1].id
+
+    if linked or placed:
+        coherence.invalidate(db, "stock")
+    else:
+        db.commit()
+    return {"linked": linked, "placed": placed}
+
+
+def transfer(db: Session, from_location_id: int, to_location_id: int,
+             lines: List[Tuple[int, float]], note: Optional[str] = None) -> List[StockTransfer]:
+    """Move stock between two locations, all lines or none; raises ValueError"""
+    if from_location_id == to_location_id:
+        raise ValueError("Source and destination locations must differ")
+    locations = {
+        location.id: location
+        for location in db.query(Location).filter(Location.id.in_((from_location_id, to_location_id)))
+    }
+    for location_id in (from_location_id, to_location_id):
+        if location_id not in locations:
+            raise ValueError(f"Location {location_id} not found")
+    if not locations[to_location_id].active:
+        raise ValueError(f"Location {locations[to_location_id].name} is inactive")
+    names = dict(db.query(StockItem.id, StockItem.name).filter(StockItem.id.in_({item_id for item_id, _ in lines})))
+    for item_id, _ in lines:
+        if item_id not in names:
+            raise ValueError(f"Stock item {item_id} not found")
+
+    connection = db.connection()
+    now = datetime.utcnow()
+    journal = []
+    for item_id, quantity in lines:
+        if not _move(connection, item_id, from_location_id, to_location_id, quantity, now):
+            db.rollback()
+            raise ValueError(
+                f"Not enough {names[item_id]} at {locations[from_location_id].name} to move {quantity:g}"
+            )
+        journal.append(StockTransfer(
+            stock_item_id=item_id, from_location_id=from_location_id, to_location_id=to_location_id,
+            quantity=quantity, note=note, created_at=now,
+        ))
+    db.add_all(journal)
+    # Level rows were changed with Core statements
+    coherence.invalidate(db, "stock")
+    return journal
+
+
+def adjust(db: Session, item: StockItem, location_id: int, adjustment: float) -> StockLevel:
+    """Change the quantity held at one location, and the item's total with it (clamped at 0)"""
+    level = db.query(StockLevel).filter(
+        StockLevel.stock_item_id == item.id, StockLevel.location_id == location_id
+    ).first()
+    if level is None:
+        level = StockLevel(stock_item_id=item.id, location_id=location_id, quantity=0)
+        db.add(level)
+    old = level.quantity or 0
+    level.quantity = max(old + adjustment, 0)
+    item.quantity = (item.quantity or 0) + level.quantity - old
+    item.updated_at = datetime.utcnow()
+    return level
+
+
+def set_threshold(db: Session, item_id: int, location_id: int, min_threshold: Optional[float]) -> StockLevel:
+    level = db.query(StockLevel).filter(
+        StockLevel.stock_item_id == item_id, StockLevel.location_id == location_id
+    ).first()
+    if level is None:
+        level = StockLevel(stock_item_id=item_id, location_id=location_id, quantity=0)
+        db.add(level)
+    level.min_threshold = min_threshold
+    return level
+
+
+def rename(db: Session, location: Location, name: str):
+    """Change a location's name, and the copies on items kept there"""
+    name = _normalize(name)
+    clash = db.query(Location.id).filter(
+        func.lower(Location.name) == name.lower(), Location.id != location.id
+    ).first()
+    if clash:
+        raise ValueError(f"A location named {name} already exists")
+    location.name = name
+    items = StockItem.__table__
+    # Not an edit to the items: keep updated_at so archiving and sync ignore it
+    db.execute(
+        update(items).where(items.c.location_id == location.id)
+        .values(location=name, updated_at=items.c.updated_at)
+    )
+    coherence.invalidate(db, "stock")
+
+
+def deactivate(db: Session, location: Location):
+    on_hand = db.query(func.coalesce(func.sum(StockLevel.quantity), 0)).filter(
+        StockLevel.location_id == location.id
+    ).scalar()
+    if on_hand > EPSILON:
+        raise ValueError(f"{location.name} still holds stock; transfer it first")
+    location.active = False
+    db.commit()
+
+
+def item_levels(db: Session, item_id: int) -> List[dict]:
+    """Where an item is kept, one row per location"""
+    rows = db.query(StockLevel, Location.name).join(Location, Location.id == StockLevel.location_id).filter(
+        StockLevel.stock_item_id == item_id
+    ).order_by(Location.name)
+    return [_level_row(level, name) for level, name in rows]
+
+
+def _level_row(level: StockLevel, location: str) -> dict:
+    return {
+        "location_id": level.location_id,
+        "location": location,
+        "quantity": level.quantity,
+        "min_threshold": level.min_threshold,
+        "updated_at": level.updated_at,
+    }
+
+
+def loadout(db: Session, location_id: int, low_only: bool = False) -> List[dict]:
+    """What a location holds: one indexed range over its levels"""
+    query = db.query(
+        StockLevel.stock_item_id, StockItem.name, StockItem.barcode, StockItem.unit,
+        StockLevel.quantity, StockLevel.min_threshold,
+    ).join(StockItem, StockItem.id == StockLevel.stock_item_id).filter(StockLevel.location_id == location_id)
+    if low_only:
+        query = query.filter(LEVEL_IS_LOW)
+    else:
+        query = query.filter(StockLevel.quantity > 0)
+    return [
+        {
+            **row._asdict(),
+            "low": row.min_threshold is not None and row.quantity <= row.min_threshold,
+        }
+        for row in query.order_by(StockItem.name)
+    ]
+
+
+def by_location(db: Session) -> dict:
+    """On-hand items, units and value per location, and company-wide totals"""
+    value = StockLevel.quantity * func.coalesce(StockItem.price_per_unit, 0)
+    rows = db.query(
+        Location.id, Location.name, func.count(StockLevel.id), func.sum(StockLevel.quantity), func.sum(value),
+    ).join(StockLevel, StockLevel.location_id == Location.id).join(
+        StockItem, StockItem.id == StockLevel.stock_item_id
+    ).filter(StockLevel.quantity > 0).group_by(Location.id, Location.name).order_by(Location.name)
+    total = db.query(
+        func.count(StockItem.id), func.coalesce(func.sum(StockItem.quantity), 0),
+        func.coalesce(func.sum(func.coalesce(StockItem.quantity, 0) * func.coalesce(StockItem.price_per_unit, 0)), 0),
+    ).filter(StockItem.quantity > 0).one()
+    return {
+        "locations": [
+            {"location_id": location_id, "location": name, "items": items,
+             "units": units or 0, "value": round(amount or 0, 2)}
+            for location_id, name, items, units, amount in rows
+        ],
+        "total": {"items": total[0], "units": total[1], "value": round(total[2], 2)},
+    }
@@ -0,0 +1,250 @@
+import heapq
+import json
+import re
+from datetime import datetime, timezone
+from itertools import islice
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+from dateutil.rrule import rrule, rrulestr, DAILY
+from sqlalchemy import DateTime, or_
+from sqlalchemy.orm import Query, Session
+from app.database import Task, Appointment, RecurrenceException
+
+# Finding the last occurrence of a COUNT rule means walking it
+MAX_COUNT = 5000
+
+_UNTIL_UTC = re.compile(r"(UNTIL=\d{8}(?:T\d{6})?)Z", re.IGNORECASE)
+
+
+class SeriesKind:
+    """How a model stores recurring series: the anchor column and optional end column"""
+
+    def __init__(self, entity: str, model, anchor: str, end: Optional[str] = None):
+        self.entity = entity
+        self.model = model
+        self.anchor = anchor
+        self.end = end
+        self.datetime_fields = {
+            column.key for column in model.__table__.columns if isinstance(column.type, DateTime)
+        }
+
+
+TASKS = SeriesKind("task", Task, "due_date")
+APPOINTMENTS = SeriesKind("appointment", Appointment, "start_time", "end_time")
+
+
+def naive_utc(value: datetime) -> datetime:
+    if value.tzinfo is not None:
+        return value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+def naive_utc_or_none(value: Optional[datetime]) -> Optional[datetime]:
+    """Query bounds may be omitted; stored datetimes are naive UTC"""
+    return naive_utc(value) if value is not None else None
+
+
+def normalize_rule(rule: str) -> str:
+    rule = rule.strip()
+    if rule.upper().startswith("RRULE:"):
+        rule = rule[6:]
+    # Datetimes are stored as naive UTC, so UTC UNTIL values drop their marker
+    return _UNTIL_UTC.sub(r"\1", rule)
+
+
+def parse_rule(rule: str, dtstart: datetime) -> rrule:
+    """Parse a single RRULE anchored on `dtstart`; raises ValueError when invalid"""
+    rule = normalize_rule(rule)
+    if "\n" in rule or "DTSTART" in rule.upper():
+        raise ValueError("Only a single RRULE is supported; use occurrence exceptions instead of EXDATE")
+    try:
+        parsed = rrulestr(rule, dtstart=naive_utc(dtstart))
+    except (ValueError, TypeError) as e:
+        raise ValueError(f"Invalid recurrence rule: {e}")
+    if parsed._freq > DAILY:
+        raise ValueError("Recurrence rules must repeat at most daily")
+    if parsed._count and parsed._count > MAX_COUNT:
+        raise ValueError(f"Recurrence COUNT cannot exceed {MAX_COUNT}")
+    return parsed
+
+
+def apply_rule(obj, kind: SeriesKind):
+    """Validate obj.recurrence_rule and store the series end used by range queries"""
+    if not obj.recurrence_rule:
+        obj.recurrence_rule = None
+        obj.recurrence_until = None
+        return
+    anchor = getattr(obj, kind.anchor)
+    if anchor is None:
+        raise ValueError(f"A recurring {kind.entity} needs a {kind.anchor}")
+    parsed = parse_rule(obj.recurrence_rule, anchor)
+    obj.recurrence_rule = normalize_rule(obj.recurrence_rule)
+    if parsed._count:
+        obj.recurrence_until = parsed[-1]
+    else:
+        # UNTIL bounds the last occurrence; None means the series never ends
+        obj.recurrence_until = parsed._until
+
+
+def series_in_window(db: Session, kind: SeriesKind, start: Optional[datetime], end: datetime) -> list:
+    """Series that may have occurrences in [start, end], without expanding them"""
+    start, end = naive_utc_or_none(start), naive_utc(end)
+    model = kind.model
+    query = db.query(model).filter(
+        model.recurrence_rule.isnot(None),
+        getattr(model, kind.anchor) <= end,
+    )
+    if start is not None:
+        query = query.filter(or_(model.recurrence_until.is_(None), model.recurrence_until >= start))
+    return query.all()
+
+
+def load_exceptions(db: Session, kind: SeriesKind, series_ids: List[int]) -> Dict[int, Dict[datetime, RecurrenceException]]:
+    exceptions: Dict[int, Dict[datetime, RecurrenceException]] = {}
+    if not series_ids:
+        return exceptions
+    for exception in db.query(RecurrenceException).filter(
+        RecurrenceException.entity == kind.entity,
+        RecurrenceException.series_id.in_(series_ids),
+    ):
+        exceptions.setdefault(exception.series_id, {})[exception.occurrence_start] = exception
+    return exceptions
+
+
+def decode_overrides(kind: SeriesKind, exception: Optional[RecurrenceException]) -> dict:
+    if exception is None or not exception.overrides:
+        return {}
+    overrides = json.loads(exception.overrides)
+    for key, value in overrides.items():
+        if key in kind.datetime_fields and isinstance(value, str):
+            # Overrides stored before they were normalized may carry an offset
+            overrides[key] = naive_utc(datetime.fromisoformat(value))
+    return overrides
+
+
+def row_dict(obj) -> dict:
+    values = {column.key: getattr(obj, column.key) for column in obj.__table__.columns}
+    values["occurrence_start"] = None
+    return values
+
+
+def occurrence(obj, kind: SeriesKind, start: datetime, overrides: Optional[dict] = None) -> dict:
+    """One occurrence of a series, shifted to `start` with its exception applied.
+
+    An override that only moves the anchor keeps the series duration.
+    """
+    overrides = overrides or {}
+    values = row_dict(obj)
+    anchor = getattr(obj, kind.anchor)
+    values[kind.anchor] = start
+    if kind.end and getattr(obj, kind.end) is not None:
+        moved_start = overrides.get(kind.anchor, start)
+        values[kind.end] = moved_start + (getattr(obj, kind.end) - anchor)
+    values["occurrence_start"] = start
+    values.update(overrides)
+    return values
+
+
+def _series_occurrences(obj, kind: SeriesKind, exceptions: Dict[datetime, RecurrenceException],
+                        start: Optional[datetime], end: datetime,
+                        matches: Callable[[dict], bool]) -> Iterator[Tuple[datetime, dict]]:
+    rule = parse_rule(obj.recurrence_rule, getattr(obj, kind.anchor))
+    for start_time in rule.xafter(start or getattr(obj, kind.anchor), inc=True):
+        if start_time > end:
+            return
+        exception = exceptions.get(start_time)
+        overrides = decode_overrides(kind, exception)
+        if exception is not None and (exception.cancelled or kind.anchor in overrides):
+            # Moved occurrences are emitted at their new time by _moved_occurrences
+            continue
+        values = occurrence(obj, kind, start_time, overrides)
+        if matches(values):
+            yield start_time, values
+
+
+def _moved_occurrences(series: list, kind: SeriesKind, exceptions, start: Optional[datetime],
+                       end: datetime, matches: Callable[[dict], bool]) -> List[Tuple[datetime, dict]]:
+    moved = []
+    for obj in series:
+        for original, exception in exceptions.get(obj.id, {}).items():
+            overrides = decode_overrides(kind, exception)
+            new_start = overrides.get(kind.anchor)
+            if exception.cancelled or new_start is None:
+                continue
+            if (start is None or new_start >= start) and new_start <= end:
+                values = occurrence(obj, kind, original, overrides)
+                if matches(values):
+                    moved.append((new_start, values))
+    return sorted(moved, key=lambda pair: pair[0])
+
+
+def expand(db: Session, kind: SeriesKind, plain_query: Query, series: list,
+           start: Optional[datetime], end: datetime, skip: int = 0, limit: Optional[int] = None,
+           matches: Callable[[dict], bool] = lambda values: True, entity=None) -> List[dict]:
+    """Merge one-off rows with series occurrences in [start, end], ordered by anchor.
+
+    `plain_query` must already be filtered to the window and ordered by
+    the anchor. Occurrences are generated lazily and only until
+    skip + limit items are produced, so open-ended series never
+    materialize beyond the page requested. `entity` is the (aliased)
+    entity `plain_query` selects when it spans archived rows.
+    """
+    start, end = naive_utc_or_none(start), naive_utc(end)
+    entity = entity if entity is not None else kind.model
+    anchor = kind.anchor
+    plain_query = plain_query.filter(entity.recurrence_rule.is_(None))
+    if limit is not None:
+        plain_query = plain_query.limit(skip + limit)
+    plain = ((getattr(row, anchor), row_dict(row)) for row in plain_query)
+
+    exceptions = load_exceptions(db, kind, [obj.id for obj in series])
+    sources = [plain, _moved_occurrences(series, kind, exceptions, start, end, matches)]
+    sources += [
+        _series_occurrences(obj, kind, exceptions.get(obj.id, {}), start, end, matches)
+        for obj in series
+    ]
+    merged = (values for _, values in heapq.merge(*sources, key=lambda pair: pair[0]))
+    return list(islice(merged, skip, skip + limit if limit is not None else None))
+
+
+def is_occurrence(obj, kind: SeriesKind, start: datetime) -> bool:
+    rule = parse_rule(obj.recurrence_rule, getattr(obj, kind.anchor))
+    return rule.after(start, inc=True) == start
+
+
+def set_exception(db: Session, kind: SeriesKind, obj, start: datetime,
+                  overrides: Optional[dict] = None, cancelled: bool = False) -> dict:
+    """Override or cancel one occurrence; returns the resulting occurrence"""
+    if not obj.recurrence_rule:
+        raise ValueError(f"This {kind.entity} does not recur")
+    start = naive_utc(start)
+    if not is_occurrence(obj, kind, start):
+        raise ValueError(f"{start.isoformat()} is not an occurrence of this {kind.entity}")
+
+    exception = db.query(RecurrenceException).filter(
+        RecurrenceException.entity == kind.entity,
+        RecurrenceException.series_id == obj.id,
+        RecurrenceException.occurrence_start == start,
+    ).first()
+    if exception is None:
+        exception = RecurrenceException(entity=kind.entity, series_id=obj.id, occurrence_start=start)
+        db.add(exception)
+
+    merged = decode_overrides(kind, exception)
+    # Stored as naive UTC like every other datetime, so windows can compare them
+    merged.update({
+        key: naive_utc(value) if isinstance(value, datetime) else value
+        for key, value in (overrides or {}).items()
+    })
+    exception.overrides = json.dumps(
+        {key: value.isoformat() if isinstance(value, datetime) else value for key, value in merged.items()}
+    )
+    exception.cancelled = cancelled
+    db.commit()
+    return occurrence(obj, kind, start, decode_overrides(kind, exception))
+
+
+def delete_exceptions(db: Session, kind: SeriesKind, series_id: int):
+    db.query(RecurrenceException).filter(
+        RecurrenceException.entity == kind.entity,
+        RecurrenceException.series_id == series_id,
+    ).delete(synchronize_session=False)
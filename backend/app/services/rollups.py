@@ -0,0 +1,416 @@
+import logging
+import os
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+from sqlalchemy import event, func, delete
+from sqlalchemy.orm import Session, attributes
+from app.database import (
+    Task, StockItem, Appointment, MetricRollup, TaskArchive, AppointmentArchive, dialect_insert
+)
+from app.services import recurrence
+
+logger = logging.getLogger("safe_hdf.rollups")
+
+GRANULARITIES = ("day", "week")
+
+# metric -> kind; counters are summed per bucket, gauges hold the level at bucket end
+METRICS = {
+    "tasks_created": "counter",
+    "tasks_closed": "counter",
+    "appointments": "counter",
+    "inventory_value": "gauge",
+}
+
+UNCATEGORIZED = "Non catégorisé"
+DAY_RETENTION_DAYS = 730
+# Nightly compaction only rebuilds counters over the last N days (full=True rebuilds everything)
+ROLLUP_REBUILD_DAYS = int(os.getenv("ROLLUP_REBUILD_DAYS", "35"))
+# Upper bound on the number of buckets a single trend request may return
+MAX_TREND_BUCKETS = int(os.getenv("MAX_TREND_BUCKETS", "1000"))
+
+
+def bucket_start(value: datetime, granularity: str) -> datetime:
+    day = datetime(value.year, value.month, value.day)
+    if granularity == "week":
+        return day - timedelta(days=day.weekday())
+    if granularity == "month":
+        return day.replace(day=1)
+    return day
+
+
+def _previous(obj, attr: str):
+    history = attributes.get_history(obj, attr)
+    if history.deleted:
+        return history.deleted[0]
+    if history.unchanged:
+        return history.unchanged[0]
+    return None
+
+
+def _changed(obj, attr: str) -> bool:
+    return attributes.get_history(obj, attr).has_changes()
+
+
+def _stock_value(quantity, price) -> float:
+    return (quantity or 0) * (price or 0)
+
+
+class RollupRecorder:
+    """Collects metric deltas from a session's flushes and upserts them into day/week buckets"""
+
+    def __init__(self):
+        self.counters: Dict[Tuple[str, datetime, str], float] = defaultdict(float)
+        self.gauges: Dict[Tuple[str, datetime, str], float] = defaultdict(float)
+
+    def count(self, metric: str, when: Optional[datetime], delta: float = 1, dimension: str = ""):
+        if when is not None and delta:
+            self.counters[(metric, when, dimension)] += delta
+
+    def shift(self, metric: str, when: datetime, delta: float, dimension: str = ""):
+        if delta:
+            self.gauges[(metric, when, dimension)] += delta
+
+    def collect(self, session: Session):
+        now = datetime.utcnow()
+        for obj in session.new:
+            if isinstance(obj, Task):
+                self.count("tasks_created", obj.created_at or now)
+                if obj.status == "done":
+                    self.count("tasks_closed", now)
+            elif isinstance(obj, Appointment):
+                self.count("appointments", obj.start_time)
+            elif isinstance(obj, StockItem):
+                self.shift("inventory_value", now, _stock_value(obj.quantity, obj.price_per_unit),
+                           obj.category or UNCATEGORIZED)
+
+        for obj in session.dirty:
+            if isinstance(obj, Task) and _changed(obj, "status"):
+                if obj.status == "done" and _previous(obj, "status") != "done":
+                    self.count("tasks_closed", now)
+            elif isinstance(obj, Appointment) and _changed(obj, "start_time"):
+                self.count("appointments", _previous(obj, "start_time"), -1)
+                self.count("appointments", obj.start_time)
+            elif isinstance(obj, StockItem) and any(
+                _changed(obj, attr) for attr in ("quantity", "price_per_unit", "category")
+            ):
+                old_value = _stock_value(_previous(obj, "quantity"), _previous(obj, "price_per_unit"))
+                self.shift("inventory_value", now, -old_value, _previous(obj, "category") or UNCATEGORIZED)
+                self.shift("inventory_value", now, _stock_value(obj.quantity, obj.price_per_unit),
+                           obj.category or UNCATEGORIZED)
+
+        for obj in session.deleted:
+            if isinstance(obj, Appointment):
+                self.count("appointments", _previous(obj, "start_time"), -1)
+            elif isinstance(obj, StockItem):
+                old_value = _stock_value(_previous(obj, "quantity"), _previous(obj, "price_per_unit"))
+                self.shift("inventory_value", now, -old_value, _previous(obj, "category") or UNCATEGORIZED)
+
+    def write(self, connection):
+        if not self.counters and not self.gauges:
+            return
+        insert = dialect_insert(connection)
+        table = MetricRollup.__table__
+        now = datetime.utcnow()
+        for granularity in GRANULARITIES:
+            # One upsert per bucket, however many flushes touched it
+            counters: Dict[Tuple[str, datetime, str], float] = defaultdict(float)
+            for (metric, when, dimension), delta in self.counters.items():
+                counters[(metric, bucket_start(when, granularity), dimension)] += delta
+            gauges: Dict[Tuple[str, datetime, str], float] = defaultdict(float)
+            for (metric, when, dimension), delta in self.gauges.items():
+                gauges[(metric, bucket_start(when, granularity), dimension)] += delta
+            # Sorted so concurrent writers lock shared buckets in the same order
+            for (metric, bucket, dimension), delta in sorted(counters.items()):
+                if delta:
+                    _upsert_delta(connection, insert, table, metric, granularity,
+                                  bucket, dimension, delta, delta, now)
+            for (metric, bucket, dimension), delta in sorted(gauges.items()):
+                if delta:
+                    level = _level_before(connection, metric, granularity, bucket, dimension)
+                    _upsert_delta(connection, insert, table, metric, granularity,
+                                  bucket, dimension, level + delta, delta, now)
+
+
+def _upsert_delta(connection, insert, table, metric, granularity, bucket, dimension,
+                  initial: float, delta: float, now: datetime):
+    stmt = insert(table).values(
+        metric=metric, granularity=granularity, bucket_start=bucket,
+        dimension=dimension, value=initial, updated_at=now,
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["metric", "granularity", "bucket_start", "dimension"],
+        set_={"value": table.c.value + delta, "updated_at": now},
+    )
+    connection.execute(stmt)
+
+
+def _level_before(connection, metric: str, granularity: str, bucket: datetime, dimension: str) -> float:
+    table = MetricRollup.__table__
+    value = connection.execute(
+        table.select().with_only_columns(table.c.value).where(
+            table.c.metric == metric,
+            table.c.granularity == granularity,
+            table.c.dimension == dimension,
+            table.c.bucket_start < bucket,
+        ).order_by(table.c.bucket_start.desc()).limit(1)
+    ).scalar()
+    return value or 0
+
+
+def _after_flush(session: Session, flush_context):
+    # Only noted here: upserting the shared buckets inside the writer's
+    # transaction would hold today's rows locked until it commits
+    recorder = session.info.setdefault("rollup_recorder", RollupRecorder())
+    recorder.collect(session)
+
+
+def _after_commit(session: Session):
+    recorder = session.info.pop("rollup_recorder", None)
+    if recorder is None:
+        return
+    # The data is already committed; a lost delta is corrected by the nightly
+    # compaction (counters) and the next inventory refresh (gauges)
+    try:
+        with session.get_bind().begin() as connection:
+            recorder.write(connection)
+    except Exception:
+        logger.exception("Could not update metric rollups")
+
+
+def _after_rollback(session: Session):
+    session.info.pop("rollup_recorder", None)
+
+
+def install(session_factory):
+    """Maintain rollups incrementally on every commit of sessions from this factory"""
+    if not event.contains(session_factory, "after_flush", _after_flush):
+        event.listen(session_factory, "after_flush", _after_flush)
+        event.listen(session_factory, "after_commit", _after_commit)
+        event.listen(session_factory, "after_rollback", _after_rollback)
+
+
+def _set_bucket(db: Session, metric: str, granularity: str, bucket: datetime, dimension: str, value: float):
+    connection = db.connection()
+    insert = dialect_insert(connection)
+    table = MetricRollup.__table__
+    now = datetime.utcnow()
+    stmt = insert(table).values(
+        metric=metric, granularity=granularity, bucket_start=bucket,
+        dimension=dimension, value=value, updated_at=now,
+    ).on_conflict_do_update(
+        index_elements=["metric", "granularity", "bucket_start", "dimension"],
+        set_={"value": value, "updated_at": now},
+    )
+    connection.execute(stmt)
+
+
+def refresh_inventory_levels(db: Session):
+    """Reset today's inventory_value buckets to the exact level from stock_items.
+
+    Used after bulk writes that bypass the ORM (e.g. stock import).
+    """
+    now = datetime.utcnow()
+    levels = {
+        category or UNCATEGORIZED: value or 0
+        for category, value in db.query(
+            StockItem.category,
+            func.sum(func.coalesce(StockItem.quantity, 0) * func.coalesce(StockItem.price_per_unit, 0)),
+        ).group_by(StockItem.category)
+    }
+    # Categories that emptied out drop to zero instead of carrying their last level
+    known = {
+        dimension for (dimension,) in db.query(MetricRollup.dimension).filter(
+            MetricRollup.metric == "inventory_value"
+        ).distinct()
+    }
+    for dimension in known - set(levels):
+        levels[dimension] = 0
+    for granularity in GRANULARITIES:
+        bucket = bucket_start(now, granularity)
+        for dimension, value in levels.items():
+            _set_bucket(db, "inventory_value", granularity, bucket, dimension, value)
+    db.commit()
+
+
+def _rebuild_counter(db: Session, metric: str, sources, since: Optional[datetime] = None):
+    """Rebuild a counter from (column, filters) sources, e.g. a hot and an archive table.
+
+    With `since` (a week start) only the buckets from then on are replaced.
+    """
+    queries = []
+    for column, filters in sources:
+        if since is not None:
+            filters = [*filters, column >= since]
+        queries.append(db.query(column).filter(column.isnot(None), *filters))
+    for granularity in GRANULARITIES:
+        counts: Dict[datetime, int] = defaultdict(int)
+        for query in queries:
+            for (value,) in query.yield_per(5000):
+                counts[bucket_start(value, granularity)] += 1
+        stale = [MetricRollup.metric == metric, MetricRollup.granularity == granularity]
+        if since is not None:
+            stale.append(MetricRollup.bucket_start >= since)
+        db.execute(delete(MetricRollup).where(*stale))
+        for bucket, count in counts.items():
+            _set_bucket(db, metric, granularity, bucket, "", count)
+
+
+def compact(db: Session, full: bool = False) -> dict:
+    """Nightly compaction: recompute recent buckets from source rows and prune old day buckets.
+
+    Counters that can be derived from source columns are rebuilt over the
+    last ROLLUP_REBUILD_DAYS to correct any drift; older buckets are left as
+    they are unless `full` is set. `tasks_closed` has no close timestamp, so
+    it is only rebuilt on a full rebuild, approximated by `updated_at` of
+    done tasks.
+    """
+    # Start on a week boundary so week buckets are rebuilt whole
+    since = None if full else bucket_start(datetime.utcnow() - timedelta(days=ROLLUP_REBUILD_DAYS), "week")
+    # Archived rows still count towards history
+    _rebuild_counter(db, "tasks_created", [(Task.created_at, []), (TaskArchive.c.created_at, [])], since)
+    _rebuild_counter(db, "appointments", [(Appointment.start_time, []), (AppointmentArchive.c.start_time, [])], since)
+    if full:
+        _rebuild_counter(db, "tasks_closed", [
+            (Task.updated_at, [Task.status == "done"]),
+            (TaskArchive.c.updated_at, [TaskArchive.c.status == "done"]),
+        ])
+    db.execute(delete(MetricRollup).where(
+        MetricRollup.granularity == "day",
+        MetricRollup.bucket_start < bucket_start(datetime.utcnow() - timedelta(days=DAY_RETENTION_DAYS), "day"),
+    ))
+    db.commit()
+    refresh_inventory_levels(db)
+    return {"message": "Rollups compacted", "full": full, "since": since}
+
+
+def ensure_baseline(db: Session):
+    """Build rollups from existing rows the first time the subsystem runs"""
+    if db.query(MetricRollup.id).first() is None:
+        compact(db, full=True)
+
+
+def trends(db: Session, metric: str, granularity: str,
+           from_date: Optional[datetime] = None, to_date: Optional[datetime] = None) -> dict:
+    """Serve a trend series straight from the buckets, zero- or forward-filled"""
+    if metric not in METRICS:
+        raise ValueError(f"Unknown metric {metric}. Available: {', '.join(METRICS)}")
+    if granularity not in ("day", "week", "month"):
+        raise ValueError("granularity must be day, week or month")
+
+    # Buckets are stored as naive UTC
+    from_date, to_date = recurrence.naive_utc_or_none(from_date), recurrence.naive_utc_or_none(to_date)
+    is_gauge = METRICS[metric] == "gauge"
+    to_date = to_date or datetime.utcnow()
+    if is_gauge:
+        # Levels are only known up to now
+        to_date = min(to_date, datetime.utcnow())
+    from_date = from_date or to_date - timedelta(days=365)
+    source = "day" if granularity == "month" else granularity
+    start, end = bucket_start(from_date, granularity), bucket_start(to_date, granularity)
+    if _bucket_count(start, end, granularity) > MAX_TREND_BUCKETS:
+        raise ValueError(
+            f"Range too large: at most {MAX_TREND_BUCKETS} {granularity} buckets per request, "
+            "narrow from_date/to_date or use a coarser granularity"
+        )
+
+    rows = db.query(MetricRollup.bucket_start, MetricRollup.dimension, MetricRollup.value).filter(
+        MetricRollup.metric == metric,
+        MetricRollup.granularity == source,
+        MetricRollup.bucket_start >= start,
+        MetricRollup.bucket_start <= to_date,
+    ).order_by(MetricRollup.bucket_start).all()
+
+    series: Dict[str, Dict[datetime, float]] = defaultdict(dict)
+    for bucket, dimension, value in rows:
+        key = bucket_start(bucket, granularity)
+        if is_gauge:
+            series[dimension or "total"][key] = value  # last level in the bucket wins
+        else:
+            series[dimension or "total"][key] = series[dimension or "total"].get(key, 0) + value
+
+    carried: Dict[str, float] = {}
+    if is_gauge:
+        # Level at the start of the range, per dimension
+        latest = db.query(
+            MetricRollup.dimension, func.max(MetricRollup.bucket_start).label("bucket_start")
+        ).filter(
+            MetricRollup.metric == metric,
+            MetricRollup.granularity == source,
+            MetricRollup.bucket_start < start,
+        ).group_by(MetricRollup.dimension).subquery()
+        for dimension, value in db.query(MetricRollup.dimension, MetricRollup.value).join(
+            latest,
+            (MetricRollup.dimension == latest.c.dimension)
+            & (MetricRollup.bucket_start == latest.c.bucket_start),
+        ).filter(MetricRollup.metric == metric, MetricRollup.granularity == source):
+            carried[dimension or "total"] = value
+
+    buckets = _bucket_range(start, end, granularity)
+    result = {}
+    for dimension in sorted(set(series) | set(carried)):
+        points, level = [], carried.get(dimension, 0)
+        for bucket in buckets:
+            if bucket in series[dimension]:
+                level = series[dimension][bucket]
+                value = level
+            else:
+                value = level if is_gauge else 0
+            points.append({"bucket": bucket, "value": value})
+        result[dimension] = points
+
+    return {"metric": metric, "granularity": granularity, "series": result}
+
+
+def _bucket_count(start: datetime, end: datetime, granularity: str) -> int:
+    if end < start:
+        return 0
+    if granularity == "day":
+        return (end - start).days + 1
+    if granularity == "week":
+        return (end - start).days // 7 + 1
+    return (end.year - start.year) * 12 + end.month - start.month + 1
+
+
+def _bucket_range(start: datetime, end: datetime, granularity: str) -> List[datetime]:
+    buckets, current = [], start
+    while current <= end:
+        buckets.append(current)
+        if granularity == "day":
+            current += timedelta(days=1)
+        elif granularity == "week":
+            current += timedelta(days=7)
+        else:
+            current = (current + timedelta(days=32)).replace(day=1)
+    return buckets
+
+
+def _seconds_until(hour: int) -> float:
+    now = datetime.utcnow()
+    next_run = now.replace(hour=hour, minute=0, second=0, microsecond=0)
+    if next_run <= now:
+        next_run += timedelta(days=1)
+    return (next_run - now).total_seconds()
+
+
+async def run_nightly(session_factory, hour: int):
+    """Background loop running compaction every day at `hour` (UTC)"""
+    import asyncio
+    from starlette.concurrency import run_in_threadpool
+    from app.services import coherence
+
+    def _compact():
+        db = session_factory()
+        try:
+            # With several workers, only the first to claim tonight's run compacts
+            if coherence.claim(db, "rollup_compaction", datetime.utcnow().date().isoformat()):
+                compact(db)
+        finally:
+            db.close()
+
+    while True:
+        await asyncio.sleep(_seconds_until(hour))
+        try:
+            await run_in_threadpool(_compact)
+        except Exception as e:
+            print(f"Rollup compaction failed: {e}")
@@ -0,0 +1,117 @@
+import json
+import os
+from datetime import date, datetime
+from itertools import islice
+from typing import Dict, Iterable, List, Optional, Sequence, Type
+from fastapi.responses import Response
+from pydantic import BaseModel
+from sqlalchemy import literal
+from sqlalchemy.orm import Query
+
+try:
+    import orjson
+except ImportError:  # orjson is optional, fall back to the stdlib encoder
+    orjson = None
+
+# Opt-in: list endpoints skip per-row Pydantic validation when enabled
+FAST_SERIALIZATION = os.getenv("FAST_SERIALIZATION", "false").lower() in ("1", "true", "yes")
+
+MAX_PROJECTIONS = 128
+# Rows fetched per round trip on large reads
+STREAM_CHUNK = 1000
+
+
+def _default(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def dumps(content) -> bytes:
+    """Encode content to JSON bytes, using orjson when it is installed"""
+    if orjson is not None:
+        return orjson.dumps(content)
+    return json.dumps(content, default=_default, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def stream(query: Query, chunk: int = STREAM_CHUNK) -> Query:
+    """Fetch a large read at most `chunk` rows at a time through a server-side cursor
+    on PostgreSQL, instead of the driver buffering the whole result first.
+
+    max_row_buffer rather than yield_per: ORM yield_per refuses the legacy
+    Query.all() the list endpoints return.
+    """
+    return query.execution_options(stream_results=True, max_row_buffer=chunk)
+
+
+class RowSerializer:
+    """Pre-built serializer mapping a response schema onto ORM columns.
+
+    Selects only the schema's columns as plain tuples and encodes them
+    directly, producing the same JSON the schema would but without
+    building a Pydantic model per row.
+    """
+
+    def __init__(self, schema: Type[BaseModel], model, fields: Optional[List[str]] = None):
+        self.schema = schema
+        self.model = model
+        self.fields: List[str] = fields or list(schema.model_fields)
+        # Schema-only fields (e.g. occurrence_start) are selected as NULL
+        self.columns = [
+            getattr(model, name) if hasattr(model, name) else literal(None).label(name)
+            for name in self.fields
+        ]
+        self._projections: Dict[tuple, "RowSerializer"] = {}
+
+    def project(self, fields: Optional[str]) -> "RowSerializer":
+        """Serializer restricted to a comma-separated sparse fieldset.
+
+        `id` is always included; fields keep the schema's order.
+        """
+        if not fields:
+            return self
+        requested = {name.strip() for name in fields.split(",") if name.strip()}
+        unknown = requested - set(self.fields)
+        if unknown:
+            raise ValueError(f"Unknown fields: {', '.join(sorted(unknown))}")
+        requested.add("id")
+        key = tuple(name for name in self.fields if name in requested)
+        serializer = self._projections.get(key)
+        if serializer is None:
+            serializer = RowSerializer(self.schema, self.model, list(key))
+            if len(self._projections) < MAX_PROJECTIONS:
+                self._projections[key] = serializer
+        return serializer
+
+    def to_dicts(self, rows: Iterable[Sequence]) -> List[dict]:
+        fields = self.fields
+        return [dict(zip(fields, row)) for row in rows]
+
+    def encode(self, rows: Iterable[Sequence]) -> bytes:
+        """Encode `chunk` rows at a time, so only one chunk of rows and dicts is held besides the body"""
+        rows = iter(rows)
+        parts = []
+        while True:
+            chunk = self.to_dicts(islice(rows, STREAM_CHUNK))
+            if not chunk:
+                break
+            parts.append(dumps(chunk)[1:-1])
+        return b"[" + b",".join(parts) + b"]"
+
+    def dicts_response(self, items: Iterable[dict]) -> Response:
+        fields = self.fields
+        content = dumps([{name: item.get(name) for name in fields} for item in items])
+        return Response(content=content, media_type="application/json")
+
+    def response(self, query: Query, entity=None) -> Response:
+        """Encode the query's rows; `entity` replaces the model for aliased queries"""
+        columns = self.columns
+        if entity is not None:
+            columns = [
+                getattr(entity, name) if hasattr(self.model, name) else literal(None).label(name)
+                for name in self.fields
+            ]
+        # Rows are streamed from the database, but the body is built whole:
+        # CacheControlMiddleware hashes complete bodies for its ETag
+        rows = stream(query.with_entities(*columns))
+        return Response(content=self.encode(rows), media_type="application/json")
@@ -0,0 +1,332 @@
+import csv
+import io
+import logging
+import unicodedata
+import zipfile
+import xml.etree.ElementTree as ET
+from datetime import datetime
+from typing import BinaryIO, Dict, Iterator, List, Optional, Tuple
+from sqlalchemy import select, insert, update
+from sqlalchemy.orm import Session
+from app.database import StockItem
+from app.services import alerts, inventory
+
+logger = logging.getLogger("safe_hdf.stock_import")
+
+BATCH_SIZE = 1000
+MAX_REPORTED_ERRORS = 1000
+
+# Header aliases (normalized: lowercase, no accents, single spaces)
+COLUMN_ALIASES = {
+    "name": ["name", "nom", "designation", "article", "libelle"],
+    "barcode": ["barcode", "reference", "ref", "code", "code barre", "code barres", "ean", "sku"],
+    "quantity": ["quantity", "quantite", "qty", "qte", "stock"],
+    "min_threshold": ["min threshold", "seuil", "seuil alerte", "seuil d'alerte", "minimum"],
+    "unit": ["unit", "unite"],
+    "location": ["location", "emplacement"],
+    "category": ["category", "categorie", "famille"],
+    "supplier": ["supplier", "fournisseur"],
+    "price_per_unit": ["price per unit", "price", "prix", "prix unitaire", "pu"],
+    "description": ["description"],
+}
+
+FLOAT_FIELDS = {"quantity", "min_threshold", "price_per_unit"}
+
+XLSX_NS = "{http://schemas.openxmlformats.org/spreadsheetml/2006/main}"
+XLSX_REL_NS = "{http://schemas.openxmlformats.org/officeDocument/2006/relationships}"
+XLSX_PKG_REL_NS = "{http://schemas.openxmlformats.org/package/2006/relationships}"
+
+
+def _normalize_header(header: str) -> str:
+    header = unicodedata.normalize("NFKD", header or "")
+    header = "".join(c for c in header if not unicodedata.combining(c))
+    for sep in ("_", "-", "/", "."):
+        header = header.replace(sep, " ")
+    return " ".join(header.lower().split())
+
+
+_ALIAS_LOOKUP = {
+    alias: field
+    for field, aliases in COLUMN_ALIASES.items()
+    for alias in aliases
+}
+
+
+def map_headers(headers: List[str]) -> Dict[int, str]:
+    """Map column positions to StockItem fields, ignoring unknown headers"""
+    mapping = {}
+    for index, header in enumerate(headers):
+        field = _ALIAS_LOOKUP.get(_normalize_header(header))
+        if field and field not in mapping.values():
+            mapping[index] = field
+    return mapping
+
+
+def iter_csv_rows(stream: BinaryIO) -> Iterator[List[str]]:
+    """Yield CSV rows one at a time, sniffing the delimiter from the first line"""
+    text = io.TextIOWrapper(stream, encoding="utf-8-sig", errors="replace", newline="")
+    first_line = text.readline()
+    delimiter = max([",", ";", "\t"], key=first_line.count)
+    yield from csv.reader(
+        _chain_first_line(first_line, text), delimiter=delimiter
+    )
+
+
+def _chain_first_line(first_line: str, text: io.TextIOWrapper) -> Iterator[str]:
+    yield first_line
+    yield from text
+
+
+def _column_index(cell_ref: str) -> int:
+    index = 0
+    for char in cell_ref:
+        if not char.isalpha():
+            break
+        index = index * 26 + (ord(char.upper()) - ord("A") + 1)
+    return index - 1
+
+
+def _first_sheet_path(archive: zipfile.ZipFile) -> str:
+    try:
+        workbook = ET.fromstring(archive.read("xl/workbook.xml"))
+        rels = ET.fromstring(archive.read("xl/_rels/workbook.xml.rels"))
+        sheet = workbook.find(f"{XLSX_NS}sheets/{XLSX_NS}sheet")
+        rel_id = sheet.get(f"{XLSX_REL_NS}id")
+        for rel in rels.iter(f"{XLSX_PKG_REL_NS}Relationship"):
+            if rel.get("Id") == rel_id:
+                target = rel.get("Target").lstrip("/")
+                return target if target.startswith("xl/") else f"xl/{target}"
+    except (KeyError, AttributeError, ET.ParseError):
+        pass
+    return "xl/worksheets/sheet1.xml"
+
+
+def _load_shared_strings(archive: zipfile.ZipFile) -> List[str]:
+    if "xl/sharedStrings.xml" not in archive.namelist():
+        return []
+    strings = []
+    with archive.open("xl/sharedStrings.xml") as f:
+        events = ET.iterparse(f, events=("start", "end"))
+        _, root = next(events)
+        for event, elem in events:
+            if event == "end" and elem.tag == f"{XLSX_NS}si":
+                strings.append("".join(t.text or "" for t in elem.iter(f"{XLSX_NS}t")))
+                # Detach the parsed entries, or the tree keeps one per string
+                root.clear()
+    return strings
+
+
+def iter_xlsx_rows(stream: BinaryIO) -> Iterator[List[str]]:
+    """Yield rows of the first worksheet, parsing the sheet XML incrementally"""
+    with zipfile.ZipFile(stream) as archive:
+        shared_strings = _load_shared_strings(archive)
+        with archive.open(_first_sheet_path(archive)) as sheet:
+            sheet_data = None
+            for event, elem in ET.iterparse(sheet, events=("start", "end")):
+                if event == "start":
+                    if elem.tag == f"{XLSX_NS}sheetData":
+                        sheet_data = elem
+                    continue
+                if elem.tag != f"{XLSX_NS}row":
+                    continue
+                row: List[str] = []
+                for cell in elem.iter(f"{XLSX_NS}c"):
+                    cell_type = cell.get("t")
+                    if cell_type == "inlineStr":
+                        value = "".join(t.text or "" for t in cell.iter(f"{XLSX_NS}t"))
+                    else:
+                        v = cell.find(f"{XLSX_NS}v")
+                        value = v.text or "" if v is not None else ""
+                        if cell_type == "s" and value:
+                            value = shared_strings[int(value)]
+                    index = _column_index(cell.get("r", "")) if cell.get("r") else len(row)
+                    row.extend([""] * (index - len(row) + 1))
+                    row[index] = value
+                yield row
+                # Clearing the row alone leaves it attached to <sheetData>, so
+                # memory would still grow with the row count
+                if sheet_data is not None:
+                    sheet_data.clear()
+                else:
+                    elem.clear()
+
+
+def _coerce_row(row: List[str], mapping: Dict[int, str]) -> dict:
+    values = {}
+    for index, field in mapping.items():
+        raw = row[index].strip() if index < len(row) and row[index] else ""
+        if field in FLOAT_FIELDS:
+            if not raw:
+                continue
+            try:
+                number = float(raw.replace(" ", "").replace(",", "."))
+            except ValueError:
+                raise ValueError(f"Invalid number for {field}: {raw!r}")
+            if number < 0:
+                raise ValueError(f"{field} must be >= 0")
+            values[field] = number
+        elif raw:
+            values[field] = raw
+    if len(values.get("name") or "") > 200:
+        raise ValueError("name must be at most 200 characters")
+    return values
+
+
+class StockImporter:
+    def __init__(self, db: Session, batch_size: int = BATCH_SIZE):
+        self.db = db
+        self.batch_size = batch_size
+        self.created = 0
+        self.updated = 0
+        self.total_rows = 0
+        self.error_count = 0
+        self.errors: List[dict] = []
+        # Ids of the items written, so follow-up work can skip the rest of the table
+        self.item_ids: List[int] = []
+        self.locations: Dict[str, tuple] = {}
+
+    def _add_error(self, row_number: int, message: str):
+        self.error_count += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({"row": row_number, "error": message})
+
+    def run(self, rows: Iterator[List[str]]) -> dict:
+        """Upsert stock items by barcode, committing one transaction per batch"""
+        header = next(rows, None)
+        if header is None:
+            raise ValueError("Empty file")
+        mapping = map_headers(header)
+        if "barcode" not in mapping.values():
+            raise ValueError("Missing barcode/reference column")
+
+        batch: Dict[str, Tuple[int, dict]] = {}
+        for row_number, row in enumerate(rows, start=2):
+            if not any(cell.strip() for cell in row if cell):
+                continue
+            self.total_rows += 1
+            try:
+                values = _coerce_row(row, mapping)
+            except ValueError as e:
+                self._add_error(row_number, str(e))
+                continue
+            barcode = values.get("barcode")
+            if not barcode:
+                self._add_error(row_number, "Missing barcode")
+                continue
+            # Later rows win when a barcode is repeated in the same batch
+            batch[barcode] = (row_number, values)
+            if len(batch) >= self.batch_size:
+                self._flush(batch)
+                batch = {}
+        if batch:
+            self._flush(batch)
+
+        return {
+            "message": "Stock imported",
+            "created": self.created,
+            "updated": self.updated,
+            "total_rows": self.total_rows,
+            "error_count": self.error_count,
+            "errors": self.errors,
+            "item_ids": self.item_ids,
+        }
+
+    def _flush(self, batch: Dict[str, Tuple[int, dict]]):
+        existing = {
+            row.barcode: row for row in self.db.execute(
+                select(StockItem.barcode, StockItem.id, StockItem.quantity, StockItem.min_threshold,
+                       StockItem.location_id)
+                .where(StockItem.barcode.in_(list(batch)))
+            )
+        }
+
+        now = datetime.utcnow()
+        inserts, updates = [], []
+        for barcode, (row_number, values) in batch.items():
+            # Blank cells are left out: they keep an existing item's value
+            if barcode in existing:
+                values["id"] = existing[barcode].id
+                values["updated_at"] = now
+                updates.append(values)
+            elif not values.get("name"):
+                self._add_error(row_number, "Missing name for new item")
+            else:
+                inserts.append({"created_at": now, "updated_at": now, **values})
+
+        try:
+            moves = self._link_locations(existing, inserts, updates)
+            new_ids = []
+            if inserts:
+                new_ids = self.db.execute(insert(StockItem).returning(StockItem.id), inserts).scalars().all()
+            if updates:
+                self.db.execute(update(StockItem), updates)
+            inventory.relocate(self.db.connection(), moves, self.locations)
+            if alerts.enabled():
+                self._enqueue_alerts(existing, inserts, updates)
+            self.db.commit()
+        except Exception:
+            self.db.rollback()
+            # Locations created in this batch were rolled back too
+            self.locations.clear()
+            # Database errors can carry SQL and parameters, keep them in the log
+            logger.exception("Stock import batch of %d rows failed", len(batch))
+            for row_number, _ in batch.values():
+                self._add_error(row_number, "Batch failed, its rows were not imported")
+            return
+        self.created += len(inserts)
+        self.updated += len(updates)
+        self.item_ids.extend(new_ids)
+        self.item_ids.extend(values["id"] for values in updates)
+
+    def _link_locations(self, existing: dict, inserts: List[dict], updates: List[dict]) -> List[tuple]:
+        """Resolve location names to ids; returns the (id, old, new) home changes of updated items"""
+        connection = self.db.connection()
+        for values in (*inserts, *updates):
+            if "location" in values:
+                values["location_id"], values["location"] = inventory.link(connection, values["location"], self.locations)
+        old_locations = {row.id: row.location_id for row in existing.values()}
+        return [
+            (values["id"], old_locations[values["id"]], values["location_id"])
+            for values in updates
+            if "location_id" in values and values["location_id"] != old_locations[values["id"]]
+        ]
+
+    def _enqueue_alerts(self, existing: dict, inserts: List[dict], updates: List[dict]):
+        """Bulk statements bypass ORM flush hooks, so detect threshold crossings here"""
+        rows = []
+        by_id = {row.id: row for row in existing.values()}
+        for values in updates:
+            old = by_id[values["id"]]
+            new_quantity = values.get("quantity", old.quantity)
+            new_threshold = values.get("min_threshold", old.min_threshold)
+            event_name = alerts.crossing(old.quantity, old.min_threshold, new_quantity, new_threshold)
+            if event_name:
+                rows.append(alerts.alert_row(values["id"], event_name, {
+                    **values, "quantity": new_quantity, "min_threshold": new_threshold,
+                }))
+
+        defaults = {"quantity": StockItem.quantity.default.arg,
+                    "min_threshold": StockItem.min_threshold.default.arg}
+        low_inserts = {
+            values["barcode"]: {**defaults, **values} for values in inserts
+            if alerts.crossing(None, None, values.get("quantity", defaults["quantity"]),
+                               values.get("min_threshold", defaults["min_threshold"]), is_new=True)
+        }
+        if low_inserts:
+            new_ids = self.db.execute(
+                select(StockItem.barcode, StockItem.id).where(StockItem.barcode.in_(list(low_inserts)))
+            )
+            for barcode, item_id in new_ids:
+                rows.append(alerts.alert_row(item_id, alerts.LOW_STOCK, low_inserts[barcode]))
+        alerts.enqueue(self.db.connection(), rows)
+
+
+def import_stock_file(db: Session, stream: BinaryIO, filename: Optional[str] = None) -> dict:
+    """Import a CSV or XLSX stock file, picking the parser from the file name"""
+    if filename and filename.lower().endswith((".xlsx", ".xlsm")):
+        try:
+            rows = iter_xlsx_rows(stream)
+            return StockImporter(db).run(rows)
+        except zipfile.BadZipFile:
+            raise ValueError("Invalid XLSX file")
+    return StockImporter(db).run(iter_csv_rows(stream))
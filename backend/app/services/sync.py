@@ -0,0 +1,251 @@
+from datetime import datetime, timezone
+from types import SimpleNamespace
+from typing import Dict, List, Optional, Set
+from pydantic import ValidationError
+from sqlalchemy.orm import Session
+from app.database import Task, StockItem, Appointment, SyncOperationLog
+from app.models import schemas
+from app.services import inventory, recurrence, technicians
+
+# entity -> (ORM model, create schema, update schema, response key)
+ENTITIES = {
+    "task": (Task, schemas.TaskCreate, schemas.TaskUpdate, "tasks"),
+    "stock_item": (StockItem, schemas.StockItemCreate, schemas.StockItemUpdate, "stock_items"),
+    "appointment": (Appointment, schemas.AppointmentCreate, schemas.AppointmentUpdate, "appointments"),
+}
+
+SERIES = {kind.model: kind for kind in (recurrence.TASKS, recurrence.APPOINTMENTS)}
+
+
+class SyncError(Exception):
+    """Operation-level failure, recorded in the result instead of aborting the batch"""
+
+    def __init__(self, message: str, status: str = "error"):
+        super().__init__(message)
+        self.status = status
+
+
+def _to_utc_naive(value: datetime) -> datetime:
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+class SyncService:
+    """Replays client mutation logs idempotently, in order, in one transaction.
+
+    Each operation's outcome is stored under its client `op_id`, so
+    replaying a batch after a lost response returns the stored outcome
+    instead of applying the mutation twice. Conflicts are resolved
+    last-writer-wins against the row's `updated_at`.
+    """
+
+    def __init__(self, db: Session):
+        self.db = db
+        self.affected: Dict[str, Set[int]] = {entity: set() for entity in ENTITIES}
+        self.deleted: Dict[str, Set[int]] = {entity: set() for entity in ENTITIES}
+        self.created_refs: Dict[str, int] = {}
+
+    def push(self, operations: List[schemas.SyncOperation]) -> dict:
+        now = datetime.utcnow()
+        op_ids = [op.op_id for op in operations]
+        seen = {
+            log.op_id: log
+            for log in self.db.query(SyncOperationLog).filter(SyncOperationLog.op_id.in_(op_ids))
+        }
+        results = []
+
+        try:
+            for op in operations:
+                previous = seen.get(op.op_id)
+                if previous is not None:
+                    results.append(self._replayed(op, previous))
+                    continue
+
+                # Future client clocks are clamped so a skewed device can't lock rows
+                client_ts = min(_to_utc_naive(op.client_timestamp), now)
+                try:
+                    entity_id = self._apply(op, client_ts)
+                    status, error = "applied", None
+                except SyncError as e:
+                    entity_id = op.id or self.created_refs.get(op.ref)
+                    status, error = e.status, str(e)
+
+                if op.action == "create" and status == "applied":
+                    self.created_refs[op.op_id] = entity_id
+                if entity_id is not None and op.action != "delete":
+                    self.affected[op.entity].add(entity_id)
+
+                log = SyncOperationLog(
+                    op_id=op.op_id,
+                    entity=op.entity,
+                    action=op.action,
+                    entity_id=entity_id,
+                    status=status,
+                    error=error,
+                    client_timestamp=client_ts,
+                )
+                self.db.add(log)
+                seen[op.op_id] = log
+                results.append({
+                    "op_id": op.op_id,
+                    "status": status,
+                    "entity": op.entity,
+                    "id": entity_id,
+                    "error": error,
+                })
+            self.db.flush()
+            response = self._canonical_state(results)
+            self.db.commit()
+        except Exception:
+            self.db.rollback()
+            raise
+        return response
+
+    def _replayed(self, op: schemas.SyncOperation, log: SyncOperationLog) -> dict:
+        if log.entity_id is not None:
+            if log.action == "create" and log.status == "applied":
+                self.created_refs[op.op_id] = log.entity_id
+            self.affected[log.entity].add(log.entity_id)
+        return {
+            "op_id": op.op_id,
+            "status": "duplicate",
+            "entity": log.entity,
+            "id": log.entity_id,
+            "error": log.error,
+        }
+
+    def _resolve_id(self, op: schemas.SyncOperation) -> int:
+        if op.id is not None:
+            return op.id
+        if op.ref is not None:
+            if op.ref in self.created_refs:
+                return self.created_refs[op.ref]
+            log = self.db.query(SyncOperationLog).filter(
+                SyncOperationLog.op_id == op.ref,
+                SyncOperationLog.action == "create",
+                SyncOperationLog.status == "applied",
+            ).first()
+            if log:
+                return log.entity_id
+            raise SyncError(f"Unknown ref {op.ref}")
+        raise SyncError("Missing id or ref")
+
+    def _get_row(self, model, entity_id: int):
+        row = self.db.query(model).filter(model.id == entity_id).first()
+        if not row:
+            raise SyncError(f"{model.__name__} {entity_id} not found")
+        return row
+
+    def _validate(self, schema, data: dict) -> dict:
+        try:
+            return schema(**data).dict(exclude_unset=True)
+        except ValidationError as e:
+            error = e.errors()[0]
+            field = ".".join(str(part) for part in error["loc"])
+            raise SyncError(f"Invalid data: {field}: {error['msg']}")
+
+    def _check_barcode(self, model, values: dict, entity_id: Optional[int] = None):
+        barcode = values.get("barcode")
+        if model is not StockItem or not barcode:
+            return
+        query = self.db.query(StockItem.id).filter(StockItem.barcode == barcode)
+        if entity_id is not None:
+            query = query.filter(StockItem.id != entity_id)
+        if query.first():
+            raise SyncError(f"Barcode {barcode} already exists")
+
+    def _check_technician(self, model, values: dict):
+        if model not in (Task, Appointment):
+            return
+        try:
+            technicians.check(self.db, values.get("technician_id"), values.get("assigned_to"))
+        except ValueError as e:
+            raise SyncError(str(e))
+
+    def _check_location(self, model, values: dict):
+        if model is not StockItem:
+            return
+        try:
+            inventory.check(self.db, values.get("location_id"))
+        except ValueError as e:
+            raise SyncError(str(e))
+
+    def _check_rule(self, model, values: dict, row=None):
+        """Validate the resulting recurrence rule before the row is touched,
+        adding the normalized rule and its series end to `values`"""
+        kind = SERIES.get(model)
+        if kind is None or (row is not None and "recurrence_rule" not in values and kind.anchor not in values):
+            return
+        series = SimpleNamespace(**{
+            field: values.get(field, getattr(row, field, None))
+            for field in ("recurrence_rule", kind.anchor)
+        })
+        try:
+            recurrence.apply_rule(series, kind)
+        except ValueError as e:
+            raise SyncError(str(e))
+        values["recurrence_rule"] = series.recurrence_rule
+        values["recurrence_until"] = series.recurrence_until
+
+    def _apply(self, op: schemas.SyncOperation, client_ts: datetime) -> Optional[int]:
+        model, create_schema, update_schema, _ = ENTITIES[op.entity]
+
+        if op.action == "create":
+            values = self._validate(create_schema, op.data)
+            self._check_barcode(model, values)
+            self._check_technician(model, values)
+            self._check_location(model, values)
+            self._check_rule(model, values)
+            row = model(**values, created_at=client_ts, updated_at=client_ts)
+            self.db.add(row)
+            self.db.flush()
+            return row.id
+
+        entity_id = self._resolve_id(op)
+        row = self._get_row(model, entity_id)
+
+        if op.action == "adjust_quantity":
+            # Deltas commute, so they're applied regardless of ordering
+            if model is not StockItem:
+                raise SyncError("adjust_quantity only applies to stock_item")
+            try:
+                adjustment = float(op.data.get("adjustment", 0))
+            except (TypeError, ValueError):
+                raise SyncError("Invalid adjustment")
+            row.quantity = max((row.quantity or 0) + adjustment, 0)
+            row.updated_at = max(row.updated_at or client_ts, client_ts)
+            return entity_id
+
+        if row.updated_at and row.updated_at > client_ts:
+            raise SyncError("Row changed on the server after this operation", status="conflict")
+
+        if op.action == "delete":
+            if model in SERIES:
+                recurrence.delete_exceptions(self.db, SERIES[model], entity_id)
+            self.db.delete(row)
+            self.deleted[op.entity].add(entity_id)
+            self.affected[op.entity].discard(entity_id)
+            return entity_id
+
+        values = self._validate(update_schema, op.data)
+        self._check_barcode(model, values, entity_id)
+        self._check_technician(model, values)
+        self._check_location(model, values)
+        self._check_rule(model, values, row)
+        for field, value in values.items():
+            setattr(row, field, value)
+        row.updated_at = client_ts
+        return entity_id
+
+    def _canonical_state(self, results: List[dict]) -> dict:
+        response = {"results": results, "deleted": {}}
+        for entity, (model, _, _, key) in ENTITIES.items():
+            ids = self.affected[entity] - self.deleted[entity]
+            response[key] = (
+                self.db.query(model).filter(model.id.in_(ids)).order_by(model.id).all()
+                if ids else []
+            )
+            if self.deleted[entity]:
+                response["deleted"][key] = sorted(self.deleted[entity])
+        return response
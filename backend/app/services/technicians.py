@@ -0,0 +1,202 @@
+from datetime import datetime, timedelta
+from typing import Dict, Optional
+from sqlalchemy import event, func, update
+from sqlalchemy.orm import Session, attributes
+from app.database import Task, Appointment, Technician, TaskArchive, AppointmentArchive, CalendarFeed, dialect_insert
+from app.services import coherence, recurrence
+
+ASSIGNABLE = (Task, Appointment)
+
+
+def _normalize(name: Optional[str]) -> str:
+    return " ".join((name or "").split())
+
+
+def resolve(connection, name: str, cache: Optional[Dict[str, tuple]] = None, create: bool = False) -> tuple:
+    """(id, canonical name) of the technician called `name`.
+
+    Matching ignores case and extra spaces, so "karim " and "Karim" are
+    the same technician. Unknown names raise ValueError unless `create`
+    is set (backfill of older rows only: a typo must not become a new
+    technician). Runs on the caller's connection and transaction.
+    """
+    key = _normalize(name).lower()
+    if cache is not None and key in cache:
+        return cache[key]
+    table = Technician.__table__
+    row = connection.execute(
+        table.select().with_only_columns(table.c.id, table.c.name)
+        .where(func.lower(table.c.name) == key).limit(1)
+    ).first()
+    if row is None:
+        if not create:
+            raise ValueError(f"Technician {_normalize(name)} not found")
+        # ON CONFLICT: another worker may create the same technician concurrently
+        connection.execute(
+            dialect_insert(connection)(table)
+            .values(name=_normalize(name), daily_capacity_hours=7, active=True)
+            .on_conflict_do_nothing(index_elements=[func.lower(table.c.name)])
+        )
+        row = connection.execute(
+            table.select().with_only_columns(table.c.id, table.c.name)
+            .where(func.lower(table.c.name) == key).limit(1)
+        ).first()
+    result = (row.id, row.name)
+    if cache is not None:
+        cache[key] = result
+    return result
+
+
+def _changed(obj, attr: str) -> bool:
+    # A new row constructed with None counts as unchanged
+    history = attributes.get_history(obj, attr)
+    old = history.deleted[0] if history.deleted else None
+    return bool(history.added) and history.added[0] != old
+
+
+def _sync(session: Session, obj, cache: Dict[str, tuple]):
+    by_id = _changed(obj, "technician_id")
+    by_name = _changed(obj, "assigned_to")
+    if by_id:
+        technician = session.get(Technician, obj.technician_id) if obj.technician_id is not None else None
+        obj.assigned_to = technician.name if technician is not None else None
+    elif by_name:
+        if _normalize(obj.assigned_to):
+            obj.technician_id, obj.assigned_to = resolve(session.connection(), obj.assigned_to, cache)
+        else:
+            obj.technician_id, obj.assigned_to = None, None
+
+
+def _before_flush(session: Session, flush_context, instances):
+    cache = session.info.setdefault("technicians_by_name", {})
+    for obj in (*session.new, *session.dirty):
+        if isinstance(obj, ASSIGNABLE):
+            _sync(session, obj, cache)
+
+
+def install(session_factory):
+    """Keep technician_id and the assigned_to name in step on every ORM write"""
+    if not event.contains(session_factory, "before_flush", _before_flush):
+        event.listen(session_factory, "before_flush", _before_flush)
+
+
+def check(db: Session, technician_id: Optional[int], name: Optional[str] = None):
+    """Reject an assignment to a technician that doesn't exist, given by id or else by name"""
+    if technician_id is not None:
+        if db.get(Technician, technician_id) is None:
+            raise ValueError(f"Technician {technician_id} not found")
+    elif _normalize(name):
+        lookup(db, None, name)
+
+
+def lookup(db: Session, technician_id: Optional[int], name: Optional[str]) -> tuple:
+    """(id, name) of an existing technician given by id or name; (None, None) when neither is given"""
+    if technician_id is not None:
+        technician = db.get(Technician, technician_id)
+    elif _normalize(name):
+        technician = db.query(Technician).filter(func.lower(Technician.name) == _normalize(name).lower()).first()
+    else:
+        return None, None
+    if technician is None:
+        raise ValueError(f"Technician {technician_id if technician_id is not None else name} not found")
+    return technician.id, technician.name
+
+
+def _keep_updated_at(table) -> dict:
+    """Values that stop a Core UPDATE from firing the updated_at onupdate default.
+
+    Linking and renaming are metadata changes, not edits: a fresh updated_at
+    would delay archiving and make offline edits lose last-writer-wins.
+    """
+    return {"updated_at": table.c.updated_at} if "updated_at" in table.c else {}
+
+
+def backfill(db: Session) -> int:
+    """Link rows that only carry a free-text assigned_to (older rows, bulk imports)"""
+    linked = 0
+    connection = db.connection()
+    cache: Dict[str, tuple] = {}
+    named = [
+        (table, table.c.assigned_to)
+        for table in (Task.__table__, Appointment.__table__, TaskArchive, AppointmentArchive)
+    ]
+    # Feeds created before technicians existed only carry the name
+    named.append((CalendarFeed.__table__, CalendarFeed.__table__.c.technician))
+    for table, name_column in named:
+        names = [
+            name for (name,) in connection.execute(
+                table.select().with_only_columns(name_column).distinct()
+                .where(table.c.technician_id.is_(None), name_column.isnot(None))
+            )
+        ]
+        for name in names:
+            if not _normalize(name):
+                continue
+            technician_id, _ = resolve(connection, name, cache, create=True)
+            linked += connection.execute(
+                update(table)
+                .where(table.c.technician_id.is_(None), name_column == name)
+                .values(technician_id=technician_id, **_keep_updated_at(table))
+            ).rowcount
+    if linked:
+        coherence.invalidate(db, "tasks", "appointments", "archive", "calendar_feeds")
+    else:
+        db.commit()
+    return linked
+
+
+def rename(db: Session, technician: Technician, name: str):
+    """Change a technician's name, and the copies on their rows, archived rows and feeds"""
+    name = _normalize(name)
+    clash = db.query(Technician.id).filter(
+        func.lower(Technician.name) == name.lower(), Technician.id != technician.id
+    ).first()
+    if clash:
+        raise ValueError(f"A technician named {name} already exists")
+    technician.name = name
+    for table in (Task.__table__, Appointment.__table__, TaskArchive, AppointmentArchive):
+        db.execute(
+            update(table).where(table.c.technician_id == technician.id)
+            .values(assigned_to=name, **_keep_updated_at(table))
+        )
+    db.execute(
+        update(CalendarFeed.__table__).where(CalendarFeed.technician_id == technician.id).values(technician=name)
+    )
+    coherence.invalidate(db, "tasks", "appointments", "archive", "calendar_feeds")
+
+
+def workload(db: Session, technician_id: int, days: int = 7) -> dict:
+    """Open tasks by status and scheduled appointments in the next `days` days"""
+    now = datetime.utcnow()
+    tasks_by_status = {
+        status: count for status, count in db.query(Task.status, func.count())
+        .filter(Task.technician_id == technician_id, Task.status.in_(("todo", "in_progress")))
+        .group_by(Task.status)
+    }
+    overdue = db.query(func.count()).select_from(Task).filter(
+        Task.technician_id == technician_id,
+        Task.status.in_(("todo", "in_progress")),
+        Task.due_date < now,
+    ).scalar()
+    later = now + timedelta(days=days)
+    upcoming = db.query(Appointment).filter(
+        Appointment.technician_id == technician_id,
+        Appointment.start_time >= now,
+        Appointment.start_time <= later,
+        Appointment.status == "scheduled",
+    ).order_by(Appointment.start_time.asc())
+    series = [
+        obj for obj in recurrence.series_in_window(db, recurrence.APPOINTMENTS, now, later)
+        if obj.technician_id == technician_id
+    ]
+    appointments = recurrence.expand(
+        db, recurrence.APPOINTMENTS, upcoming, series, now, later,
+        matches=lambda values: values["status"] == "scheduled",
+    )
+    return {
+        "technician_id": technician_id,
+        "open_tasks": tasks_by_status,
+        "overdue_tasks": overdue,
+        "days": days,
+        "upcoming_appointments": len(appointments),
+    }
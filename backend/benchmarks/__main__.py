@@ -0,0 +1,153 @@
+"""Seeded load benchmark of the API.
+
+Usage (from backend/):
+    python -m benchmarks --scale 1k --profile mixed --requests 2000 --output results.json
+
+No baseline is committed: timings depend on the machine. Record one on the
+machine that will run the comparisons, then compare later runs against it
+with the same --scale and --profile:
+    python -m benchmarks --scale 100k --save-baseline baseline.json
+    python -m benchmarks --scale 100k --baseline baseline.json
+
+Exits with status 1 when the run regresses against --baseline, or when the
+baseline file is missing or was recorded with another scale or profile.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+
+
+def parse_args(argv=None):
+    from benchmarks.data import SCALES
+    from benchmarks.load import PROFILES
+    from benchmarks.compare import DEFAULT_TOLERANCE
+
+    parser = argparse.ArgumentParser(prog="python -m benchmarks", description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scale", choices=SCALES, default="1k")
+    parser.add_argument("--profile", choices=PROFILES, default="mixed")
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--database", help="SQLite file to use (default: a temporary file)")
+    parser.add_argument("--database-url", help="full SQLAlchemy URL, e.g. a local PostgreSQL")
+    parser.add_argument("--reuse-data", action="store_true", help="skip data generation")
+    parser.add_argument("--output", help="write the JSON result to this file")
+    parser.add_argument("--baseline", help="baseline JSON to compare against")
+    parser.add_argument("--save-baseline", help="write this run's result as a baseline for later runs")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE)
+    return parser.parse_args(argv)
+
+
+async def _run(args) -> dict:
+    from app.database import engine
+    from app.main import app
+    from benchmarks.data import SCALES, generate
+    from benchmarks.fake_google import fake_google
+    from benchmarks.load import run_load
+
+    generation_s = None
+    if not args.reuse_data:
+        started = time.perf_counter()
+        generate(engine, args.scale, args.seed)
+        generation_s = round(time.perf_counter() - started, 2)
+
+    with fake_google(seed=args.seed):
+        async with app.router.lifespan_context(app):
+            result = await run_load(
+                app, engine,
+                profile=args.profile,
+                requests=args.requests,
+                concurrency=args.concurrency,
+                rows=SCALES[args.scale],
+                seed=args.seed,
+            )
+
+    return {
+        "meta": {
+            "scale": args.scale,
+            "profile": args.profile,
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+            "seed": args.seed,
+            "dialect": engine.dialect.name,
+            "generation_s": generation_s,
+            "python": platform.python_version(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        },
+        **result,
+    }
+
+
+def _print_table(result: dict):
+    print(f"{'scenario':<20}{'reqs':>7}{'err':>5}{'rps':>10}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'q/req':>7}")
+    rows = list(result["scenarios"].items()) + [("overall", result["overall"])]
+    for name, stats in rows:
+        print(f"{name:<20}{stats['requests']:>7}{stats['errors']:>5}{stats['throughput_rps']:>10.1f}"
+              f"{stats['p50_ms']:>9.2f}{stats['p95_ms']:>9.2f}{stats['p99_ms']:>9.2f}"
+              f"{stats['queries_per_request']:>7.1f}")
+
+
+def _load_baseline(args) -> dict:
+    """The baseline to compare against; raises ValueError when it can't be used"""
+    if not os.path.exists(args.baseline):
+        raise ValueError(
+            f"Baseline {args.baseline} not found. Record one first with "
+            f"python -m benchmarks --scale {args.scale} --profile {args.profile} --save-baseline {args.baseline}"
+        )
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    meta = baseline.get("meta", {})
+    if (meta.get("scale"), meta.get("profile")) != (args.scale, args.profile):
+        raise ValueError(
+            f"Baseline {args.baseline} was recorded with --scale {meta.get('scale')} "
+            f"--profile {meta.get('profile')}, not --scale {args.scale} --profile {args.profile}"
+        )
+    return baseline
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    baseline = None
+    if args.baseline:
+        # Checked before the run, which can take minutes at the larger scales
+        try:
+            baseline = _load_baseline(args)
+        except ValueError as e:
+            print(e, file=sys.stderr)
+            return 1
+    # Configure the app before it is imported
+    if args.database_url:
+        os.environ["DATABASE_URL"] = args.database_url
+    else:
+        database = args.database or os.path.join(tempfile.mkdtemp(), "bench.db")
+        os.environ["DATABASE_URL"] = f"sqlite:///{database}"
+    os.environ["ROLLUP_COMPACTION_HOUR"] = ""
+
+    result = asyncio.run(_run(args))
+    _print_table(result)
+
+    for path in (args.output, args.save_baseline):
+        if path:
+            with open(path, "w") as f:
+                json.dump(result, f, indent=2)
+
+    if baseline is not None:
+        from benchmarks.compare import compare
+        regressions = compare(result, baseline, args.tolerance)
+        if regressions:
+            print("\nRegressions against baseline:")
+            for regression in regressions:
+                print(f"  - {regression}")
+            return 1
+        print("\nNo regression against baseline")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
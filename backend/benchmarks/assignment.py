@@ -0,0 +1,83 @@
+"""Solve time of the task auto-assignment engine.
+
+Builds seeded synthetic technicians (with appointments and already
+assigned tasks over the horizon) and open tasks, then times the greedy
+solver alone, without database access.
+
+Usage (from backend/):
+    python -m benchmarks.assignment --tasks 100 500 2000 --technicians 20
+"""
+import argparse
+import json
+import random
+import statistics
+import time
+from datetime import datetime, timedelta
+
+from app.services import assignment
+from benchmarks.data import EPOCH, PRIORITIES
+
+HORIZON_DAYS = 14
+
+
+def _workloads(rng: random.Random, count: int, now: datetime, horizon_end: datetime) -> list:
+    workloads = []
+    for technician_id in range(1, count + 1):
+        workload = assignment.Workload(technician_id, f"Tech {technician_id}", rng.choice([4, 7, 7, 8]), now)
+        for _ in range(rng.randrange(5, 40)):
+            start = now + timedelta(minutes=rng.randrange(0, HORIZON_DAYS * 24 * 60))
+            hours = rng.choice([1, 1, 2, 3])
+            workload.book(min(start + timedelta(hours=hours), horizon_end), hours)
+        for _ in range(rng.randrange(0, 15)):
+            workload.book(now + timedelta(days=rng.randrange(1, HORIZON_DAYS)), assignment.ASSIGNMENT_TASK_HOURS)
+        workloads.append(workload)
+    return workloads
+
+
+def _tasks(rng: random.Random, count: int, now: datetime) -> list:
+    return [
+        {
+            "id": i,
+            "title": f"Task {i}",
+            "priority": rng.choice(PRIORITIES),
+            "due_date": now + timedelta(hours=rng.randrange(-48, 30 * 24)) if rng.random() < 0.8 else None,
+        }
+        for i in range(count)
+    ]
+
+
+def measure(tasks: int, technicians: int, repeat: int, seed: int) -> dict:
+    now = EPOCH
+    horizon_end = now + timedelta(days=HORIZON_DAYS)
+    samples, overloaded = [], 0
+    for run in range(repeat):
+        rng = random.Random(seed + run)
+        workloads = _workloads(rng, technicians, now, horizon_end)
+        open_tasks = _tasks(rng, tasks, now)
+        started = time.perf_counter()
+        result = assignment.solve(open_tasks, workloads, now, horizon_end)
+        samples.append(time.perf_counter() - started)
+        overloaded = sum(1 for item in result if item["overloaded"])
+    return {
+        "tasks": tasks,
+        "technicians": technicians,
+        "median_ms": round(statistics.median(samples) * 1000, 2),
+        "max_ms": round(max(samples) * 1000, 2),
+        "overloaded_last_run": overloaded,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tasks", type=int, nargs="+", default=[100, 500, 2000])
+    parser.add_argument("--technicians", type=int, default=20)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+    print(json.dumps(
+        [measure(count, args.technicians, args.repeat, args.seed) for count in args.tasks], indent=2
+    ))
+
+
+if __name__ == "__main__":
+    main()
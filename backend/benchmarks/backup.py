@@ -0,0 +1,130 @@
+"""Online snapshot and restore timings on a large SQLite file.
+
+Seeds the three tables, pads the file up to --size-gb with a filler table,
+then takes a snapshot while a writer thread keeps committing, so the write
+latency during the backup can be compared with an idle baseline. Finally
+the snapshot is restored into a scratch file and integrity-checked.
+
+Usage (from backend/):
+    python -m benchmarks.backup --size-gb 2 --scale 100k
+    python -m benchmarks.backup --database /data/safe_hdf.db   # reuse an existing file
+"""
+import argparse
+import json
+import os
+import sqlite3
+import statistics
+import tempfile
+import threading
+import time
+
+# Half random bytes, half text: compresses roughly like real rows
+PAD_ROW_BYTES = 8192
+PAD_ROWS_PER_COMMIT = 10_000
+
+
+def _pad(path: str, size_bytes: int):
+    connection = sqlite3.connect(path)
+    connection.execute(
+        "CREATE TABLE IF NOT EXISTS bench_padding (id INTEGER PRIMARY KEY, payload BLOB, note TEXT)"
+    )
+    while os.path.getsize(path) < size_bytes:
+        connection.execute(
+            "WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n WHERE i < ?) "
+            "INSERT INTO bench_padding (payload, note) "
+            "SELECT randomblob(?), printf('%.*c', ?, 'x') || i FROM n",
+            (PAD_ROWS_PER_COMMIT, PAD_ROW_BYTES // 2, PAD_ROW_BYTES // 2),
+        )
+        connection.commit()
+    connection.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    connection.close()
+
+
+def _percentiles(samples: list) -> dict:
+    if not samples:
+        return {"writes": 0}
+    ordered = sorted(samples)
+    return {
+        "writes": len(ordered),
+        "p50_ms": round(statistics.median(ordered) * 1000, 2),
+        "p99_ms": round(ordered[int(len(ordered) * 0.99) - 1] * 1000, 2),
+        "max_ms": round(ordered[-1] * 1000, 2),
+    }
+
+
+class Writer:
+    """Commits one task update every `interval` seconds and records each latency"""
+
+    def __init__(self, path: str, interval: float = 0.005):
+        self.path = path
+        self.interval = interval
+        self.latencies = []
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        connection = sqlite3.connect(self.path, timeout=15)
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+        i = 0
+        while not self._stop.wait(self.interval):
+            i += 1
+            started = time.perf_counter()
+            connection.execute("UPDATE tasks SET updated_at = CURRENT_TIMESTAMP WHERE id = ?", (i % 1000 + 1,))
+            connection.commit()
+            self.latencies.append(time.perf_counter() - started)
+        connection.close()
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database", help="existing SQLite file to snapshot (skips seeding)")
+    parser.add_argument("--size-gb", type=float, default=1.0)
+    parser.add_argument("--scale", default="100k", choices=["1k", "100k", "1m"])
+    parser.add_argument("--baseline-seconds", type=float, default=5.0)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="bench_backup_")
+    database = os.path.abspath(args.database or os.path.join(workdir, "safe_hdf.db"))
+    os.environ["DATABASE_URL"] = f"sqlite:///{database}"
+    os.environ["BACKUP_DIR"] = os.path.join(workdir, "backups")
+
+    from app.database import engine, init_db
+    from app.services import backup
+    from benchmarks import data
+
+    if not args.database:
+        init_db()
+        data.generate(engine, args.scale)
+        engine.dispose()
+        _pad(database, int(args.size_gb * 1024 ** 3))
+
+    with Writer(database) as idle:
+        time.sleep(args.baseline_seconds)
+    with Writer(database) as busy:
+        snapshot = backup.create_snapshot()
+    restore_target = os.path.join(workdir, "restored.db")
+    started = time.perf_counter()
+    restored = backup.restore(snapshot["name"], restore_target)
+    restore_seconds = time.perf_counter() - started
+
+    print(json.dumps({
+        "database_bytes": os.path.getsize(database),
+        "snapshot": snapshot,
+        "writes_idle": _percentiles(idle.latencies),
+        "writes_during_snapshot": _percentiles(busy.latencies),
+        "restore": {**restored, "total_seconds": round(restore_seconds, 3)},
+        "integrity_check": "ok",
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
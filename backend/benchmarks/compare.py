@@ -0,0 +1,31 @@
+"""Compare a benchmark result against a stored baseline."""
+from typing import List
+
+# Relative slack before a change counts as a regression
+DEFAULT_TOLERANCE = 0.25
+# Absolute slack for queries per request (random mixes aren't perfectly stable)
+QUERY_TOLERANCE = 0.5
+
+
+def compare(result: dict, baseline: dict, tolerance: float = DEFAULT_TOLERANCE) -> List[str]:
+    """Return human-readable regressions; an empty list means the run passes"""
+    regressions = []
+    for name, base in baseline.get("scenarios", {}).items():
+        current = result.get("scenarios", {}).get(name)
+        if current is None:
+            continue
+        if current["p95_ms"] > base["p95_ms"] * (1 + tolerance):
+            regressions.append(
+                f"{name}: p95 {current['p95_ms']:.2f}ms > baseline {base['p95_ms']:.2f}ms"
+            )
+        if current["throughput_rps"] < base["throughput_rps"] * (1 - tolerance):
+            regressions.append(
+                f"{name}: throughput {current['throughput_rps']:.1f} rps < baseline {base['throughput_rps']:.1f} rps"
+            )
+        if current["queries_per_request"] > base["queries_per_request"] + QUERY_TOLERANCE:
+            regressions.append(
+                f"{name}: {current['queries_per_request']} queries/request > baseline {base['queries_per_request']}"
+            )
+        if current["errors"] > base["errors"]:
+            regressions.append(f"{name}: {current['errors']} errors > baseline {base['errors']}")
+    return regressions
@@ -0,0 +1,60 @@
+"""Bytes on the wire and p95 latency of list payloads per content encoding.
+
+Usage (from backend/):
+    python -m benchmarks.compression --rows 100 --repeat 200
+"""
+import argparse
+import os
+import statistics
+import tempfile
+import time
+
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{tempfile.mkdtemp()}/bench_compression.db")
+
+from fastapi.testclient import TestClient  # noqa: E402
+from app.main import app  # noqa: E402
+from app.middleware import brotli  # noqa: E402
+from benchmarks.serialization import seed  # noqa: E402
+
+ENDPOINTS = ["/tasks/", "/stock/", "/appointments/", "/dashboard/stats"]
+
+
+def wire_size(response) -> int:
+    # httpx decodes the body transparently, use the raw stream length instead
+    return int(response.headers.get("content-length", len(response.content)))
+
+
+def measure(client: TestClient, path: str, encoding: str, rows: int, repeat: int):
+    headers = {"Accept-Encoding": encoding}
+    timings = []
+    size = 0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        response = client.get(path, params={"limit": rows}, headers=headers)
+        timings.append((time.perf_counter() - start) * 1000)
+        assert response.status_code == 200
+        size = wire_size(response)
+    p95 = statistics.quantiles(timings, n=20)[18]
+    return size, p95
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=100)
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    seed(args.rows)
+    encodings = ["identity", "gzip"] + (["br"] if brotli is not None else [])
+    print(f"{'endpoint':<18}{'encoding':<10}{'bytes':>10}{'ratio':>8}{'p95 ms':>9}")
+    with TestClient(app) as client:
+        for path in ENDPOINTS:
+            baseline = None
+            for encoding in encodings:
+                size, p95 = measure(client, path, encoding, args.rows, args.repeat)
+                baseline = baseline or size
+                print(f"{path:<18}{encoding:<10}{size:>10,}{size / baseline:>8.2f}{p95:>9.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""Seeded synthetic data for tasks, stock items and appointments.
+
+The same seed and scale always produce the same rows, so benchmark runs
+are comparable across machines and commits.
+"""
+import random
+from datetime import datetime, timedelta
+from sqlalchemy import insert
+
+SCALES = {
+    "1k": 1_000,
+    "100k": 100_000,
+    "1m": 1_000_000,
+}
+
+CHUNK_SIZE = 10_000
+
+# Fixed reference date so generated timestamps don't depend on when the run happens
+EPOCH = datetime(2025, 1, 1)
+
+PRIORITIES = ["low", "medium", "high", "urgent"]
+TASK_STATUSES = ["todo", "in_progress", "done", "cancelled"]
+APPOINTMENT_STATUSES = ["scheduled", "scheduled", "scheduled", "completed", "cancelled"]
+TECHNICIANS = ["Karim", "Julie", "Marc", "Sophie", "Yanis", "Claire"]
+CATEGORIES = ["Serrures", "Coffres", "Cylindres", "Électronique", "Outillage", "Visserie", None]
+LOCATIONS = ["Atelier", "Van 1", "Van 2", "Dépôt"]
+UNITS = ["unit", "box", "kg"]
+WORDS = ["coffre", "serrure", "combinaison", "ouverture", "maintenance", "blindage",
+         "pêne", "cylindre", "clé", "digicode", "porte", "révision"]
+
+
+def _words(rng: random.Random, count: int) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(count))
+
+
+def _task(rng: random.Random, i: int) -> dict:
+    created = EPOCH + timedelta(minutes=rng.randrange(0, 2 * 365 * 24 * 60))
+    return {
+        "title": f"{_words(rng, 3).capitalize()} #{i}",
+        "description": _words(rng, 20),
+        "priority": rng.choice(PRIORITIES),
+        "status": rng.choice(TASK_STATUSES),
+        "due_date": created + timedelta(days=rng.randrange(1, 60)),
+        "created_at": created,
+        "updated_at": created + timedelta(hours=rng.randrange(0, 500)),
+        "assigned_to": rng.choice(TECHNICIANS),
+        "tags": ",".join(rng.sample(WORDS, 2)),
+    }
+
+
+def _stock_item(rng: random.Random, i: int) -> dict:
+    created = EPOCH + timedelta(minutes=rng.randrange(0, 365 * 24 * 60))
+    return {
+        "name": f"{_words(rng, 2).capitalize()} {i}",
+        "description": _words(rng, 15),
+        "quantity": float(rng.randrange(0, 200)),
+        "unit": rng.choice(UNITS),
+        "min_threshold": float(rng.randrange(5, 30)),
+        "location": rng.choice(LOCATIONS),
+        "category": rng.choice(CATEGORIES),
+        "supplier": f"Fournisseur {rng.randrange(1, 40)}",
+        "price_per_unit": round(rng.uniform(0.5, 900), 2),
+        "created_at": created,
+        "updated_at": created,
+        "barcode": f"SYN{i:08d}",
+    }
+
+
+def _appointment(rng: random.Random, i: int) -> dict:
+    start = EPOCH + timedelta(minutes=30 * rng.randrange(0, 3 * 365 * 48))
+    return {
+        "title": f"Intervention {_words(rng, 2)} #{i}",
+        "description": _words(rng, 25),
+        "start_time": start,
+        "end_time": start + timedelta(hours=rng.choice([1, 2, 3])),
+        "location": f"{rng.randrange(1, 200)} rue {rng.choice(WORDS)}",
+        "contact_name": f"Client {rng.randrange(1, 5000)}",
+        "contact_phone": f"06{rng.randrange(10000000, 99999999)}",
+        "contact_email": f"client{i}@example.com",
+        "status": rng.choice(APPOINTMENT_STATUSES),
+        "reminder_sent": False,
+        "reminder_3days_sent": False,
+        "is_synced": False,
+        "created_at": start - timedelta(days=rng.randrange(1, 30)),
+        "updated_at": start - timedelta(days=1),
+    }
+
+
+def generate(engine, scale: str = "1k", seed: int = 42) -> dict:
+    """Fill the three tables with `scale` rows each, replacing existing rows"""
+    from app.database import Base, Task, StockItem, StockLevel, Appointment
+
+    rows = SCALES[scale]
+    Base.metadata.create_all(bind=engine)
+    if engine.dialect.name != "postgresql":
+        # Regenerated items reuse ids; levels are rebuilt from them at startup
+        with engine.begin() as connection:
+            connection.execute(StockLevel.__table__.delete())
+    counts = {}
+    for offset, (model, factory) in enumerate([
+        (Task, _task), (StockItem, _stock_item), (Appointment, _appointment),
+    ]):
+        rng = random.Random(seed + offset)
+        with engine.begin() as connection:
+            if engine.dialect.name == "postgresql":
+                # Restart ids at 1 so scenarios can address rows by id
+                connection.exec_driver_sql(f"TRUNCATE {model.__tablename__} RESTART IDENTITY CASCADE")
+            else:
+                connection.execute(model.__table__.delete())
+            for start in range(0, rows, CHUNK_SIZE):
+                chunk = [factory(rng, i) for i in range(start, min(start + CHUNK_SIZE, rows))]
+                connection.execute(insert(model.__table__), chunk)
+        counts[model.__tablename__] = rows
+    return counts
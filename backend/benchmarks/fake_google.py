@@ -0,0 +1,60 @@
+"""In-memory stand-in for the Google Calendar API used by `/calendar/sync`.
+
+Only the `events().list(...).execute()` chain the service calls is
+implemented; events are deterministic for a given seed.
+"""
+import random
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from unittest import mock
+
+
+class _Request:
+    def __init__(self, result: dict):
+        self._result = result
+
+    def execute(self) -> dict:
+        return self._result
+
+
+class _Events:
+    def __init__(self, events: list):
+        self._events = events
+
+    def list(self, **kwargs) -> _Request:
+        return _Request({"items": self._events})
+
+    def insert(self, calendarId: str, body: dict) -> _Request:
+        return _Request({"id": f"fake-{random.getrandbits(48):x}", **body})
+
+
+class FakeCalendarService:
+    def __init__(self, event_count: int = 50, seed: int = 42):
+        rng = random.Random(seed)
+        start = datetime(2025, 1, 1, 8)
+        self._events = []
+        for i in range(event_count):
+            begin = start + timedelta(hours=rng.randrange(0, 90 * 24))
+            self._events.append({
+                "id": f"bench-event-{i}",
+                "summary": f"Visite coffre {i}",
+                "description": "Synchronisé depuis le faux Google Calendar",
+                "location": f"{rng.randrange(1, 100)} avenue des Coffres",
+                "start": {"dateTime": begin.isoformat() + "Z"},
+                "end": {"dateTime": (begin + timedelta(hours=1)).isoformat() + "Z"},
+            })
+
+    def events(self) -> _Events:
+        return _Events(self._events)
+
+
+@contextmanager
+def fake_google(event_count: int = 50, seed: int = 42):
+    """Route GoogleCalendarService through FakeCalendarService with a connected account"""
+    from app.services import google_calendar
+
+    service = FakeCalendarService(event_count, seed)
+    with mock.patch.object(google_calendar, "build", lambda *args, **kwargs: service), \
+            mock.patch.object(google_calendar.GoogleCalendarService, "_get_credentials",
+                              lambda self, user_id="default": object()):
+        yield service
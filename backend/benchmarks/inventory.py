@@ -0,0 +1,108 @@
+"""Per-location inventory: backfill, aggregate queries and transfers.
+
+Seeds the stock table, times the startup backfill that turns free-text
+locations into per-location levels, then compares the old scans (ILIKE on
+the location string, column-to-column low-stock filter) with the indexed
+per-location and shortfall queries, and measures transfer throughput.
+
+Usage (from backend/):
+    python -m benchmarks.inventory --scale 100k
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import tempfile
+import time
+
+
+def _timed(function, repeat: int) -> dict:
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = function()
+        samples.append(time.perf_counter() - started)
+    return {
+        "median_ms": round(statistics.median(samples) * 1000, 2),
+        "max_ms": round(max(samples) * 1000, 2),
+        "rows": len(result) if isinstance(result, list) else result,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scale", default="100k", choices=["1k", "100k", "1m"])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--transfers", type=int, default=500)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="bench_inventory_")
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(workdir, 'safe_hdf.db')}"
+
+    from app.database import SessionLocal, StockItem, Location, engine, init_db
+    from app.services import coherence, inventory
+    from benchmarks import data
+
+    init_db()
+    data.generate(engine, args.scale)
+    coherence.install(SessionLocal)
+    inventory.install(SessionLocal)
+
+    db = SessionLocal()
+    try:
+        started = time.perf_counter()
+        backfill = inventory.reconcile(db)
+        backfill_seconds = time.perf_counter() - started
+
+        van = db.query(Location).filter(Location.name == "Van 1").one()
+        depot = db.query(Location).filter(Location.name == "Dépôt").one()
+        queries = {
+            "van_loadout_ilike": lambda: db.query(StockItem).filter(
+                StockItem.location.ilike("%Van 1%"), StockItem.quantity > 0
+            ).all(),
+            "van_loadout_indexed": lambda: inventory.loadout(db, van.id),
+            "low_stock_count_scan": lambda: db.query(StockItem).filter(
+                StockItem.quantity <= StockItem.min_threshold
+            ).count(),
+            "low_stock_count_indexed": lambda: db.query(StockItem).filter(inventory.ITEM_IS_LOW).count(),
+            "by_location": lambda: inventory.by_location(db)["locations"],
+        }
+        timings = {name: _timed(query, args.repeat) for name, query in queries.items()}
+
+        rng = random.Random(args.seed)
+        candidates = [
+            item_id for (item_id,) in db.query(StockItem.id).filter(
+                StockItem.location_id == depot.id, StockItem.quantity >= 1
+            ).limit(args.transfers * 4)
+        ]
+        moved, refused = 0, 0
+        started = time.perf_counter()
+        for _ in range(args.transfers):
+            try:
+                inventory.transfer(db, depot.id, van.id, [(rng.choice(candidates), 1.0)])
+                moved += 1
+            except ValueError:
+                refused += 1
+        transfer_seconds = time.perf_counter() - started
+
+        mismatched = inventory.reconcile(db)["placed"]
+    finally:
+        db.close()
+
+    print(json.dumps({
+        "scale": args.scale,
+        "backfill": {**backfill, "seconds": round(backfill_seconds, 3)},
+        "queries": timings,
+        "transfers": {
+            "moved": moved,
+            "refused": refused,
+            "per_second": round(args.transfers / transfer_seconds, 1),
+        },
+        "totals_out_of_step_after": mismatched,
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,178 @@
+"""In-process ASGI load driver for mixed read/write scenarios.
+
+Requests go through httpx's ASGI transport straight into the app, so
+results measure the API stack (routing, SQL, serialization) without
+network noise. SQL statements are counted per request through an engine
+event and a context variable.
+"""
+import asyncio
+import contextvars
+import random
+import statistics
+import time
+from collections import defaultdict
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional
+
+import httpx
+from sqlalchemy import event
+
+from benchmarks.data import WORDS
+
+_query_counter: contextvars.ContextVar[Optional[List[int]]] = contextvars.ContextVar(
+    "benchmark_query_counter", default=None
+)
+
+
+def _count_query(conn, cursor, statement, parameters, context, executemany):
+    counter = _query_counter.get()
+    if counter is not None:
+        counter[0] += 1
+
+
+@dataclass
+class Scenario:
+    name: str
+    weight: int
+    build: Callable[[random.Random, dict], dict]  # returns httpx request kwargs
+
+
+def _list_tasks(rng, ctx):
+    return {"method": "GET", "url": "/tasks/", "params": {"limit": 50, "status": rng.choice(["todo", "in_progress"])}}
+
+
+def _list_stock(rng, ctx):
+    return {"method": "GET", "url": "/stock/", "params": {"limit": 50, "skip": rng.randrange(0, 500)}}
+
+
+def _search_stock(rng, ctx):
+    return {"method": "GET", "url": "/stock/", "params": {"search": rng.choice(WORDS), "limit": 50}}
+
+
+def _list_appointments(rng, ctx):
+    start = datetime(2025, 1, 1) + timedelta(days=rng.randrange(0, 3 * 365))
+    return {"method": "GET", "url": "/appointments/", "params": {
+        "from_date": start.isoformat(), "to_date": (start + timedelta(days=7)).isoformat(), "limit": 100,
+    }}
+
+
+def _dashboard_stats(rng, ctx):
+    return {"method": "GET", "url": "/dashboard/stats"}
+
+
+def _stock_by_category(rng, ctx):
+    return {"method": "GET", "url": "/stock/stats/by-category"}
+
+
+def _adjust_quantity(rng, ctx):
+    item_id = rng.randrange(1, ctx["rows"] + 1)
+    return {"method": "POST", "url": f"/stock/{item_id}/adjust-quantity",
+            "params": {"adjustment": rng.choice([-2, -1, 1, 3])}}
+
+
+def _calendar_sync(rng, ctx):
+    return {"method": "POST", "url": "/calendar/sync", "json": {"calendar_id": "primary"}}
+
+
+PROFILES: Dict[str, List[Scenario]] = {
+    "read-heavy": [
+        Scenario("list_tasks", 25, _list_tasks),
+        Scenario("list_stock", 20, _list_stock),
+        Scenario("search_stock", 15, _search_stock),
+        Scenario("list_appointments", 20, _list_appointments),
+        Scenario("dashboard_stats", 10, _dashboard_stats),
+        Scenario("stock_by_category", 8, _stock_by_category),
+        Scenario("adjust_quantity", 2, _adjust_quantity),
+    ],
+    "mixed": [
+        Scenario("list_tasks", 20, _list_tasks),
+        Scenario("list_stock", 15, _list_stock),
+        Scenario("search_stock", 10, _search_stock),
+        Scenario("list_appointments", 15, _list_appointments),
+        Scenario("dashboard_stats", 10, _dashboard_stats),
+        Scenario("stock_by_category", 5, _stock_by_category),
+        Scenario("adjust_quantity", 22, _adjust_quantity),
+        Scenario("calendar_sync", 3, _calendar_sync),
+    ],
+}
+
+
+@dataclass
+class _Samples:
+    latencies: List[float] = field(default_factory=list)
+    queries: List[int] = field(default_factory=list)
+    errors: int = 0
+
+
+def _percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    if len(values) == 1:
+        return values[0]
+    return statistics.quantiles(values, n=100, method="inclusive")[int(pct) - 1]
+
+
+def _summarize(samples: _Samples, elapsed: float) -> dict:
+    latencies = samples.latencies
+    return {
+        "requests": len(latencies),
+        "errors": samples.errors,
+        "throughput_rps": round(len(latencies) / elapsed, 2) if elapsed else 0.0,
+        "p50_ms": round(_percentile(latencies, 50), 3),
+        "p95_ms": round(_percentile(latencies, 95), 3),
+        "p99_ms": round(_percentile(latencies, 99), 3),
+        "queries_per_request": round(statistics.fmean(samples.queries), 2) if samples.queries else 0.0,
+    }
+
+
+async def run_load(app, engine, profile: str = "mixed", requests: int = 2000,
+                   concurrency: int = 8, rows: int = 1000, seed: int = 42) -> dict:
+    """Drive `requests` requests through the app from `concurrency` workers"""
+    scenarios = PROFILES[profile]
+    weights = [scenario.weight for scenario in scenarios]
+    ctx = {"rows": rows}
+    per_scenario: Dict[str, _Samples] = defaultdict(_Samples)
+    remaining = [requests]
+
+    event.listen(engine, "before_cursor_execute", _count_query)
+    # Server errors are recorded as failed requests instead of aborting the run
+    transport = httpx.ASGITransport(app=app, raise_app_exceptions=False)
+
+    async def worker(worker_id: int, client: httpx.AsyncClient):
+        rng = random.Random(seed * 1000 + worker_id)
+        while remaining[0] > 0:
+            remaining[0] -= 1
+            scenario = rng.choices(scenarios, weights)[0]
+            counter = [0]
+            _query_counter.set(counter)
+            start = time.perf_counter()
+            response = await client.request(**scenario.build(rng, ctx))
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            samples = per_scenario[scenario.name]
+            samples.latencies.append(elapsed_ms)
+            samples.queries.append(counter[0])
+            if response.status_code >= 400:
+                samples.errors += 1
+
+    try:
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            started = time.perf_counter()
+            await asyncio.gather(*(worker(i, client) for i in range(concurrency)))
+            elapsed = time.perf_counter() - started
+    finally:
+        event.remove(engine, "before_cursor_execute", _count_query)
+
+    overall = _Samples()
+    for samples in per_scenario.values():
+        overall.latencies.extend(samples.latencies)
+        overall.queries.extend(samples.queries)
+        overall.errors += samples.errors
+
+    return {
+        "overall": _summarize(overall, elapsed),
+        "scenarios": {
+            name: _summarize(samples, elapsed)
+            for name, samples in sorted(per_scenario.items())
+        },
+    }
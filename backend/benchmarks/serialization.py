@@ -0,0 +1,75 @@
+"""Rows/second of list endpoints with and without the fast serialization path.
+
+Usage (from backend/):
+    python -m benchmarks.serialization --rows 5000 --repeat 20
+"""
+import argparse
+import os
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{tempfile.mkdtemp()}/bench_serialization.db")
+
+from fastapi.testclient import TestClient  # noqa: E402
+from app.main import app  # noqa: E402
+from app.database import SessionLocal, init_db, Task, StockItem, Appointment  # noqa: E402
+from app.services import serialization  # noqa: E402
+
+ENDPOINTS = ["/tasks/", "/stock/", "/appointments/"]
+
+
+def seed(rows: int):
+    init_db()
+    db = SessionLocal()
+    now = datetime.utcnow()
+    db.query(Task).delete()
+    db.query(StockItem).delete()
+    db.query(Appointment).delete()
+    db.bulk_insert_mappings(Task, [
+        {"title": f"Task {i}", "description": "Maintenance coffre " * 5,
+         "priority": "medium", "status": "todo", "due_date": now + timedelta(hours=i)}
+        for i in range(rows)
+    ])
+    db.bulk_insert_mappings(StockItem, [
+        {"name": f"Item {i}", "description": "Pièce détachée " * 5, "quantity": i % 40,
+         "barcode": f"BENCH{i}", "price_per_unit": 12.5}
+        for i in range(rows)
+    ])
+    db.bulk_insert_mappings(Appointment, [
+        {"title": f"RDV {i}", "start_time": now + timedelta(hours=i), "contact_name": "Client"}
+        for i in range(rows)
+    ])
+    db.commit()
+    db.close()
+
+
+def run(client: TestClient, path: str, rows: int, repeat: int) -> float:
+    client.get(path, params={"limit": rows})
+    start = time.perf_counter()
+    for _ in range(repeat):
+        response = client.get(path, params={"limit": rows})
+        assert response.status_code == 200
+    return rows * repeat / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=5000)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    seed(args.rows)
+    encoder = "orjson" if serialization.orjson is not None else "json"
+    print(f"{'endpoint':<16}{'pydantic rows/s':>18}{'fast rows/s':>18}{'speedup':>10}   ({encoder})")
+    with TestClient(app) as client:
+        for path in ENDPOINTS:
+            serialization.FAST_SERIALIZATION = False
+            slow = run(client, path, args.rows, args.repeat)
+            serialization.FAST_SERIALIZATION = True
+            fast = run(client, path, args.rows, args.repeat)
+            print(f"{path:<16}{slow:>18,.0f}{fast:>18,.0f}{fast / slow:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
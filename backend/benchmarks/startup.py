@@ -0,0 +1,69 @@
+"""Import time and resident memory of the app, with and without the Google clients.
+
+Each measurement runs in a fresh interpreter so module caches don't leak
+between runs. "eager" additionally imports the Google client libraries,
+which is what every worker paid before they were loaded lazily.
+
+Usage (from backend/):
+    python -m benchmarks.startup --repeat 5
+"""
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+
+GOOGLE_MODULES = [
+    "googleapiclient.discovery",
+    "google_auth_oauthlib.flow",
+    "google.oauth2.credentials",
+    "google.auth.transport.requests",
+]
+
+PROBE = """
+import json, resource, sys, time
+start = time.perf_counter()
+import app.main
+for name in {modules!r}:
+    __import__(name)
+elapsed = time.perf_counter() - start
+google = sorted(m for m in sys.modules if m.split(".")[0] in ("google", "googleapiclient", "google_auth_oauthlib"))
+print(json.dumps({{
+    "import_ms": elapsed * 1000,
+    "max_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    "google_modules": len(google),
+}}))
+"""
+
+
+def measure(modules, repeat: int) -> dict:
+    samples = []
+    for _ in range(repeat):
+        output = subprocess.run(
+            [sys.executable, "-c", PROBE.format(modules=modules)],
+            check=True, capture_output=True, text=True,
+        ).stdout
+        samples.append(json.loads(output.strip().splitlines()[-1]))
+    return {
+        "import_ms": statistics.median(s["import_ms"] for s in samples),
+        "max_rss_mb": statistics.median(s["max_rss_mb"] for s in samples),
+        "google_modules": samples[-1]["google_modules"],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    lazy = measure([], args.repeat)
+    eager = measure(GOOGLE_MODULES, args.repeat)
+    print(f"{'mode':<8}{'import ms':>12}{'max RSS MB':>12}{'google mods':>13}")
+    for name, result in (("eager", eager), ("lazy", lazy)):
+        print(f"{name:<8}{result['import_ms']:>12.1f}{result['max_rss_mb']:>12.1f}{result['google_modules']:>13}")
+    print(f"\nlazy saves {eager['import_ms'] - lazy['import_ms']:.1f} ms and "
+          f"{eager['max_rss_mb'] - lazy['max_rss_mb']:.1f} MB per worker")
+
+
+if __name__ == "__main__":
+    main()
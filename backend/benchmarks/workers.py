@@ -0,0 +1,115 @@
+"""Throughput of read-heavy routes served by 1..N uvicorn worker processes.
+
+Starts `uvicorn --workers N` against a seeded SQLite file and drives it
+from several client processes over real HTTP, so neither side is capped
+by a single interpreter.
+
+Usage (from backend/):
+    python -m benchmarks.workers --workers 1 2 4 --clients 8 --duration 10
+"""
+import argparse
+import multiprocessing
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+READ_PATHS = [
+    ("/tasks/", {"limit": 50, "status": "todo"}),
+    ("/stock/", {"limit": 50}),
+    ("/appointments/", {"limit": 50}),
+    ("/dashboard/stats", {}),
+    ("/stock/stats/by-category", {}),
+    ("/tasks/stats/by-status", {}),
+]
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _client(base_url: str, duration: float, seed: int, results):
+    rng = random.Random(seed)
+    done = errors = 0
+    deadline = time.perf_counter() + duration
+    with httpx.Client(base_url=base_url, timeout=30) as client:
+        while time.perf_counter() < deadline:
+            path, params = rng.choice(READ_PATHS)
+            if client.get(path, params=params).status_code >= 400:
+                errors += 1
+            done += 1
+    results.put((done, errors))
+
+
+def _wait_ready(base_url: str, timeout: float = 60):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            if httpx.get(f"{base_url}/health").status_code == 200:
+                return
+        except httpx.TransportError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError("server did not start")
+
+
+def run(workers: int, clients: int, duration: float, env: dict) -> dict:
+    port = _free_port()
+    base_url = f"http://127.0.0.1:{port}"
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port),
+         "--workers", str(workers), "--log-level", "warning", "--no-access-log"],
+        env=env,
+    )
+    try:
+        _wait_ready(base_url)
+        results = multiprocessing.Queue()
+        procs = [
+            multiprocessing.Process(target=_client, args=(base_url, duration, i, results))
+            for i in range(clients)
+        ]
+        for proc in procs:
+            proc.start()
+        totals = [results.get() for _ in procs]
+        for proc in procs:
+            proc.join()
+    finally:
+        server.terminate()
+        server.wait()
+    requests = sum(done for done, _ in totals)
+    return {"workers": workers, "rps": requests / duration, "errors": sum(e for _, e in totals)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--clients", type=int, default=8)
+    parser.add_argument("--duration", type=float, default=10)
+    parser.add_argument("--scale", default="1k")
+    args = parser.parse_args()
+
+    database = os.path.join(tempfile.mkdtemp(), "bench_workers.db")
+    env = {**os.environ, "DATABASE_URL": f"sqlite:///{database}", "ROLLUP_COMPACTION_HOUR": ""}
+    os.environ.update(env)
+
+    from app.database import engine
+    from benchmarks.data import generate
+    generate(engine, args.scale)
+
+    print(f"{'workers':>8}{'req/s':>10}{'scaling':>9}{'errors':>8}")
+    baseline = None
+    for workers in args.workers:
+        result = run(workers, args.clients, args.duration, env)
+        baseline = baseline or result["rps"] / result["workers"]
+        print(f"{workers:>8}{result['rps']:>10.1f}{result['rps'] / baseline:>8.2f}x{result['errors']:>8}")
+
+
+if __name__ == "__main__":
+    main()